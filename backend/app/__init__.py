@@ -4,19 +4,15 @@ from flask_jwt_extended import JWTManager
 from datetime import timedelta
 from .db import db
 import os
-from .routes.credits_bp import credits_bp
-from .routes.users_bp import users_bp
-from .routes.modules_bp import modules_bp
-from .routes.credit_requests_bp import credit_requests_bp
-from .routes.add_students_bp import add_students_bp
-from .routes.chatbot_bp import chatbot_bp
 from sqlalchemy import text
 
 # Initialise app
 def create_app():
     app = Flask(__name__)
     # CORS for frontend
-    CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "http://localhost:5173"}})
+    CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "http://localhost:5173"}},
+         expose_headers=["X-Total-Count", "X-Page", "X-Per-Page",  # Pagination headers readable by the frontend
+                         "X-Request-ID", "Retry-After"])
 
     # --- Database config ---
     # Use env if provided; otherwise fall back to a local SQLite file for dev/test.
@@ -51,7 +47,22 @@ def create_app():
 
 
     jwt = JWTManager(app)
-    
+
+    # API-only workers serve everything except the endpoints that need the ML stack
+    # (embeddings, LangChain, document parsers), which then never gets imported.
+    app.config.setdefault("API_ONLY", os.getenv("API_ONLY", "false").lower() == "true")
+
+    # Blueprints are imported here rather than at module level so that importing
+    # the package (e.g. for app.db in scripts) doesn't load every route module.
+    from .routes.credits_bp import credits_bp
+    from .routes.users_bp import users_bp
+    from .routes.modules_bp import modules_bp
+    from .routes.credit_requests_bp import credit_requests_bp
+    from .routes.add_students_bp import add_students_bp
+    from .routes.chatbot_bp import chatbot_bp
+    from .routes.jobs_bp import jobs_bp
+    from .routes.metrics_bp import metrics_bp
+
     # Register blueprints
     app.register_blueprint(credits_bp, url_prefix='/api')
     app.register_blueprint(users_bp, url_prefix='/api')
@@ -59,6 +70,16 @@ def create_app():
     app.register_blueprint(credit_requests_bp, url_prefix='/api')
     app.register_blueprint(add_students_bp, url_prefix='/api')
     app.register_blueprint(chatbot_bp, url_prefix='/api')
+    app.register_blueprint(jobs_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+
+    # Request IDs and per-stage timing logs
+    from .services import tracing
+    tracing.init_app(app)
+
+    # Prometheus-style counters served at /metrics
+    from .services import metrics
+    metrics.init_app(app)
 
 
     # Test database connection
@@ -0,0 +1,183 @@
+"""
+Versioned schema migrations.
+
+Each migration runs once and is recorded in the SchemaVersion table. Steps are
+written to be safe on databases that were created with db.create_all() before
+migrations existed (e.g. indexes are only created if missing), so any existing
+deployment can simply run `python migrate.py`.
+
+To change the schema, update the model and append a new (version, description,
+function) entry to MIGRATIONS. Never edit a migration that has been released.
+"""
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, select, func, text
+from sqlalchemy.schema import CreateColumn
+from app.db import db
+
+_metadata = MetaData()
+schema_version = Table(
+    'SchemaVersion', _metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(255), nullable=False),
+    Column('appliedAt', DateTime, nullable=False),
+    schema='dbo'
+)
+
+
+def _import_models():
+    # Every model must be imported so db.metadata knows about all tables
+    from app.models import (archived_chat, background_job, chat_history, chat_message, chat_usage_daily,  # noqa: F401
+                            chatbot_settings, credit_requests, idempotent_request, module, module_assignment,
+                            module_document_usage, module_student_usage, module_usage_daily, students, users)
+
+
+def _table(name):
+    _import_models()
+    return db.metadata.tables[f"dbo.{name}"] if f"dbo.{name}" in db.metadata.tables else db.metadata.tables[name]
+
+
+def create_table(table_name):
+    """Creates a model's table (and its indexes) if it doesn't exist yet."""
+    _table(table_name).create(db.engine, checkfirst=True)
+
+
+def create_index(table_name, index_name):
+    """Creates one of the model's indexes if the database doesn't have it yet."""
+    table = _table(table_name)
+    index = next(i for i in table.indexes if i.name == index_name)
+    index.create(db.engine, checkfirst=True)
+
+
+def add_column(table_name, column_name):
+    """
+    Adds a column defined on the model to an existing table if it's missing.
+    The column must be nullable or have a server_default, as existing rows need a value.
+    """
+    table = _table(table_name)
+    existing = {c['name'] for c in inspect(db.engine).get_columns(table.name, schema=_schema(table))}
+    if column_name in existing:
+        return
+    column_ddl = CreateColumn(table.c[column_name]).compile(dialect=db.engine.dialect)
+    with db.engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {_qualified_name(table)} ADD {column_ddl}"))
+
+
+def _schema(table):
+    translate = db.engine.get_execution_options().get("schema_translate_map", {})
+    return translate.get(table.schema, table.schema)
+
+
+def _qualified_name(table):
+    schema = _schema(table)
+    return f"{schema}.{table.name}" if schema else table.name
+
+
+# --- Migrations ---
+
+def _create_tables():
+    _import_models()
+    db.create_all()
+
+
+def _add_hot_path_indexes():
+    from app.models.module_assignment import ModuleAssignment
+    duplicates = db.session.query(ModuleAssignment.userID, ModuleAssignment.moduleID)\
+        .group_by(ModuleAssignment.userID, ModuleAssignment.moduleID)\
+        .having(func.count() > 1).all()
+    if duplicates:
+        raise RuntimeError(
+            "Cannot add the unique (userID, moduleID) index on ModuleAssignment: duplicate enrolments "
+            f"exist for {', '.join(f'user {u} in {m}' for u, m in duplicates)}. Remove them and re-run."
+        )
+
+    create_index('ChatMessage', 'IX_ChatMessage_chatID_timestamp')
+    create_index('ChatHistory', 'IX_ChatHistory_assignmentID_dateStarted')
+    create_index('ModuleAssignment', 'UQ_ModuleAssignment_userID_moduleID')
+    create_index('ModuleAssignment', 'IX_ModuleAssignment_moduleID')
+    create_index('CreditRequests', 'IX_CreditRequests_assignmentID_status')
+    create_index('Users', 'IX_Users_studentID')
+    create_index('Users', 'IX_Users_email')
+    create_index('ChatbotSettings', 'IX_ChatbotSettings_moduleID')
+
+
+def _add_chat_archive():
+    create_table('ArchivedChat')
+
+
+def _add_background_jobs():
+    create_table('BackgroundJob')
+
+
+def _add_credit_request_date_index():
+    create_index('CreditRequests', 'IX_CreditRequests_status_requestDate')
+
+
+def _add_credit_request_notifications():
+    add_column('CreditRequests', 'approvedAt')
+    add_column('CreditRequests', 'seen')
+    # Approvals from before notifications were tracked were already shown to students, so
+    # they must not all pop up again. Their approval time is unknown; the request date is
+    # the closest value, and keeps them in order
+    requests = _table('CreditRequests')
+    db.session.execute(requests.update().where(requests.c.status == 'Approved').values(seen=True))
+    db.session.execute(requests.update()
+                       .where(requests.c.status == 'Approved', requests.c.approvedAt.is_(None))
+                       .values(approvedAt=requests.c.requestDate))
+
+
+def _add_chat_usage():
+    for column in ('model', 'promptTokens', 'completionTokens', 'cost', 'latencyMs', 'retrievalHits'):
+        add_column('ChatMessage', column)
+    create_table('ChatUsageDaily')
+
+
+def _add_module_usage_summaries():
+    from app.services.usage import rebuild_summaries
+    for table_name in ('ModuleUsageDaily', 'ModuleStudentUsage', 'ModuleDocumentUsage'):
+        create_table(table_name)
+    rebuild_summaries()  # Backfill from the daily rollups and approved credit requests
+
+
+def _add_idempotent_requests():
+    create_table('IdempotentRequest')
+
+
+MIGRATIONS = [
+    (1, "Create tables", _create_tables),
+    (2, "Indexes for chat, assignment, credit request and user lookups", _add_hot_path_indexes),
+    (3, "ArchivedChat index for archived chat sessions", _add_chat_archive),
+    (4, "BackgroundJob table for background job status", _add_background_jobs),
+    (5, "Index for listing credit requests by status and date", _add_credit_request_date_index),
+    (6, "Approval time and seen flag for credit request notifications", _add_credit_request_notifications),
+    (7, "Per-message token usage and cost, and daily chat usage rollups", _add_chat_usage),
+    (8, "Module usage summaries for analytics", _add_module_usage_summaries),
+    (9, "IdempotentRequest table for coalescing duplicate requests across workers", _add_idempotent_requests),
+]
+
+
+def applied_versions():
+    schema_version.create(db.engine, checkfirst=True)
+    return {row.version for row in db.session.execute(select(schema_version.c.version))}
+
+
+def run_migrations():
+    """Applies pending migrations in order. Returns the list of versions applied."""
+    applied = applied_versions()
+    newly_applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"⏳ Applying migration {version}: {description}")
+        migrate()
+        db.session.execute(schema_version.insert().values(
+            version=version, description=description, appliedAt=datetime.utcnow()
+        ))
+        db.session.commit()
+        newly_applied.append(version)
+        print(f"✅ Migration {version} applied")
+    return newly_applied
+
+
+def current_version():
+    applied_versions()
+    return db.session.execute(select(func.max(schema_version.c.version))).scalar() or 0
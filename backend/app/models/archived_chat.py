@@ -0,0 +1,25 @@
+from datetime import datetime
+from app.db import db
+
+class ArchivedChat(db.Model):
+    """
+    Index of chat sessions whose messages were moved out of ChatMessage into a
+    compressed archive file. The ChatHistory row itself is kept.
+    """
+    __tablename__ = 'ArchivedChat'
+    __table_args__ = (
+        db.Index('IX_ArchivedChat_moduleID', 'moduleID'),
+        {'schema': 'dbo'},
+    )
+
+    historyID = db.Column(db.Integer, db.ForeignKey('dbo.ChatHistory.historyID'), primary_key=True, autoincrement=False)
+    moduleID = db.Column(db.String(50), nullable=False)
+    # File name within the module's archive directory
+    archivePath = db.Column(db.String(500), nullable=False)
+    # Byte range of this chat's compressed frame within the archive file
+    offset = db.Column(db.BigInteger, nullable=False)
+    length = db.Column(db.Integer, nullable=False)
+    messageCount = db.Column(db.Integer, nullable=False)
+    archivedAt = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    chat = db.relationship("ChatHistory", backref=db.backref("archive", uselist=False))
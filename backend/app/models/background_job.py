@@ -0,0 +1,19 @@
+from datetime import datetime
+from app.db import db
+
+class BackgroundJob(db.Model):
+    """Status of a long-running operation (e.g. module deletion), shared by all workers."""
+    __tablename__ = 'BackgroundJob'
+    __table_args__ = (
+        db.Index('IX_BackgroundJob_kind_target_status', 'kind', 'target', 'status'),
+        {'schema': 'dbo'},
+    )
+
+    jobID = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    target = db.Column(db.String(255), nullable=True)
+    status = db.Column(db.String(20), nullable=False)  # 'running', 'succeeded' or 'failed'
+    progress = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    createdAt = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updatedAt = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
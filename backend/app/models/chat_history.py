@@ -1,13 +1,17 @@
-from datetime import datetime
-from app.db import db
-
-class ChatHistory(db.Model):
-    __tablename__ = 'ChatHistory'
-    __table_args__ = {'schema': 'dbo'}
-    
-    historyID = db.Column(db.Integer, primary_key=True)
-    assignmentID = db.Column(db.Integer, db.ForeignKey('dbo.ModuleAssignment.assignmentID'), nullable=False)
-    chatlog = db.Column(db.Text) 
-    dateStarted = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    
-    assignment = db.relationship("ModuleAssignment", backref="chat_history")
+from datetime import datetime
+from app.db import db
+
+class ChatHistory(db.Model):
+    __tablename__ = 'ChatHistory'
+    __table_args__ = (
+        # Chat sessions are listed per assignment, newest first
+        db.Index('IX_ChatHistory_assignmentID_dateStarted', 'assignmentID', 'dateStarted'),
+        {'schema': 'dbo'},
+    )
+    
+    historyID = db.Column(db.Integer, primary_key=True)
+    assignmentID = db.Column(db.Integer, db.ForeignKey('dbo.ModuleAssignment.assignmentID'), nullable=False)
+    chatlog = db.Column(db.Text) 
+    dateStarted = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    assignment = db.relationship("ModuleAssignment", backref="chat_history")
@@ -1,15 +1,27 @@
-from datetime import datetime
-from app.db import db
-
-class ChatMessage(db.Model):
-    __tablename__ = 'ChatMessage'
-    __table_args__ = {'schema': 'dbo'}
-
-    messageID = db.Column(db.Integer, primary_key=True)
-    chatID = db.Column(db.Integer, db.ForeignKey('dbo.ChatHistory.historyID'), nullable=False)
-    sender = db.Column(db.Enum('user', 'ai', name='sender_types'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-
-    chat = db.relationship("ChatHistory", backref="chat_message")
-
+from datetime import datetime
+from app.db import db
+
+class ChatMessage(db.Model):
+    __tablename__ = 'ChatMessage'
+    __table_args__ = (
+        # Messages are always fetched per chat in timestamp order
+        db.Index('IX_ChatMessage_chatID_timestamp', 'chatID', 'timestamp'),
+        {'schema': 'dbo'},
+    )
+
+    messageID = db.Column(db.Integer, primary_key=True)
+    chatID = db.Column(db.Integer, db.ForeignKey('dbo.ChatHistory.historyID'), nullable=False)
+    sender = db.Column(db.Enum('user', 'ai', name='sender_types'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Usage of the LLM call that produced an 'ai' message (None for user messages)
+    model = db.Column(db.String(100), nullable=True)
+    promptTokens = db.Column(db.Integer, nullable=True)
+    completionTokens = db.Column(db.Integer, nullable=True)
+    cost = db.Column(db.Float, nullable=True)  # USD
+    latencyMs = db.Column(db.Integer, nullable=True)
+    retrievalHits = db.Column(db.Integer, nullable=True)  # Document chunks retrieved for the answer
+
+    chat = db.relationship("ChatHistory", backref="chat_message")
+
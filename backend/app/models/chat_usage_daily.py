@@ -0,0 +1,22 @@
+from app.db import db
+
+class ChatUsageDaily(db.Model):
+    """
+    Chat usage per student per module per day, updated with every chat turn, so spend
+    reports and credit audits read a few rows instead of summing ChatMessage.
+    """
+    __tablename__ = 'ChatUsageDaily'
+    __table_args__ = (
+        db.Index('UQ_ChatUsageDaily_moduleID_usageDate_userID', 'moduleID', 'usageDate', 'userID', unique=True),
+        db.Index('IX_ChatUsageDaily_userID_usageDate', 'userID', 'usageDate'),
+        {'schema': 'dbo'},
+    )
+
+    usageID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    moduleID = db.Column(db.String(50), nullable=False)
+    userID = db.Column(db.Integer, db.ForeignKey('dbo.Users.userID'), nullable=False)
+    usageDate = db.Column(db.Date, nullable=False)  # UTC
+    messages = db.Column(db.Integer, nullable=False, default=0)  # Chat turns (question + answer)
+    promptTokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completionTokens = db.Column(db.BigInteger, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0.0)  # USD, as deducted from credits
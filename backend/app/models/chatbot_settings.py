@@ -2,7 +2,10 @@ from app.db import db
 
 class ChatbotSettings(db.Model):
     __tablename__ = 'ChatbotSettings'
-    __table_args__ = {'schema': 'dbo'}
+    __table_args__ = (
+        db.Index('IX_ChatbotSettings_moduleID', 'moduleID'),
+        {'schema': 'dbo'},
+    )
     
     chatbotID = db.Column(db.Integer, primary_key=True)
     moduleID = db.Column(db.String(50), db.ForeignKey('dbo.Module.moduleID'), nullable=False)
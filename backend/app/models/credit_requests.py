@@ -3,13 +3,20 @@ from app.models.module_assignment import ModuleAssignment # Import ModuleAssignm
 
 class CreditRequest(db.Model):
     __tablename__ = 'CreditRequests'
-    __table_args__ = {'schema': 'dbo'}
+    __table_args__ = (
+        db.Index('IX_CreditRequests_assignmentID_status', 'assignmentID', 'status'),
+        db.Index('IX_CreditRequests_status_requestDate', 'status', 'requestDate'),
+        {'schema': 'dbo'},
+    )
 
     requestID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     assignmentID = db.Column(db.Integer, db.ForeignKey('dbo.ModuleAssignment.assignmentID'), nullable=False)
     creditsRequested = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(20), nullable=False)
     requestDate = db.Column(db.DateTime, nullable=False)
+    approvedAt = db.Column(db.DateTime, nullable=True)
+    # Whether the student has dismissed the approval notification
+    seen = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
     # Define the relationship to ModuleAssignment
     module_assignment = db.relationship('ModuleAssignment', backref=db.backref('credit_requests', lazy=True))
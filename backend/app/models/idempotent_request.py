@@ -0,0 +1,21 @@
+from datetime import datetime
+from app.db import db
+
+class IdempotentRequest(db.Model):
+    """
+    A coalesced request (see app.services.coalescing), shared by all workers: claimed
+    while it runs, then holding its response until it expires.
+    """
+    __tablename__ = 'IdempotentRequest'
+    __table_args__ = (
+        db.Index('IX_IdempotentRequest_expiresAt', 'expiresAt'),
+        {'schema': 'dbo'},
+    )
+
+    requestKey = db.Column(db.String(64), primary_key=True)  # SHA-256 of the endpoint and request key
+    status = db.Column(db.String(20), nullable=False)  # 'running' or 'done'
+    statusCode = db.Column(db.Integer, nullable=True)
+    contentType = db.Column(db.String(255), nullable=True)
+    body = db.Column(db.LargeBinary, nullable=True)
+    createdAt = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expiresAt = db.Column(db.DateTime, nullable=False)
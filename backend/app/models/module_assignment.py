@@ -3,7 +3,12 @@ from app.models.users import User # Import User model
 
 class ModuleAssignment(db.Model):
     __tablename__ = 'ModuleAssignment'
-    __table_args__ = {'schema': 'dbo'}
+    __table_args__ = (
+        # A student is enrolled in a module at most once; also serves (userID, moduleID) lookups
+        db.Index('UQ_ModuleAssignment_userID_moduleID', 'userID', 'moduleID', unique=True),
+        db.Index('IX_ModuleAssignment_moduleID', 'moduleID'),
+        {'schema': 'dbo'},
+    )
     
     assignmentID = db.Column(db.Integer, primary_key=True, autoincrement=True, nullable=False)
     # Assuming userID is a foreign key to User.userID
@@ -0,0 +1,16 @@
+from app.db import db
+
+class ModuleDocumentUsage(db.Model):
+    """How often each of a module's documents was retrieved as context for an answer."""
+    __tablename__ = 'ModuleDocumentUsage'
+    __table_args__ = (
+        db.Index('UQ_ModuleDocumentUsage_moduleID_filename', 'moduleID', 'filename', unique=True),
+        {'schema': 'dbo'},
+    )
+
+    usageID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    moduleID = db.Column(db.String(50), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    retrievals = db.Column(db.Integer, nullable=False, default=0)  # Chunks retrieved from the document
+    answers = db.Column(db.Integer, nullable=False, default=0)  # Answers it contributed to
+    lastRetrievedAt = db.Column(db.DateTime, nullable=True)
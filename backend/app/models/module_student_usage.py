@@ -0,0 +1,19 @@
+from app.db import db
+
+class ModuleStudentUsage(db.Model):
+    """Running totals of a student's chat usage and credit grants in a module."""
+    __tablename__ = 'ModuleStudentUsage'
+    __table_args__ = (
+        db.Index('UQ_ModuleStudentUsage_moduleID_userID', 'moduleID', 'userID', unique=True),
+        {'schema': 'dbo'},
+    )
+
+    usageID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    moduleID = db.Column(db.String(50), nullable=False)
+    userID = db.Column(db.Integer, db.ForeignKey('dbo.Users.userID'), nullable=False)
+    messages = db.Column(db.Integer, nullable=False, default=0)
+    promptTokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completionTokens = db.Column(db.BigInteger, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0.0)
+    creditsGranted = db.Column(db.Float, nullable=False, default=0.0)
+    lastMessageAt = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,22 @@
+from app.db import db
+
+class ModuleUsageDaily(db.Model):
+    """
+    Chat usage and credit grants per module per day, kept up to date with every chat turn
+    and credit grant so module analytics don't have to scan ChatMessage.
+    """
+    __tablename__ = 'ModuleUsageDaily'
+    __table_args__ = (
+        db.Index('UQ_ModuleUsageDaily_moduleID_usageDate', 'moduleID', 'usageDate', unique=True),
+        {'schema': 'dbo'},
+    )
+
+    usageID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    moduleID = db.Column(db.String(50), nullable=False)
+    usageDate = db.Column(db.Date, nullable=False)  # UTC
+    messages = db.Column(db.Integer, nullable=False, default=0)  # Chat turns
+    activeStudents = db.Column(db.Integer, nullable=False, default=0)  # Students with at least one turn
+    promptTokens = db.Column(db.BigInteger, nullable=False, default=0)
+    completionTokens = db.Column(db.BigInteger, nullable=False, default=0)
+    cost = db.Column(db.Float, nullable=False, default=0.0)  # USD, as deducted from credits
+    creditsGranted = db.Column(db.Float, nullable=False, default=0.0)  # Approved credit requests
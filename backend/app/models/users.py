@@ -3,7 +3,11 @@ from sqlalchemy.orm import synonym
 
 class User(db.Model):
     __tablename__ = 'Users'
-    __table_args__ = {'schema': 'dbo'}
+    __table_args__ = (
+        db.Index('IX_Users_studentID', 'studentID'),
+        db.Index('IX_Users_email', 'email'),
+        {'schema': 'dbo'},
+    )
 
     userID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(255), nullable=False)
@@ -1,14 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from app.models.users import User
 from app.models.module_assignment import ModuleAssignment
 from app.models.students import Student
 from app.models.module import Module
 from app.db import db
-import csv
-from io import TextIOWrapper
+from app.services import student_search
+from app.services.enrolment import open_csv, iter_student_ids, stream_enrol
+from app.services.pagination import get_limit
+from sqlalchemy import cast, func, or_
 
 add_students_bp = Blueprint('add_students', __name__)
 
+
+def _log_enrolment_progress(module_id, report):
+    current_app.logger.info("Enrolment into %s: %d rows processed, %d added (batch %d)",
+                            module_id, report.total, report.added, report.batches)
+
 # 🔹 Enroll a single student into a module
 @add_students_bp.route('/enroll-student', methods=['POST'])
 def enroll_single_student():
@@ -78,87 +85,124 @@ def enroll_students_csv():
         if not module:
             return jsonify({'error': f'Module {module_id} not found'}), 404
 
-        reader = csv.reader(TextIOWrapper(file, encoding='utf-8'))
-        header_skipped = False
-        added_count = 0
-        total_students = 0
-        not_found_ids = []
-        skipped = []
-
-        for row in reader:
-            if not header_skipped:
-                header_skipped = True
-                continue
-
-            total_students += 1
-            student_id = row[1].strip() if len(row) > 1 else row[0].strip()
-            if not student_id.isdigit():
-                skipped.append(f"Invalid ID format: {student_id}")
-                continue
-
-            student = Student.query.filter_by(studentID=student_id).first()
-            if not student:
-                not_found_ids.append(student_id)
-                continue
-
-            user = User.query.filter_by(studentID=student_id).first()
-            if not user:
-                user = User(
-                    name=student.fullName,
-                    studentID=student_id,
-                    email=student.email,
-                    password="teststudent",
-                    role="Student"
-                )
-                db.session.add(user)
-                db.session.flush()
-
-            existing = ModuleAssignment.query.filter_by(userID=user.userID, moduleID=module_id).first()
-            if existing:
-                skipped.append(f"Already enrolled: {student_id}")
-                continue
-
-            db.session.add(ModuleAssignment(
-                userID=user.userID,
-                moduleID=module_id,
-                studentCredits=module.initialCredit
-            ))
-            added_count += 1
-
-        db.session.commit()
+        # Rows are streamed and enrolled in committed batches, so file size doesn't matter
+        student_ids = iter_student_ids(open_csv(file), fallback_column=lambda row: row[1] if len(row) > 1 else row[0])
+        report = stream_enrol(module_id, student_ids, module.initialCredit,
+                              on_progress=lambda r: _log_enrolment_progress(module_id, r))
 
         # Construct message in desired format
-        message = f"{added_count}/{total_students} students added successfully."
-        if not_found_ids:
-            message += f" {len(not_found_ids)} student{'s' if len(not_found_ids) > 1 else ''} not found. ({', '.join(not_found_ids)})"
+        message = f"{report.added}/{report.total} students added successfully."
+        if report.not_found_count:
+            not_found = ', '.join(report.not_found_ids)
+            if report.not_found_count > len(report.not_found_ids):
+                not_found += f" and {report.not_found_count - len(report.not_found_ids)} more"
+            message += f" {report.not_found_count} student{'s' if report.not_found_count > 1 else ''} not found. ({not_found})"
 
         return jsonify({
             'message': message,
-            'skipped': skipped
+            'skipped': report.skipped,
+            'summary': report.to_dict()
         }), 200
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # 🔹 Get all students in a module
+ROSTER_SORT_COLUMNS = {
+    'assignmentID': ModuleAssignment.assignmentID,
+    'studentID': User.studentID,
+    'name': User.name,
+    'email': User.email,
+    'studentCredits': ModuleAssignment.studentCredits,
+}
+MAX_ROSTER_PAGE_SIZE = 500
+
 @add_students_bp.route('/students-in-module/<module_id>', methods=['GET'])
 def get_students_in_module(module_id):
+    """
+    Returns the module roster from a single joined query.
+
+    Optional query params:
+      q            - case-insensitive match on name, or prefix match on student ID
+      creditsBelow - only students with fewer credits than this
+      userID       - only this user's assignment
+      sort, order  - one of ROSTER_SORT_COLUMNS, 'asc' (default) or 'desc'
+      page, perPage - paginate; the total is returned in the X-Total-Count header
+    The response body is always the list of students.
+    """
     try:
-        assignments = ModuleAssignment.query.filter_by(moduleID=module_id).all()
-        students = []
-        for a in assignments:
-            user = User.query.get(a.userID)
-            if user:
-                students.append({
-                    'assignmentID': a.assignmentID,
-                    'userID': a.userID,
-                    'studentID': user.studentID,
-                    'name': user.name,
-                    'email': user.email,
-                    'studentCredits': a.studentCredits
-                })
-        return jsonify(students), 200
+        search = request.args.get('q', '').strip()
+        credits_below = request.args.get('creditsBelow', type=float)
+        user_id = request.args.get('userID', type=int)
+        sort = request.args.get('sort', 'assignmentID')
+        order = request.args.get('order', 'asc').lower()
+        page = request.args.get('page', type=int)
+        per_page = request.args.get('perPage', type=int)
+
+        if sort not in ROSTER_SORT_COLUMNS or order not in ('asc', 'desc'):
+            return jsonify({'error': 'Invalid sort or order'}), 400
+        paginate = page is not None or per_page is not None
+        if paginate:
+            page = page or 1
+            per_page = per_page or 50
+            if page < 1 or not 1 <= per_page <= MAX_ROSTER_PAGE_SIZE:
+                return jsonify({'error': f'page must be >= 1 and perPage between 1 and {MAX_ROSTER_PAGE_SIZE}'}), 400
+
+        columns = [
+            ModuleAssignment.assignmentID,
+            ModuleAssignment.userID,
+            User.studentID,
+            User.name,
+            User.email,
+            ModuleAssignment.studentCredits,
+        ]
+        if paginate:
+            # Window count gives the total alongside the page, in the same round trip
+            columns.append(func.count().over().label('total'))
+
+        query = db.session.query(*columns)\
+            .join(User, User.userID == ModuleAssignment.userID)\
+            .filter(ModuleAssignment.moduleID == module_id)
+
+        if search:
+            query = query.filter(or_(
+                User.name.ilike(f"%{search}%"),
+                cast(User.studentID, db.String).like(f"{search}%")
+            ))
+        if credits_below is not None:
+            query = query.filter(ModuleAssignment.studentCredits < credits_below)
+        if user_id is not None:
+            query = query.filter(ModuleAssignment.userID == user_id)
+
+        sort_column = ROSTER_SORT_COLUMNS[sort]
+        sort_column = sort_column.desc() if order == 'desc' else sort_column.asc()
+        filtered = query
+        query = query.order_by(sort_column, ModuleAssignment.assignmentID.asc())
+        if paginate:
+            query = query.offset((page - 1) * per_page).limit(per_page)
+
+        rows = query.all()
+        students = [{
+            'assignmentID': row.assignmentID,
+            'userID': row.userID,
+            'studentID': row.studentID,
+            'name': row.name,
+            'email': row.email,
+            'studentCredits': row.studentCredits
+        } for row in rows]
+
+        response = jsonify(students)
+        if paginate:
+            # An out-of-range page has no rows to carry the window count
+            total = rows[0].total if rows else filtered.count()
+            response.headers['X-Total-Count'] = str(total)
+            response.headers['X-Page'] = str(page)
+            response.headers['X-Per-Page'] = str(per_page)
+        return response, 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -178,17 +222,26 @@ def delete_assignment(assignment_id):
         return jsonify({'error': str(e)}), 500
 
 # 🔹 Search students
+MAX_SEARCH_RESULTS = 50
+
 @add_students_bp.route('/search-students', methods=['GET'])
 def search_students():
+    """
+    Autocomplete for enrolment: students whose ID starts with q, or whose name has words
+    starting with q (or, failing that, close to it). Served from an in-memory index.
+    Optional: limit=<n> (default 10, at most MAX_SEARCH_RESULTS).
+    """
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify([])
 
     try:
-        results = Student.query.filter(Student.studentID.ilike(f"{query}%")).limit(10).all()
+        limit = get_limit(default=10, maximum=MAX_SEARCH_RESULTS)
         return jsonify([
-            {"studentID": student.studentID, "fullName": student.fullName}
-            for student in results
+            {"studentID": student_id, "fullName": full_name}
+            for student_id, full_name in student_search.search_students(query, limit)
         ])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
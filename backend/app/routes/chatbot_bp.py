@@ -1,4 +1,6 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
+from functools import wraps
+from sqlalchemy import func, update
 from app.models.module_assignment import ModuleAssignment
 from app.models.module import Module
 from app.models.users import User
@@ -6,29 +8,31 @@ from app.models.chat_history import ChatHistory
 from app.models.chat_message import ChatMessage
 from app.models.chatbot_settings import ChatbotSettings
 from app.db import db
+from app.services.openrouter import get_model_pricing
+from app.services.notifications import notify_users
+from app.services.tracing import Trace
+from app.services import metrics
+from app.services.llm_scheduler import Saturated, estimate_tokens, scheduler
+from app.services.coalescing import coalesced, request_key
+from app.services.usage import record_turn
+from app.services.chat_archive import load_archived_messages, restore_chat
+from app.services.pagination import encode_cursor, decode_cursor, keyset_after, keyset_before, get_limit
+from app.services.vector_store import (get_qdrant_client, get_embeddings, collection_exists,
+                                      create_module_collection, collection_name as module_collection_name)
 from pathlib import Path
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, PointIdsList
 import os
 import uuid
 from dotenv import load_dotenv
-from docx import Document as DOCXDocument
-import pdfplumber
-import openpyxl
-from pptx import Presentation as PPTXDocument
 from io import BytesIO
+import time
 import traceback
 from datetime import datetime
 import requests
-from langchain.schema import HumanMessage
-from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.prompts import PromptTemplate
-from langchain.callbacks import get_openai_callback
+
+# NOTE: LangChain, the document parsers (python-docx, pdfplumber, openpyxl, python-pptx)
+# and qdrant-client are imported inside the functions that use them. Importing them here
+# would make every worker and the test suite pay seconds of startup and hundreds of MB,
+# even when only the users/credits endpoints are served.
 
 chatbot_bp = Blueprint('chatbot', __name__)
 UPLOAD_FOLDER = Path("uploads")
@@ -36,20 +40,15 @@ UPLOAD_FOLDER.mkdir(exist_ok=True)
 
 load_dotenv()
 
-def get_qdrant_client():
-    return QdrantClient(
-        url=os.getenv("QDRANT_HOST"),
-        api_key=os.getenv("QDRANT_API_KEY"),
-        prefer_grpc=False,
-        https=True,
-        timeout=10.0,
-        check_compatibility=False
-    )
 
-"""
-TODO: redo cost estimation function. 
-(call https://openrouter.ai/api/v1/models, get model pricing, estimate toks, calculate cost)
-"""
+def requires_ml(f):
+    """Rejects the request on API-only workers, which never load the ML stack."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if current_app.config.get("API_ONLY"):
+            return jsonify({"error": "This endpoint is not served by API-only workers"}), 503
+        return f(*args, **kwargs)
+    return decorated
 
 # Function to extract text
 def extract_text_from_file(file):
@@ -58,6 +57,7 @@ def extract_text_from_file(file):
 
     # DOCX (Word)
     if ext == "docx":
+        from docx import Document as DOCXDocument
         docx_io = BytesIO(file.read())
         doc = DOCXDocument(docx_io)
 
@@ -72,6 +72,7 @@ def extract_text_from_file(file):
 
     # PDF
     elif ext == "pdf":
+        import pdfplumber
         pdf_io = BytesIO(file.read())
         with pdfplumber.open(pdf_io) as pdf:
             for page in pdf.pages:
@@ -88,6 +89,7 @@ def extract_text_from_file(file):
 
     # PPTX (PowerPoint)
     elif ext == "pptx":
+        from pptx import Presentation as PPTXDocument
         pptx_io = BytesIO(file.read())
         prs = PPTXDocument(pptx_io)
 
@@ -103,6 +105,7 @@ def extract_text_from_file(file):
 
     # XLSX (Excel)
     elif ext in ["xlsx", "xls"]:
+        import openpyxl
         excel_io = BytesIO(file.read())
         wb = openpyxl.load_workbook(excel_io, data_only=True)
 
@@ -120,8 +123,13 @@ def extract_text_from_file(file):
 
 # Function to tag document from qdrant
 def tag_document_to_qdrant(module_id: str, file_content: str, filename: str):
+    from qdrant_client.models import Distance, VectorParams
+    from langchain_core.documents import Document
+    from langchain_qdrant import QdrantVectorStore
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
     # Step 1: Initialize embedding model and text splitter
-    embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-base-en-v1.5")
+    embeddings = get_embeddings()
     splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
 
     # Step 2: Split file content into manageable chunks
@@ -135,13 +143,13 @@ def tag_document_to_qdrant(module_id: str, file_content: str, filename: str):
 
     # Step 4: Connect to Qdrant vector database
     client = get_qdrant_client()
-    collection_name = f"module_{module_id}"
+    collection_name = module_collection_name(module_id)
 
-    # Step 5: Create collection if it doesn't exist yet
-    if collection_name not in [c.name for c in client.get_collections().collections]:
+    # Step 5: Create collection if it doesn't exist yet (renamed modules reach theirs via an alias)
+    if not collection_exists(client, module_id):
         dummy_vector = embeddings.embed_documents(["test"])[0]
-        client.recreate_collection(
-            collection_name=collection_name,
+        create_module_collection(
+            client, module_id,
             vectors_config=VectorParams(size=len(dummy_vector), distance=Distance.COSINE)
         )
 
@@ -152,7 +160,8 @@ def tag_document_to_qdrant(module_id: str, file_content: str, filename: str):
         collection_name=collection_name,
         embedding=embeddings
     )
-    vectorstore.add_documents(documents)
+    with metrics.external_call("qdrant", "upsert"):  # Includes embedding the chunks
+        vectorstore.add_documents(documents)
     print("✅ Tagging completed successfully.")
 
     # Step 7: Return list of filenames tagged (same repeated filename for each chunk)
@@ -161,8 +170,10 @@ def tag_document_to_qdrant(module_id: str, file_content: str, filename: str):
 
 # Function to untag document from qdrant
 def untag_document_from_qdrant(module_id: str, filename: str):
+    from qdrant_client.models import PointIdsList
+
     client = get_qdrant_client()
-    collection_name = f"module_{module_id}"
+    collection_name = module_collection_name(module_id)
 
     print(f"🧹 Removing all points for file '{filename}' from collection '{collection_name}'...")
 
@@ -197,10 +208,11 @@ def untag_document_from_qdrant(module_id: str, filename: str):
         return
 
     # Step 3: Delete all points that matched the filename
-    result = client.delete(
-        collection_name=collection_name,
-        points_selector=PointIdsList(points=matching_ids)
-    )
+    with metrics.external_call("qdrant", "delete"):
+        result = client.delete(
+            collection_name=collection_name,
+            points_selector=PointIdsList(points=matching_ids)
+        )
 
     print(f"🗑️ Deleted {len(matching_ids)} points. Qdrant response:", result)
 
@@ -215,7 +227,7 @@ def get_model_settings(module_id):
 
         # Initialize Qdrant client (need change depending on setup)
         client = get_qdrant_client()
-        collection_name = f"module_{module_id}"
+        collection_name = module_collection_name(module_id)
         filenames = []
         try:
             # Get all documents from the module's collection
@@ -287,6 +299,7 @@ def save_model_settings():
     
 # Tag Document Route
 @chatbot_bp.route('/tag-document', methods=['POST'])
+@requires_ml
 def tag_document():
     try:
         print("📥 Received request to /tag-document")
@@ -340,8 +353,27 @@ def untag_document():
         return jsonify({"error": str(e)}), 500
 
 
+def _send_message_key():
+    data = request.get_json(silent=True) or {}
+    if not data.get("user_id") or not data.get("message"):
+        return None
+    return request_key(data.get("user_id"), data.get("module_id"), data.get("chat_id"), data.get("model"),
+                       data.get("message"))
+
+
 @chatbot_bp.route('/send-message', methods=['POST'])
+@requires_ml
+@coalesced(_send_message_key)
 def send_message():
+    from langchain.schema import HumanMessage
+    from langchain_openai import ChatOpenAI
+    from langchain.chains import ConversationalRetrievalChain
+    from langchain_qdrant import QdrantVectorStore
+    from langchain.prompts import PromptTemplate
+    from langchain_community.callbacks.manager import get_openai_callback
+
+    trace = Trace("chat")
+    ticket, used_tokens = None, None
     try:
         data = request.get_json()
 
@@ -354,7 +386,10 @@ def send_message():
         # Added user_id to the check, for credit deduction
         if not module_id or not user_message or not user_id:
             return jsonify({"error": "module_id, message, and user_id are required"}), 400
-          # Fetch user assignment and settings early for access to credits and model name
+        trace.set(moduleID=str(module_id), userID=user_id)
+
+        # Fetch user assignment and settings early for access to credits and model name
+        span = trace.start("db.lookup")
         assignment = ModuleAssignment.query.filter_by(userID=user_id, moduleID=str(module_id)).first()
         if not assignment:
             return jsonify({"error": "No assignment found for the given user and module"}), 404
@@ -367,6 +402,25 @@ def send_message():
                 "current_credits": assignment.studentCredits
             }), 403
         
+        settings = ChatbotSettings.query.filter_by(moduleID=str(module_id)).first()
+        if not settings:
+            return jsonify({"error": "Model settings not found for this module"}), 404
+        span.end()
+
+        # Wait for an LLM slot (or be turned away) before anything is written
+        span = trace.start("queue")
+        try:
+            ticket = scheduler.acquire(user_id, str(module_id),
+                                       estimate_tokens(user_message, settings.max_tokens))
+        except Saturated as e:
+            span.end(rejected=e.reason)
+            response = jsonify({"error": str(e), "reason": e.reason, "retryAfter": e.retry_after})
+            response.headers["Retry-After"] = str(e.retry_after)
+            return response, 429
+        admitted = time.monotonic()
+        span.end()
+
+        span = trace.start("db.chat")
         chat_session = None
         # For the first message, create a new chat session.
         if not chat_id:
@@ -386,40 +440,45 @@ def send_message():
             if not chat_session:
                 return jsonify({"error": "Chat session not found"}), 404
         
-        settings = ChatbotSettings.query.filter_by(moduleID=str(module_id)).first()
-        if not settings:
-            return jsonify({"error": "Model settings not found for this module"}), 404
-
         if model_override:
             settings.model = model_override
+        span.end()
+        trace.set(chatID=chat_id, model=settings.model)
 
+        span = trace.start("pricing")
         try:
-            models_response = requests.get("https://openrouter.ai/api/v1/models")
-            models_response.raise_for_status()
-            models_data = models_response.json().get("data", [])
+            pricing = get_model_pricing(settings.model)
         except requests.exceptions.RequestException as e:
             print(f"Could not fetch model pricing from OpenRouter: {e}")
             return jsonify({"error": "Could not fetch model pricing. Please try again."}), 500
+        span.end()
 
-        model_info = next((m for m in models_data if m.get("id") == settings.model), None)
-
-        if not model_info:
+        if not pricing:
             return jsonify({"error": f"Could not find pricing information for model: {settings.model}"}), 500
 
-        pricing = model_info.get("pricing", {})
-        prompt_price = float(pricing.get("prompt", 0))
-        completion_price = float(pricing.get("completion", 0))
+        prompt_price, completion_price = pricing
 
         if settings.system_prompt:
             system_context = f"System Context: {settings.system_prompt}\n\n"
 
         # Build conversation history from previous messages.
+        span = trace.start("db.history")
         previous_messages = (
             db.session.query(ChatMessage)
             .filter_by(chatID=chat_id)
             .order_by(ChatMessage.timestamp.asc())
             .all()
         )
+        # Continuing an archived chat brings its messages back into the hot table
+        if not previous_messages and restore_chat(chat_id):
+            db.session.flush()
+            previous_messages = (
+                db.session.query(ChatMessage)
+                .filter_by(chatID=chat_id)
+                .order_by(ChatMessage.timestamp.asc())
+                .all()
+            )
+        span.end(messages=len(previous_messages))
         conversation_history = []
         current_pair = {"user": None, "ai": None}
         for msg in previous_messages:
@@ -436,6 +495,7 @@ def send_message():
         # For the first message, generate a chat title from the user's input.
         if not previous_messages:
             print("There is no existing messages!")
+            span = trace.start("title", service="openrouter")
             title_prompt = (
                 f"Provide one short, descriptive chat title for the following conversation. "
                 f"Return only the title, without numbering or additional commentary: {user_message}"
@@ -457,25 +517,32 @@ def send_message():
             # Save the generated title only once.
             chat_session.chatlog = chat_title
             db.session.commit()
+            span.end()
 
         # Retrieve documents from Qdrant.
-        collection_name = f"module_{module_id}"
+        collection_name = module_collection_name(module_id)
         print("collection_name",collection_name)
+        span = trace.start("qdrant.scroll", service="qdrant")
         client = get_qdrant_client()
         try:
             documents = client.scroll(collection_name=collection_name)[0]
         except Exception as q_err:
             print(f"Error fetching documents from Qdrant: {str(q_err)}")
             documents = []
+            span.set(error=type(q_err).__name__)
+        span.end(documents=len(documents))
 
         # Generate the bot response.
+        retrieved_files = []
         if documents:  # When documents exist, use the ConversationalRetrievalChain.
-            embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-base-en-v1.5")
+            span = trace.start("embedding.load")
+            embeddings = get_embeddings()
             vectorstore = QdrantVectorStore(
                 client=client,
                 collection_name=collection_name,
                 embedding=embeddings
             )
+            span.end()
             retriever = vectorstore.as_retriever(
                 search_kwargs={
                     "k": 3,  # Increase how many to return
@@ -494,7 +561,11 @@ def send_message():
                 """
                             )
             # Run similarity search
+            span = trace.start("retrieval", service="qdrant")
             docs_and_scores = vectorstore.similarity_search_with_score(user_message, k=3)
+            retrieved_files = [doc.metadata.get("filename") for doc, _ in docs_and_scores]
+            span.end(hits=len(docs_and_scores),
+                     topScore=round(docs_and_scores[0][1], 4) if docs_and_scores else None)
 
             # Print similarity score and filename from metadata
             for doc, score in docs_and_scores:
@@ -504,6 +575,7 @@ def send_message():
             prompt_tokens = 0
             completion_tokens = 0
             
+            span = trace.start("llm", service="openrouter")
             with get_openai_callback() as cb:
                 chain = ConversationalRetrievalChain.from_llm(
                     llm=ChatOpenAI(
@@ -522,6 +594,7 @@ def send_message():
                 bot_response = chain_result.get("answer", "I'm sorry, I couldn't generate a response.")
                 prompt_tokens = cb.prompt_tokens
                 completion_tokens = cb.completion_tokens
+            latency_ms = round(span.end(promptTokens=prompt_tokens, completionTokens=completion_tokens).duration_ms)
 
         # No documents: build prompt from conversation_history.
         else:  
@@ -539,19 +612,19 @@ def send_message():
                 openai_api_base=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
             )
             
+            span = trace.start("llm", service="openrouter")
             llm_result = llm.invoke([HumanMessage(content=prompt_text)])
             bot_response = llm_result.content
             token_usage = llm_result.response_metadata.get("token_usage", {})
             prompt_tokens = token_usage.get("prompt_tokens", 0)
             completion_tokens = token_usage.get("completion_tokens", 0)
+            latency_ms = round(span.end(promptTokens=prompt_tokens, completionTokens=completion_tokens).duration_ms)
 
 
         # Calculate cost and deduct from the student's credit balance
+        used_tokens = prompt_tokens + completion_tokens
         cost = (prompt_tokens * prompt_price) + (completion_tokens * completion_price)
         print("Cost of this request:", cost)
-        print("Student credit before deduction:", assignment.studentCredits)
-        assignment.studentCredits -= cost
-        print("Student credit after deduction:", assignment.studentCredits)
 
         # Save the user's message.
         user_msg = ChatMessage(
@@ -565,14 +638,36 @@ def send_message():
             chatID=chat_id,
             sender="ai",
             content=bot_response,
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            model=settings.model,
+            promptTokens=prompt_tokens,
+            completionTokens=completion_tokens,
+            cost=cost,
+            latencyMs=latency_ms,
+            retrievalHits=len(retrieved_files)
         )
 
         # Add all changes to the session and commit once.
-        db.session.add(assignment)
+        span = trace.start("db.save")
+        # Deducted in SQL rather than from the balance read before the LLM call, so credits
+        # granted while the call was running aren't overwritten
+        balance = db.session.execute(
+            update(ModuleAssignment)
+            .where(ModuleAssignment.assignmentID == assignment.assignmentID)
+            .values(studentCredits=func.coalesce(ModuleAssignment.studentCredits, 0) - cost)
+            .returning(ModuleAssignment.studentCredits)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+        print("Student credit after deduction:", balance)
         db.session.add(user_msg)
         db.session.add(bot_msg)
+        record_turn(assignment.moduleID, assignment.userID, prompt_tokens, completion_tokens, cost,
+                    documents=retrieved_files)
         db.session.commit()
+        span.end()
+        trace.set(promptTokens=prompt_tokens, completionTokens=completion_tokens, cost=cost)
+        metrics.credits_consumed.inc(cost, module=assignment.moduleID)
+        notify_users([assignment.userID])
 
         # IMPORTANT: Do not update the chatlog once the title is generated.
         return jsonify({
@@ -586,26 +681,110 @@ def send_message():
     except Exception as e:
         traceback.print_exc()
         db.session.rollback()
+        trace.set(error=str(e))
         return jsonify({"error": str(e)}), 500
+    finally:
+        if ticket:
+            scheduler.release(ticket, used_tokens, duration=time.monotonic() - admitted)
+        trace.finish()
+
+
+MAX_MESSAGE_PAGE_SIZE = 200
+MAX_CHAT_PAGE_SIZE = 100
+
+
+def _parse_since(since, types):
+    """A 'since' value may be a cursor or a plain ISO timestamp; returns (timestamp, id or None)."""
+    try:
+        return tuple(decode_cursor(since, types))
+    except ValueError:
+        try:
+            return datetime.fromisoformat(since), None
+        except ValueError:
+            raise ValueError("since must be a cursor or an ISO timestamp")
+
+
+def _paginated_messages(chat_id):
+    """
+    Returns a chat's messages in ascending (timestamp, messageID) order.
+
+    Without query params every message is returned. Otherwise:
+      since=<cursor or ISO timestamp> - only messages after it (incremental refresh)
+      before=<cursor>                 - only messages before it (loading older history)
+      limit=<n>                       - at most n: the oldest n after `since`, else the newest n
+    Each message's 'cursor' can be passed back as since/before.
+    """
+    since = request.args.get('since')
+    before = request.args.get('before')
+    limit = get_limit(maximum=MAX_MESSAGE_PAGE_SIZE)
+    since_key = _parse_since(since, [datetime, int]) if since else None
+    before_key = tuple(decode_cursor(before, [datetime, int])) if before else None
+    newest_first = bool(limit and not since)
+
+    query = db.session.query(
+        ChatMessage.messageID, ChatMessage.chatID, ChatMessage.sender, ChatMessage.content, ChatMessage.timestamp
+    ).filter(ChatMessage.chatID == chat_id)
+
+    if since_key:
+        since_timestamp, since_id = since_key
+        if since_id is None:
+            query = query.filter(ChatMessage.timestamp > since_timestamp)
+        else:
+            query = query.filter(keyset_after(ChatMessage.timestamp, ChatMessage.messageID, since_timestamp, since_id))
+    if before_key:
+        query = query.filter(keyset_before(ChatMessage.timestamp, ChatMessage.messageID, *before_key))
+
+    if newest_first:
+        # Newest page first from the index, then back into reading order
+        messages = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.messageID.desc()).limit(limit).all()
+        messages.reverse()
+    else:
+        query = query.order_by(ChatMessage.timestamp.asc(), ChatMessage.messageID.asc())
+        messages = query.limit(limit).all() if limit else query.all()
+
+    if not messages:
+        # Archived chats have no rows left in ChatMessage; page through the archived copy instead
+        archived = load_archived_messages(chat_id)
+        if archived:
+            return _page_archived_messages(archived, since_key, before_key, limit, newest_first)
+    return messages
+
+
+def _page_archived_messages(messages, since_key, before_key, limit, newest_first):
+    """Applies the since/before/limit rules of _paginated_messages to an archived chat."""
+    if since_key:
+        since_timestamp, since_id = since_key
+        if since_id is None:
+            messages = [m for m in messages if m.timestamp > since_timestamp]
+        else:
+            messages = [m for m in messages if (m.timestamp, m.messageID) > (since_timestamp, since_id)]
+    if before_key:
+        messages = [m for m in messages if (m.timestamp, m.messageID) < before_key]
+    if limit:
+        messages = messages[-limit:] if newest_first else messages[:limit]
+    return messages
 
 
 @chatbot_bp.route('/get-chat-history/<int:chat_id>', methods=['GET'])
 def get_chat_history(chat_id):
+    """
+    Returns the messages of a chat session. Supports the since/before/limit
+    params described in _paginated_messages.
+    """
     try:
-        messages = (
-            db.session.query(ChatMessage)
-            .filter_by(chatID=chat_id)
-            .order_by(ChatMessage.timestamp.asc())
-            .all()
-        )
+        messages = _paginated_messages(chat_id)
         history = [{
+            "messageID": msg.messageID,
             "sender": msg.sender,
             "content": msg.content,
-            "timestamp": msg.timestamp.isoformat()
+            "timestamp": msg.timestamp.isoformat(),
+            "cursor": encode_cursor(msg.timestamp, msg.messageID)
         } for msg in messages]
 
         return jsonify({"chat_history": history}), 200
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -614,24 +793,50 @@ def get_chat_history(chat_id):
 @chatbot_bp.route('/get-chat-history/<user_id>/<module_id>', methods=['GET'])
 def get_chat_history_for_user_module(user_id, module_id):
     """
-    Returns all chat sessions (with all columns) belonging to the assignment for a given user and module.
+    Returns all chat sessions (with all columns) belonging to the assignment for a given user and module,
+    newest first.
+
+    Optional query params:
+      limit=<n>                       - at most n sessions
+      cursor=<cursor>                 - sessions older than this one (next page)
+      since=<cursor or ISO timestamp> - only sessions started after it
     """
     try:
         assignment = ModuleAssignment.query.filter_by(userID=user_id, moduleID=str(module_id)).first()
         if not assignment:
             return jsonify({"error": "No assignment found for the given user and module"}), 404
 
-        chats = ChatHistory.query.filter_by(assignmentID=assignment.assignmentID) \
-            .order_by(ChatHistory.dateStarted.desc()).all()
+        limit = get_limit(maximum=MAX_CHAT_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        since = request.args.get('since')
+
+        query = db.session.query(
+            ChatHistory.historyID, ChatHistory.assignmentID, ChatHistory.chatlog, ChatHistory.dateStarted
+        ).filter(ChatHistory.assignmentID == assignment.assignmentID)
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor, [datetime, int])
+            query = query.filter(keyset_before(ChatHistory.dateStarted, ChatHistory.historyID, cursor_date, cursor_id))
+        if since:
+            since_date, since_id = _parse_since(since, [datetime, int])
+            if since_id is None:
+                query = query.filter(ChatHistory.dateStarted > since_date)
+            else:
+                query = query.filter(keyset_after(ChatHistory.dateStarted, ChatHistory.historyID, since_date, since_id))
+
+        query = query.order_by(ChatHistory.dateStarted.desc(), ChatHistory.historyID.desc())
+        chats = query.limit(limit).all() if limit else query.all()
         chat_list = []
         for chat in chats:
             chat_list.append({
                 "historyID": chat.historyID,
                 "assignmentID": chat.assignmentID,
                 "chatlog": chat.chatlog,
-                "dateStarted": chat.dateStarted.isoformat()
+                "dateStarted": chat.dateStarted.isoformat(),
+                "cursor": encode_cursor(chat.dateStarted, chat.historyID)
             })
         return jsonify(chat_list), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -640,21 +845,24 @@ def get_chat_history_for_user_module(user_id, module_id):
 @chatbot_bp.route('/get-chat-message/<int:chat_id>', methods=['GET'])
 def get_chat_message(chat_id):
     """
-    Returns all messages (with all columns) for the given chat session.
+    Returns all messages (with all columns) for the given chat session. Supports the
+    since/before/limit params described in _paginated_messages.
     """
     try:
-        messages = db.session.query(ChatMessage) \
-            .filter_by(chatID=chat_id) \
-            .order_by(ChatMessage.timestamp.asc()).all()
+        messages = _paginated_messages(chat_id)
         msg_list = []
         for msg in messages:
             msg_list.append({
+                "messageID": msg.messageID,
                 "chatID": msg.chatID,
                 "sender": msg.sender,
                 "content": msg.content,
-                "timestamp": msg.timestamp.isoformat()
+                "timestamp": msg.timestamp.isoformat(),
+                "cursor": encode_cursor(msg.timestamp, msg.messageID)
             })
         return jsonify(msg_list), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
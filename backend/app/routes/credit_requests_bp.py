@@ -1,48 +1,109 @@
 from flask import Blueprint, jsonify, request, current_app
+from sqlalchemy import select, update
 from app.models.credit_requests import CreditRequest
 from app.models.module_assignment import ModuleAssignment
 from app.models.users import User
 from app.models.module import Module
 from app.db import db
-import sys
-from datetime import datetime, timedelta, timedelta
+from app.services import notifications
+from app.services.credits import MAX_BULK_REQUESTS, set_pending_status
+from app.services.notifications import unseen_approvals
+from app.services.pagination import encode_cursor, decode_cursor, keyset_before, get_limit
+from datetime import datetime
 
 credit_requests_bp = Blueprint('credit_requests', __name__)
 
+# Values allowed by the constraint on CreditRequests.status
+CREDIT_REQUEST_STATUSES = {"Pending", "Approved", "Rejected", "Cancelled"}
+MAX_CREDIT_REQUEST_PAGE_SIZE = 500
+
+
+def _parse_date_param(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or timestamp")
+
+
 @credit_requests_bp.route('/credit-requests', methods=['GET'])
 def get_credit_requests():
-    print("Fetching credit requests...", file=sys.stderr)
-    requests_data = db.session.query(
-        CreditRequest,
-        User.studentID,
-        User.name,
-        Module.moduleID,
-        Module.moduleName
-    ).outerjoin(ModuleAssignment, CreditRequest.assignmentID == ModuleAssignment.assignmentID)\
-    .outerjoin(User, ModuleAssignment.userID == User.userID)\
-    .outerjoin(Module, ModuleAssignment.moduleID == Module.moduleID)\
-    .all()
-    print(f"Raw requests_data count: {len(requests_data)}", file=sys.stderr)
-
-    results = []
-    for index, (req_object, student_id_val, student_name_val, module_id_val, module_name_val) in enumerate(requests_data):
-        print(f"Processing item {index}:", file=sys.stderr)
-        print(f"  Raw query - requestID: {req_object.requestID}, student_id_val: {student_id_val}, student_name_val: {student_name_val}, module_id_val: {module_id_val}, module_name_val: {module_name_val}", file=sys.stderr)
-        r_dict_from_model = req_object.to_dict()
-        print(f"From req_object.to_dict(): {r_dict_from_model}", file=sys.stderr)
-        
-        # Explicitly set/overwrite fields from the query results
-        final_r_dict = r_dict_from_model.copy() # Start with what to_dict() provided
-        final_r_dict['studentID'] = student_id_val
-        final_r_dict['studentName'] = student_name_val
-        final_r_dict['moduleID'] = module_id_val
-        final_r_dict['moduleName'] = module_name_val
-        
-        print(f"  Final r_dict for response: {final_r_dict}", file=sys.stderr)
-        results.append(final_r_dict)
-    
-    print(f"Finished processing all items.", file=sys.stderr)
-    return jsonify(results), 200
+    """
+    Lists credit requests with the requesting student and module, newest first.
+
+    Optional query params:
+      status=<s>[,<s>...]  - only these statuses (e.g. Pending, or Approved,Rejected)
+      moduleID=<id>        - only requests for this module
+      userID=<id>          - only requests made by this user
+      from=<ISO date>      - requested on or after this time
+      to=<ISO date>        - requested before this time
+      limit=<n>            - at most n requests
+      cursor=<cursor>      - requests older than this one (next page)
+    Each request's 'cursor' can be passed back to fetch the next page.
+    """
+    try:
+        limit = get_limit(maximum=MAX_CREDIT_REQUEST_PAGE_SIZE)
+        statuses = [s for s in request.args.get('status', '').split(',') if s]
+        if any(s not in CREDIT_REQUEST_STATUSES for s in statuses):
+            return jsonify({"error": f"status must be one of {', '.join(sorted(CREDIT_REQUEST_STATUSES))}"}), 400
+        module_id = request.args.get('moduleID')
+        user_id = request.args.get('userID', type=int)
+        date_from = _parse_date_param('from')
+        date_to = _parse_date_param('to')
+        cursor = request.args.get('cursor')
+
+        # Only the columns the dashboard shows, so no ORM objects or lazy loads per row
+        query = db.session.query(
+            CreditRequest.requestID,
+            CreditRequest.assignmentID,
+            CreditRequest.creditsRequested,
+            CreditRequest.status,
+            CreditRequest.requestDate,
+            User.studentID,
+            User.name,
+            Module.moduleID,
+            Module.moduleName
+        ).outerjoin(ModuleAssignment, CreditRequest.assignmentID == ModuleAssignment.assignmentID)\
+        .outerjoin(User, ModuleAssignment.userID == User.userID)\
+        .outerjoin(Module, ModuleAssignment.moduleID == Module.moduleID)
+
+        if statuses:
+            query = query.filter(CreditRequest.status.in_(statuses))
+        if module_id:
+            query = query.filter(ModuleAssignment.moduleID == module_id)
+        if user_id is not None:
+            query = query.filter(ModuleAssignment.userID == user_id)
+        if date_from:
+            query = query.filter(CreditRequest.requestDate >= date_from)
+        if date_to:
+            query = query.filter(CreditRequest.requestDate < date_to)
+        if cursor:
+            cursor_date, cursor_id = decode_cursor(cursor, [datetime, int])
+            query = query.filter(keyset_before(CreditRequest.requestDate, CreditRequest.requestID, cursor_date, cursor_id))
+
+        query = query.order_by(CreditRequest.requestDate.desc(), CreditRequest.requestID.desc())
+        rows = query.limit(limit).all() if limit else query.all()
+        current_app.logger.debug("Credit requests: %d rows (status=%s, moduleID=%s, userID=%s, limit=%s)",
+                                 len(rows), statuses, module_id, user_id, limit)
+
+        return jsonify([{
+            "requestID": row.requestID,
+            "assignmentID": row.assignmentID,
+            "creditsRequested": row.creditsRequested,
+            "status": row.status,
+            "requestDate": row.requestDate.isoformat() if row.requestDate else None,
+            "studentID": row.studentID,
+            "studentName": row.name,
+            "moduleID": row.moduleID,
+            "moduleName": row.moduleName,
+            "cursor": encode_cursor(row.requestDate, row.requestID)
+        } for row in rows]), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @credit_requests_bp.route('/credit-requests/<int:request_id>/status', methods=['PATCH'])
 def update_credit_request_status(request_id):
@@ -51,20 +112,23 @@ def update_credit_request_status(request_id):
     if new_status not in ["Approved", "Rejected"]: #statuses are: 'Pending', 'Approved', 'Rejected', 'Cancelled' (This is a constraint for status column in the database)
         return jsonify({"error": "Invalid status"}), 400
     
-    req = CreditRequest.query.get(request_id)
+    req = db.session.get(CreditRequest, request_id)
     if not req:
         return jsonify({"error": "Request not found"}), 404
-      # If approving the request, add credits to the student's account
-    if new_status == "Approved" and req.status != "Approved":
-        # Find the module assignment to update student credits
-        module_assignment = ModuleAssignment.query.get(req.assignmentID)
-        if module_assignment:
-            # Add the requested credits to the student's current credits
-            current_credits = module_assignment.studentCredits or 0
-            module_assignment.studentCredits = current_credits + req.creditsRequested
-    
-    req.status = new_status
-    db.session.commit()
+
+    # Same atomic path as the bulk endpoint: only a request that is still pending changes,
+    # and approved credits are added with studentCredits = studentCredits + n
+    try:
+        changed = set_pending_status(new_status, request_ids=[request_id])
+        db.session.commit()
+        if new_status == "Approved":
+            notifications.notify_assignments([row.assignmentID for row in changed])
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    db.session.refresh(req)
+    if not changed:
+        return jsonify({"error": f"Request is no longer pending (status: {req.status})"}), 409
     
     updated_req_data = req.to_dict()
     # Attempt to add/update studentID, studentName, moduleID, and moduleName by re-querying based on assignmentID
@@ -86,34 +150,54 @@ def update_credit_request_status(request_id):
         
     return jsonify(updated_req_data), 200
 
+@credit_requests_bp.route('/credit-requests/status', methods=['PATCH'])
+def bulk_update_credit_request_status():
+    """
+    Approves or rejects many pending requests in one transaction.
+
+    Body: {"status": "Approved" | "Rejected", and either "requestIDs": [...] or "moduleID": "..."
+    for every pending request in that module}. Requests that aren't pending are left unchanged
+    and listed in 'skipped'.
+    """
+    data = request.get_json(silent=True) or {}
+    new_status = data.get('status')
+    request_ids = data.get('requestIDs')
+    module_id = data.get('moduleID')
+
+    if new_status not in ["Approved", "Rejected"]:
+        return jsonify({"error": "Invalid status"}), 400
+    if (request_ids is None) == (module_id is None):
+        return jsonify({"error": "Provide either requestIDs or moduleID"}), 400
+    if request_ids is not None:
+        if not isinstance(request_ids, list) or not all(isinstance(i, int) for i in request_ids):
+            return jsonify({"error": "requestIDs must be a list of integers"}), 400
+        if len(request_ids) > MAX_BULK_REQUESTS:
+            return jsonify({"error": f"At most {MAX_BULK_REQUESTS} requests can be updated at once"}), 400
+
+    try:
+        changed = set_pending_status(new_status, request_ids=request_ids, module_id=module_id)
+        db.session.commit()
+        if new_status == "Approved":
+            notifications.notify_assignments([row.assignmentID for row in changed])
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    changed_ids = {row.requestID for row in changed}
+    return jsonify({
+        "status": new_status,
+        "updated": len(changed),
+        "requestIDs": sorted(changed_ids),
+        "skipped": [i for i in dict.fromkeys(request_ids) if i not in changed_ids] if request_ids else [],
+        "assignments": len({row.assignmentID for row in changed}),
+        "creditsGranted": sum(row.creditsRequested for row in changed) if new_status == "Approved" else 0
+    }), 200
+
 @credit_requests_bp.route('/credit-requests/user/<int:user_id>/approved', methods=['GET'])
 def get_user_approved_requests(user_id):
-    """Get approved credit requests for a specific user for notifications"""
+    """Get the approved credit requests a user hasn't seen yet, for notifications"""
     try:
-        approved_requests = db.session.query(
-            CreditRequest,
-            Module.moduleID,
-            Module.moduleName
-        ).join(ModuleAssignment, CreditRequest.assignmentID == ModuleAssignment.assignmentID)\
-        .join(User, ModuleAssignment.userID == User.userID)\
-        .join(Module, ModuleAssignment.moduleID == Module.moduleID)\
-        .filter(
-            User.userID == user_id,
-            CreditRequest.status == 'Approved'
-        ).all()
-        
-        result = []
-        for credit_req, module_id, module_name in approved_requests:
-            result.append({
-                'requestID': credit_req.requestID,
-                'creditsRequested': credit_req.creditsRequested,
-                'moduleID': module_id,
-                'moduleName': module_name,
-                'message': f'Your request for {credit_req.creditsRequested} USD credits for {module_name} has been approved!'
-            })
-        
-        return jsonify(result), 200
-        
+        return jsonify(unseen_approvals(user_id)), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -194,38 +278,56 @@ def delete_credit_request(request_id):
 
 @credit_requests_bp.route('/credit-requests/notifications/<int:user_id>', methods=['GET'])
 def get_user_notifications(user_id):
-    """Get recently approved credit requests for notifications"""
+    """Get approved credit requests the user hasn't marked as seen"""
     try:
-        # Get requests approved in the last 24 hours for this user
-        twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
-        
-        notifications = db.session.query(
-            CreditRequest,
-            User.studentID,
-            User.name,
-            Module.moduleID,
-            Module.moduleName
-        ).join(ModuleAssignment, CreditRequest.assignmentID == ModuleAssignment.assignmentID)\
-        .join(User, ModuleAssignment.userID == User.userID)\
-        .join(Module, ModuleAssignment.moduleID == Module.moduleID)\
-        .filter(
-            User.userID == user_id,
-            CreditRequest.status == 'Approved',
-            # Check if status was recently updated (since we don't have a separate approval timestamp)
-            # We'll use a different approach - check session storage or add a 'seen' field
-        ).all()
-        
         result = []
-        for credit_req, student_id, student_name, module_id, module_name in notifications:
-            result.append({
-                'requestID': credit_req.requestID,
-                'creditsRequested': credit_req.creditsRequested,
-                'moduleID': module_id,
-                'moduleName': module_name,
-                'approvalMessage': f'Your request for {credit_req.creditsRequested} USD credits for {module_name} has been approved!'
-            })
-        
+        for approval in unseen_approvals(user_id):
+            approval['approvalMessage'] = approval.pop('message')
+            result.append(approval)
         return jsonify(result), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@credit_requests_bp.route('/credit-requests/notifications/<int:user_id>/seen', methods=['POST'])
+def mark_notifications_seen(user_id):
+    """
+    Marks the user's approval notifications as seen so they aren't sent again.
+    Body: {"requestIDs": [...]} to mark specific requests; omit it to mark all of them.
+    """
+    data = request.get_json(silent=True) or {}
+    request_ids = data.get('requestIDs')
+    if request_ids is not None and (not isinstance(request_ids, list)
+                                    or not all(isinstance(i, int) for i in request_ids)):
+        return jsonify({'error': 'requestIDs must be a list of integers'}), 400
+    if request_ids is not None and len(request_ids) > MAX_BULK_REQUESTS:
+        return jsonify({'error': f'At most {MAX_BULK_REQUESTS} requests can be updated at once'}), 400
+
+    try:
+        assignment_ids = select(ModuleAssignment.assignmentID).where(ModuleAssignment.userID == user_id)
+        statement = update(CreditRequest).where(
+            CreditRequest.assignmentID.in_(assignment_ids),
+            CreditRequest.status == 'Approved',
+            CreditRequest.seen.is_(False)
+        )
+        if request_ids is not None:
+            statement = statement.where(CreditRequest.requestID.in_(request_ids))
+        result = db.session.execute(statement.values(seen=True).execution_options(synchronize_session=False))
+        db.session.commit()
+        return jsonify({'updated': result.rowcount}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@credit_requests_bp.route('/credit-requests/notifications/<int:user_id>/poll', methods=['GET'])
+def poll_notifications(user_id):
+    """
+    Long-poll for the user's unseen approved credit requests and current balance in each module.
+    Optional query param 'since': the version from the previous response. The response is held
+    until the state differs from it (or NOTIFICATION_WAIT_SECONDS pass); the frontend polls
+    again after pollSeconds.
+    """
+    try:
+        return jsonify(notifications.wait_for_change(user_id, request.args.get('since'))), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
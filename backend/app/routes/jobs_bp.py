@@ -0,0 +1,15 @@
+from flask import Blueprint, jsonify
+from app.db import db
+from app.models.background_job import BackgroundJob
+from app.services.jobs import fail_stale_jobs, job_to_dict
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Get the status and progress of a background job
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    fail_stale_jobs(jobID=job_id)
+    job = db.session.get(BackgroundJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job)), 200
@@ -0,0 +1,9 @@
+from flask import Blueprint, jsonify, request
+from app.services.tracing import latency_percentiles
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Latency percentiles per traced stage (e.g. chat.llm, chat.retrieval) over recent requests
+@metrics_bp.route('/traces/latency', methods=['GET'])
+def get_trace_latency():
+    return jsonify(latency_percentiles(request.args.get('prefix'))), 200
@@ -1,28 +1,20 @@
-import csv
-import io
-import os
-from flask import Blueprint, jsonify, request
-from qdrant_client import QdrantClient
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from app.models.module_assignment import ModuleAssignment
 from app.models.module import Module
 from app.models.users import User
-from app.models.chat_history import ChatHistory
-from app.models.chat_message import ChatMessage
-from app.models.credit_requests import CreditRequest
 from app.db import db
 from app.models.chatbot_settings import ChatbotSettings
+from app.services.chat_export import EXPORT_FORMATS, export_module_chats
+from app.services.enrolment import open_csv, iter_student_ids, stream_enrol
+from app.services.jobs import find_running_job, start_job
+from app.services.modules import delete_module_data, rename_module
+from app.services.usage import module_analytics
 
-modules_bp = Blueprint('modules', __name__)
+# Bounds of the module analytics query params
+MAX_ANALYTICS_DAYS = 366
+MAX_TOP_DOCUMENTS = 100
 
-def get_qdrant_client():
-    return QdrantClient(
-        url=os.getenv("QDRANT_HOST"),
-        api_key=os.getenv("QDRANT_API_KEY"),
-        prefer_grpc=False,
-        https=True,
-        timeout=10.0,
-        check_compatibility=False
-    )
+modules_bp = Blueprint('modules', __name__)
 
 @modules_bp.route('/get-assigned-modules', methods=['GET'])
 def get_assigned_modules():
@@ -102,26 +94,14 @@ def add_module():
         if 'csvFile' in request.files:
             csv_file = request.files['csvFile']
             if csv_file:
-                # Read CSV file
-                stream = io.StringIO(csv_file.stream.read().decode("UTF8"))
-                csv_reader = csv.DictReader(stream)
-                
-                # Process each row in the CSV
-                for row in csv_reader:
-                    student_id = row['studentID']
-                    
-                    # Find user by student_id
-                    user = User.query.filter_by(studentID=student_id).first()
-                    if user:
-                        # Create module assignment for this student
-                        student_assignment = ModuleAssignment(
-                            userID=user.userID,
-                            moduleID=module_id,
-                            studentCredits=initial_credit
-                        )
-                        db.session.add(student_assignment)
-                    else:
-                        invalid_students.append(student_id)
+                # Stream the CSV and match students to existing accounts in batches. Nothing is
+                # committed until the whole file is read, so a bad file doesn't leave a half-created
+                # module behind that a retry would then be refused for
+                report = stream_enrol(module_id, iter_student_ids(open_csv(csv_file)), initial_credit,
+                                      create_missing_users=False, commit_batches=False)
+                invalid_students = report.not_found_ids + report.invalid_ids
+                if report.not_found_count > len(report.not_found_ids):
+                    invalid_students.append(f"and {report.not_found_count - len(report.not_found_ids)} more")
 
         # Commit all changes
         db.session.commit()
@@ -133,6 +113,9 @@ def add_module():
         
         return jsonify(response), 201
 
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -140,6 +123,10 @@ def add_module():
 
 @modules_bp.route('/delete-module', methods=['DELETE'])
 def delete_module():
+    """
+    Starts deleting a module and all its data in the background and returns 202
+    with a jobID; progress is available from GET /api/jobs/<jobID>.
+    """
     try:
         data = request.get_json()
         module_id = data.get('moduleID')
@@ -148,55 +135,18 @@ def delete_module():
             return jsonify({"error": "Module ID is required"}), 400
 
         # Find the module
-        module = Module.query.get(module_id)
+        module = db.session.get(Module, module_id)
         if not module:
             return jsonify({"error": f"Module {module_id} not found"}), 404
 
-        # Get all module assignments for this module to find related records
-        module_assignments = ModuleAssignment.query.filter_by(moduleID=module_id).all()
-        assignment_ids = [assignment.assignmentID for assignment in module_assignments]
-
-        # Delete in the correct order to avoid foreign key constraint violations:
-        
-        if assignment_ids:
-            # First, get all chat history IDs for these assignments
-            chat_histories = ChatHistory.query.filter(ChatHistory.assignmentID.in_(assignment_ids)).all()
-            chat_history_ids = [chat.historyID for chat in chat_histories]
-            
-            # 1. Delete ChatMessage records that reference ChatHistory.historyID
-            if chat_history_ids:
-                ChatMessage.query.filter(ChatMessage.chatID.in_(chat_history_ids)).delete()
-            
-            # 2. Delete ChatHistory records that reference ModuleAssignment.assignmentID
-            ChatHistory.query.filter(ChatHistory.assignmentID.in_(assignment_ids)).delete()
-            
-            # 3. Delete CreditRequest records that reference ModuleAssignment.assignmentID
-            CreditRequest.query.filter(CreditRequest.assignmentID.in_(assignment_ids)).delete()
-        
-        # 4. Delete ModuleAssignment records
-        ModuleAssignment.query.filter_by(moduleID=module_id).delete()
-
-        # 5. Delete ChatbotSettings records that reference moduleID
-        ChatbotSettings.query.filter_by(moduleID=module_id).delete()
-
-        # 5. Delete Qdrant collection for this module
-        try:
-            client = get_qdrant_client()
-            collection_name = f"module_{module_id}"
-            if collection_name in [c.name for c in client.get_collections().collections]:
-                client.delete_collection(collection_name=collection_name)
-        except Exception as e:
-            print(f"Error deleting Qdrant collection: {str(e)}")
-
-        # 6. Finally, delete the module itself
-        db.session.delete(module)
-        
-        # Commit all the changes
-        db.session.commit()
+        # A repeated request joins the deletion already in progress
+        running = find_running_job("delete-module", module_id)
+        job_id = running.jobID if running else start_job("delete-module", module_id, delete_module_data, module_id)
 
         return jsonify({
-            "message": f"Module {module_id} and all related data deleted successfully"
-        }), 200
+            "message": f"Module {module_id} and all related data are being deleted",
+            "jobID": job_id
+        }), 202
 
     except Exception as e:
         db.session.rollback()
@@ -233,36 +183,15 @@ def edit_module():
             if existing_module:
                 return jsonify({"error": f"Module ID {new_module_id} already exists"}), 400
 
-            # Create new module with new ID
-            new_module = Module(
-                moduleID=new_module_id,
-                moduleName=module_name,
-                moduleDesc=module_desc,
-                initialCredit=initial_credit
-            )
-            db.session.add(new_module)
-            db.session.flush()  # Flush to ensure new module is in DB
-
-            # Update module assignments to point to new module
-            ModuleAssignment.query.filter_by(moduleID=old_module_id).update({
-                "moduleID": new_module_id
-            })
-
-            # Update ChatbotSettings to point to new module
-            ChatbotSettings.query.filter_by(moduleID=old_module_id).update({
-                "moduleID": new_module_id
-            })
-
-            # Delete old module
-            db.session.delete(module)
+            # Repoints every dependent row and the module's documents, then commits
+            rename_module(module, new_module_id, module_name, module_desc, initial_credit)
         else:
             # Just update the existing module's details
             module.moduleName = module_name
             module.moduleDesc = module_desc
             if initial_credit is not None:
                 module.initialCredit = initial_credit
-
-        db.session.commit()
+            db.session.commit()
 
         return jsonify({
             "message": "Module updated successfully"
@@ -270,4 +199,63 @@ def edit_module():
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+@modules_bp.route('/module-analytics/<module_id>', methods=['GET'])
+def get_module_analytics(module_id):
+    """
+    Spend and usage of a module for instructors, served from the usage summaries
+    kept up to date by every chat turn and credit grant.
+
+    Optional query params:
+      days         - days of daily activity to return, ending today (default 30)
+      top          - number of most retrieved documents (default 10)
+      creditsBelow - students with fewer credits than this are listed in lowCredits (default 1)
+    """
+    try:
+        days = request.args.get('days', 30, type=int)
+        top = request.args.get('top', 10, type=int)
+        credits_below = request.args.get('creditsBelow', 1.0, type=float)
+        if not 1 <= days <= MAX_ANALYTICS_DAYS or not 1 <= top <= MAX_TOP_DOCUMENTS:
+            return jsonify({"error": f"days must be between 1 and {MAX_ANALYTICS_DAYS} "
+                                     f"and top between 1 and {MAX_TOP_DOCUMENTS}"}), 400
+
+        if not db.session.get(Module, module_id):
+            return jsonify({"error": f"Module {module_id} not found"}), 404
+
+        return jsonify(module_analytics(module_id, days=days, top_documents=top, credits_below=credits_below)), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@modules_bp.route('/export-module-chats/<module_id>', methods=['GET'])
+def export_module_chats_file(module_id):
+    """
+    Downloads every message of a module's chats, one row per message, streamed as it's
+    read from the database so the export never has to fit in memory.
+
+    Optional query params:
+      format          - 'csv' (default) or 'jsonl'
+      gzip            - 'true' to gzip-compress the file
+      includeArchived - 'false' to leave out chats moved to the chat archive (included by default)
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    include_archived = request.args.get('includeArchived', 'true').lower() != 'false'
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    try:
+        if not db.session.get(Module, module_id):
+            return jsonify({"error": f"Module {module_id} not found"}), 404
+        chunks = export_module_chats(module_id, export_format, compress=compress, include_archived=include_archived)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    filename = f"{module_id}-chats.{export_format}{'.gz' if compress else ''}"
+    return Response(stream_with_context(chunks),
+                    mimetype='application/gzip' if compress else EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
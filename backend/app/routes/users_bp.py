@@ -1,43 +1,111 @@
-from flask import Blueprint, jsonify, request, make_response
-from flask_jwt_extended import create_access_token, set_access_cookies, jwt_required, get_jwt_identity, unset_jwt_cookies
+from flask import Blueprint, Response, jsonify, request, make_response, stream_with_context
+from flask_jwt_extended import (create_access_token, set_access_cookies, jwt_required, get_jwt, get_jwt_identity,
+                                unset_jwt_cookies, verify_jwt_in_request)
 from datetime import datetime, timedelta
-from datetime import timedelta
+from sqlalchemy import or_, select
+import json
 from app.models.users import User
+from app.models.module_assignment import ModuleAssignment
 from app.db import db
+from app.services import identity
+from app.services.identity import get_profile, identity_claims, invalidate, profile_from_claims
+from app.services.pagination import encode_cursor, decode_cursor, get_limit
 
 users_bp = Blueprint('users', __name__)
 
+
+def _create_token(user_id):
+    claims = identity_claims(get_profile(user_id)) if identity.JWT_IDENTITY_CLAIMS else {}
+    return create_access_token(identity=str(user_id), additional_claims=claims, expires_delta=timedelta(days=1))
+
+
+MAX_USER_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+
+
+def _user_json(row):
+    return {
+        "userID": row.userID,
+        "name": row.name,
+        "email": row.email,
+        "mobileNumber": row.mobileNumber,
+        "role": row.role,
+        "studentID": row.studentID
+    }
+
+
 # 1. Get all users
 @users_bp.route('/users', methods=['GET'])
 def get_all_users():
-    users = User.query.all()
-
-    if not users:
-        return jsonify({'message': 'No users found'}), 404
-
-    return jsonify([
-        {
-            "userID": user.userID,
-            "email": user.email,
-            "mobileNumber": user.mobileNumber,
-            "role": user.role
-        } for user in users
-    ]), 200
+    """
+    Lists users ordered by userID, without their passwords.
+
+    Optional query params:
+      role=<role>          - only users with this role
+      moduleID=<id>        - only users enrolled in this module
+      q=<text>             - name or email containing the text, or this student ID
+      limit=<n>            - at most n users
+      cursor=<cursor>      - users after this one (next page)
+      format=ndjson        - stream every matching user as newline-delimited JSON (for exports)
+    Each user's 'cursor' can be passed back to fetch the next page.
+    """
+    try:
+        limit = get_limit(maximum=MAX_USER_PAGE_SIZE)
+        role = request.args.get('role')
+        module_id = request.args.get('moduleID')
+        search = request.args.get('q', '').strip()
+        cursor = request.args.get('cursor')
+
+        # Only the exposed columns, so passwords never leave the database
+        query = db.session.query(User.userID, User.name, User.email, User.mobileNumber, User.role, User.studentID)
+        if role:
+            query = query.filter(User.role == role)
+        if module_id:
+            query = query.filter(User.userID.in_(
+                select(ModuleAssignment.userID).where(ModuleAssignment.moduleID == module_id)
+            ))
+        if search:
+            pattern = f"%{search}%"
+            conditions = [User.name.ilike(pattern), User.email.ilike(pattern)]
+            if search.isdigit():
+                conditions.append(User.studentID == int(search))
+            query = query.filter(or_(*conditions))
+        if cursor:
+            (after_id,) = decode_cursor(cursor, [int])
+            query = query.filter(User.userID > after_id)
+        query = query.order_by(User.userID)
+        if limit:
+            query = query.limit(limit)
+
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                for row in query.yield_per(EXPORT_BATCH_SIZE):
+                    yield json.dumps(_user_json(row)) + "\n"
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                            headers={'Content-Disposition': 'attachment; filename=users.ndjson'})
+
+        users = query.all()
+        if not users and not (role or module_id or search or cursor):
+            return jsonify({'message': 'No users found'}), 404
+
+        return jsonify([{**_user_json(row), "cursor": encode_cursor(row.userID)} for row in users]), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
 # 2. Get user by ID
 @users_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user_by_id(user_id):
-    user = User.query.get(user_id)
+    user = get_profile(user_id)
 
     if not user:
         return jsonify({'message': 'User not found'}), 404
 
     return jsonify({
-        "userID": user.userID,
-        "email": user.email,
-        "mobileNumber": user.mobileNumber,
-        "role": user.role,
-        "name": user.name
+        "userID": user["userID"],
+        "email": user["email"],
+        "mobileNumber": user["mobileNumber"],
+        "role": user["role"],
+        "name": user["name"]
     }), 200
 
 # 3. Login
@@ -57,7 +125,7 @@ def login():
         return jsonify({'error': 'Invalid email or password'}), 401
 
     # ✅ Generate JWT token valid for 1 day
-    access_token = create_access_token(identity=str(user.userID), expires_delta=timedelta(days=1))
+    access_token = _create_token(user.userID)
 
     # ✅ Create response with secure cookie
     response = make_response(jsonify({
@@ -87,19 +155,13 @@ def logout():
 @jwt_required()
 def me():
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    # Tokens issued with JWT_IDENTITY_CLAIMS carry the profile; otherwise it comes from the cache
+    user = profile_from_claims(user_id, get_jwt()) or get_profile(user_id)
 
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    return jsonify({
-        "userID": user.userID,
-        "name": user.name,
-        "email": user.email,
-        "mobileNumber": user.mobileNumber,
-        "role": user.role,
-        "studentID": user.studentID
-    }), 200
+    return jsonify(user), 200
 
 # 4. Update user details
 @users_bp.route('/users/<int:user_id>', methods=['PUT'])
@@ -118,7 +180,12 @@ def update_user(user_id):
 
     try:
         db.session.commit()
-        return jsonify({'message': 'User updated successfully'}), 200
+        invalidate(user_id)
+        response = make_response(jsonify({'message': 'User updated successfully'}))
+        # A token carrying the old profile is replaced when users update themselves
+        if identity.JWT_IDENTITY_CLAIMS and verify_jwt_in_request(optional=True) and get_jwt_identity() == str(user_id):
+            set_access_cookies(response, _create_token(user_id), max_age=60*60*24)
+        return response, 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to update user details'}), 500
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+Cold storage for old chat sessions.
+
+Chats whose last message is older than CHAT_ARCHIVE_AFTER_DAYS have their messages
+moved out of ChatMessage into append-only, per-module archive files under
+CHAT_ARCHIVE_DIR. Each chat is written as its own compressed frame (zstd if the
+zstandard package is installed, gzip otherwise) and ArchivedChat records the byte
+range, so retrieving one chat decompresses only that chat.
+
+The ChatHistory row stays in the database, so archived sessions still show up in
+a student's chat list.
+"""
+import gzip
+import json
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import func
+from app.db import db
+from app.models.archived_chat import ArchivedChat
+from app.models.chat_history import ChatHistory
+from app.models.chat_message import ChatMessage
+from app.models.module_assignment import ModuleAssignment
+
+try:
+    import zstandard
+except ImportError:  # Optional: fall back to gzip
+    zstandard = None
+
+ARCHIVE_DIR = Path(os.getenv("CHAT_ARCHIVE_DIR", "archives"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = 200
+# Message IDs per DELETE (keeps the IN list well under SQL Server's 2100 parameter limit)
+ARCHIVE_DELETE_BATCH_SIZE = 1000
+ARCHIVE_EXTENSION = ".jsonl.zst" if zstandard is not None else ".jsonl.gz"
+
+# Same attributes as the ChatMessage columns the chat endpoints read
+ArchivedMessage = namedtuple("ArchivedMessage", ["messageID", "chatID", "sender", "content", "timestamp"])
+# Usage of 'ai' messages; kept in the archive only when set, and absent from older archives
+USAGE_FIELDS = ("model", "promptTokens", "completionTokens", "cost", "latencyMs", "retrievalHits")
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data)
+
+
+def _decompress(data, path):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"The zstandard package is required to read {path}")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def module_archive_dir(module_id):
+    return ARCHIVE_DIR / str(module_id)
+
+
+def archive_file_path(entry):
+    # Only the file name is stored, so moving ARCHIVE_DIR or renaming a module's directory
+    # doesn't require rewriting ArchivedChat rows
+    return module_archive_dir(entry.moduleID) / entry.archivePath
+
+
+def _chats_to_archive(cutoff, module_id, limit):
+    """IDs and module of unarchived chats whose newest message is older than cutoff."""
+    last_message = db.session.query(
+        ChatMessage.chatID.label("chatID"),
+        func.max(ChatMessage.timestamp).label("lastMessage")
+    ).group_by(ChatMessage.chatID).subquery()
+
+    query = db.session.query(ChatHistory.historyID, ModuleAssignment.moduleID)\
+        .join(last_message, last_message.c.chatID == ChatHistory.historyID)\
+        .join(ModuleAssignment, ModuleAssignment.assignmentID == ChatHistory.assignmentID)\
+        .outerjoin(ArchivedChat, ArchivedChat.historyID == ChatHistory.historyID)\
+        .filter(last_message.c.lastMessage < cutoff, ArchivedChat.historyID.is_(None))
+    if module_id:
+        query = query.filter(ModuleAssignment.moduleID == module_id)
+    return query.order_by(ModuleAssignment.moduleID, ChatHistory.historyID).limit(limit).all()
+
+
+def _archive_batch(module_id, history_ids, path, cutoff):
+    """
+    Writes the chats to the archive file and deletes the messages that were written.
+    Chats that got a message at or after cutoff since they were selected are left as
+    they are. Returns the number of chats archived.
+    """
+    chats = {c.historyID: c for c in ChatHistory.query.filter(ChatHistory.historyID.in_(history_ids))}
+    messages = {}
+    active = set()
+    for msg in ChatMessage.query.filter(ChatMessage.chatID.in_(history_ids))\
+            .order_by(ChatMessage.chatID, ChatMessage.timestamp, ChatMessage.messageID):
+        if msg.timestamp >= cutoff:
+            active.add(msg.chatID)
+        messages.setdefault(msg.chatID, []).append({
+            "messageID": msg.messageID,
+            "sender": msg.sender,
+            "content": msg.content,
+            "timestamp": msg.timestamp.isoformat(),
+            **{field: getattr(msg, field) for field in USAGE_FIELDS if getattr(msg, field) is not None}
+        })
+    history_ids = [history_id for history_id in history_ids if history_id not in active]
+    if not history_ids:
+        return 0
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        for history_id in history_ids:
+            chat = chats[history_id]
+            record = {
+                "historyID": chat.historyID,
+                "assignmentID": chat.assignmentID,
+                "moduleID": module_id,
+                "chatlog": chat.chatlog,
+                "dateStarted": chat.dateStarted.isoformat(),
+                "messages": messages.get(history_id, [])
+            }
+            frame = _compress((json.dumps(record) + "\n").encode("utf-8"))
+            offset = f.tell()
+            f.write(frame)
+            db.session.add(ArchivedChat(
+                historyID=history_id,
+                moduleID=module_id,
+                archivePath=path.name,
+                offset=offset,
+                length=len(frame),
+                messageCount=len(record["messages"]),
+                archivedAt=datetime.utcnow()
+            ))
+        # The file must be durable before the messages are deleted from the database
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Only the messages in the frames: one saved since they were read must not be lost
+    archived_ids = [m["messageID"] for history_id in history_ids for m in messages.get(history_id, [])]
+    for start in range(0, len(archived_ids), ARCHIVE_DELETE_BATCH_SIZE):
+        ChatMessage.query.filter(ChatMessage.messageID.in_(archived_ids[start:start + ARCHIVE_DELETE_BATCH_SIZE]))\
+            .delete(synchronize_session=False)
+    db.session.commit()
+    return len(history_ids)
+
+
+def archive_old_chats(older_than_days=None, module_id=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Moves the messages of every chat idle for longer than older_than_days (default
+    CHAT_ARCHIVE_AFTER_DAYS) into the module's archive file, committing per batch.
+    Returns {moduleID: number of chats archived}.
+    """
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    run_stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    archived = {}
+
+    while True:
+        rows = _chats_to_archive(cutoff, module_id, batch_size)
+        if not rows:
+            break
+        by_module = {}
+        for history_id, chat_module_id in rows:
+            by_module.setdefault(chat_module_id, []).append(history_id)
+        for chat_module_id, history_ids in by_module.items():
+            path = module_archive_dir(chat_module_id) / f"{run_stamp}{ARCHIVE_EXTENSION}"
+            count = _archive_batch(chat_module_id, history_ids, path, cutoff)
+            if count:
+                archived[chat_module_id] = archived.get(chat_module_id, 0) + count
+    return archived
+
+
+def read_archived_chat(f, entry):
+    """Reads the record of the ArchivedChat entry from its archive file, already open as f."""
+    f.seek(entry.offset)
+    return json.loads(_decompress(f.read(entry.length), entry.archivePath))
+
+
+def load_archived_chat(history_id):
+    """Returns the archived record (chat metadata plus 'messages') for a chat, or None."""
+    entry = db.session.get(ArchivedChat, history_id)
+    if not entry:
+        return None
+    with open(archive_file_path(entry), "rb") as f:
+        return read_archived_chat(f, entry)
+
+
+def load_archived_messages(history_id):
+    """Returns an archived chat's messages as ArchivedMessage tuples in order, or None if not archived."""
+    record = load_archived_chat(history_id)
+    if record is None:
+        return None
+    return [ArchivedMessage(
+        messageID=m["messageID"],
+        chatID=history_id,
+        sender=m["sender"],
+        content=m["content"],
+        timestamp=datetime.fromisoformat(m["timestamp"])
+    ) for m in record["messages"]]
+
+
+def restore_chat(history_id):
+    """
+    Moves an archived chat's messages back into ChatMessage (e.g. when the student
+    continues the conversation). The stale frame is left in the archive file.
+    Returns True if the chat was archived. The caller commits.
+    """
+    record = load_archived_chat(history_id)
+    if record is None:
+        return False
+    # Restored messages get new IDs (explicit identity inserts aren't allowed on SQL Server)
+    db.session.add_all(ChatMessage(
+        chatID=history_id, sender=m["sender"], content=m["content"],
+        timestamp=datetime.fromisoformat(m["timestamp"]),
+        **{field: m[field] for field in USAGE_FIELDS if field in m}
+    ) for m in record["messages"])
+    ArchivedChat.query.filter_by(historyID=history_id).delete()
+    return True
@@ -0,0 +1,195 @@
+"""
+Streaming export of a module's chats, one row per message, as CSV or JSONL.
+
+Messages are read with a server-side cursor (yield_per) in chat order and written
+out in chunks as they arrive, so memory use doesn't depend on the size of the
+module. Archived chats are read one compressed frame at a time from the module's
+archive files. Optionally the output is gzip-compressed on the fly.
+
+CSV cells that a spreadsheet would run as a formula are prefixed with a quote.
+The response status is sent before the first row, so an error partway through
+can't become an error response: it is logged and the file ends with an
+EXPORT_ERROR_MESSAGE row (or JSON line) instead of silently stopping short.
+"""
+import csv
+import io
+import json
+import zlib
+from flask import current_app
+from sqlalchemy import select
+from app.db import db
+from app.models.archived_chat import ArchivedChat
+from app.models.chat_history import ChatHistory
+from app.models.chat_message import ChatMessage
+from app.models.module_assignment import ModuleAssignment
+from app.models.users import User
+from app.services.chat_archive import USAGE_FIELDS, archive_file_path, read_archived_chat
+
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+# Rows fetched per round trip, and bytes of output collected before each chunk is sent
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Leading characters that make spreadsheet applications treat a cell as a formula
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+EXPORT_ERROR_MESSAGE = "ERROR: the export failed before the end, this file is incomplete"
+
+EXPORT_COLUMNS = ("historyID", "chatTitle", "dateStarted", "userID", "studentID", "studentName",
+                  "messageID", "sender", "content", "timestamp", *USAGE_FIELDS, "archived")
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _live_messages(module_id):
+    statement = select(
+        ChatHistory.historyID, ChatHistory.chatlog, ChatHistory.dateStarted,
+        User.userID, User.studentID, User.name,
+        ChatMessage.messageID, ChatMessage.sender, ChatMessage.content, ChatMessage.timestamp,
+        *(getattr(ChatMessage, field) for field in USAGE_FIELDS)
+    ).join(ChatHistory, ChatHistory.historyID == ChatMessage.chatID)\
+        .join(ModuleAssignment, ModuleAssignment.assignmentID == ChatHistory.assignmentID)\
+        .join(User, User.userID == ModuleAssignment.userID)\
+        .where(ModuleAssignment.moduleID == module_id)\
+        .order_by(ChatMessage.chatID, ChatMessage.timestamp, ChatMessage.messageID)\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    for row in db.session.execute(statement):
+        yield {
+            "historyID": row.historyID,
+            "chatTitle": row.chatlog,
+            "dateStarted": _isoformat(row.dateStarted),
+            "userID": row.userID,
+            "studentID": row.studentID,
+            "studentName": row.name,
+            "messageID": row.messageID,
+            "sender": row.sender,
+            "content": row.content,
+            "timestamp": _isoformat(row.timestamp),
+            **{field: getattr(row, field) for field in USAGE_FIELDS},
+            "archived": False,
+        }
+
+
+def _archived_messages(module_id):
+    # In file order, so each archive file is read front to back and opened once
+    statement = select(ArchivedChat, User.userID, User.studentID, User.name)\
+        .join(ChatHistory, ChatHistory.historyID == ArchivedChat.historyID)\
+        .join(ModuleAssignment, ModuleAssignment.assignmentID == ChatHistory.assignmentID)\
+        .join(User, User.userID == ModuleAssignment.userID)\
+        .where(ArchivedChat.moduleID == module_id)\
+        .order_by(ArchivedChat.archivePath, ArchivedChat.offset)\
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    path, f = None, None
+    try:
+        for entry, user_id, student_id, name in db.session.execute(statement):
+            if archive_file_path(entry) != path:
+                if f:
+                    f.close()
+                path = archive_file_path(entry)
+                f = open(path, "rb")
+            record = read_archived_chat(f, entry)
+            for m in record["messages"]:
+                yield {
+                    "historyID": record["historyID"],
+                    "chatTitle": record["chatlog"],
+                    "dateStarted": record["dateStarted"],
+                    "userID": user_id,
+                    "studentID": student_id,
+                    "studentName": name,
+                    "messageID": m["messageID"],
+                    "sender": m["sender"],
+                    "content": m["content"],
+                    "timestamp": m["timestamp"],
+                    **{field: m.get(field) for field in USAGE_FIELDS},
+                    "archived": True,
+                }
+    finally:
+        if f:
+            f.close()
+
+
+def iter_module_messages(module_id, include_archived=True):
+    """Every message of the module's chats as a dict of EXPORT_COLUMNS, chat by chat."""
+    yield from _live_messages(module_id)
+    if include_archived:
+        yield from _archived_messages(module_id)
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_line(writer, buffer, values):
+    buffer.seek(0)
+    buffer.truncate()
+    writer.writerow(values)
+    return buffer.getvalue()
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    yield _csv_line(writer, buffer, EXPORT_COLUMNS)
+    for row in rows:
+        yield _csv_line(writer, buffer, (_csv_cell(row[column]) for column in EXPORT_COLUMNS))
+
+
+def _jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _error_line(export_format):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        return _csv_line(csv.writer(buffer), buffer, [EXPORT_ERROR_MESSAGE])
+    return json.dumps({"error": EXPORT_ERROR_MESSAGE}) + "\n"
+
+
+def _ending_on_error(lines, export_format, module_id):
+    """Passes lines through; if reading them fails, logs the error and ends with an error line."""
+    try:
+        yield from lines
+    except Exception:
+        current_app.logger.exception("Export of module %s's chats failed partway through", module_id)
+        yield _error_line(export_format)
+
+
+def _chunked(lines):
+    """Joins lines into chunks of about EXPORT_CHUNK_SIZE bytes, encoded as UTF-8."""
+    chunk, size = [], 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk).encode("utf-8")
+            chunk, size = [], 0
+    if chunk:
+        yield "".join(chunk).encode("utf-8")
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_module_chats(module_id, export_format="csv", compress=False, include_archived=True):
+    """
+    Generator of the bytes of a module's chat export in export_format (see EXPORT_FORMATS).
+    Must be consumed inside an app context (e.g. wrapped in stream_with_context).
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    rows = iter_module_messages(module_id, include_archived)
+    lines = _csv_lines(rows) if export_format == "csv" else _jsonl_lines(rows)
+    chunks = _chunked(_ending_on_error(lines, export_format, module_id))
+    return _gzipped(chunks) if compress else chunks
@@ -0,0 +1,222 @@
+"""
+Coalescing of duplicate requests (double-clicks, frontend retries).
+
+A view wrapped with @coalesced(key) runs once per key: a duplicate that arrives
+while the first request is still running waits for it and gets the same response,
+and one arriving shortly after it finished gets the stored response. Only
+successful responses are stored, so a retry after an error runs again.
+
+Requests with an Idempotency-Key header are remembered for IDEMPOTENCY_TTL seconds;
+without one, identical requests are only treated as duplicates for COALESCE_TTL
+seconds.
+
+Keys are claimed in the IdempotentRequest table, which also stores the response, so
+a duplicate that lands on another gunicorn worker waits for (by polling every
+COALESCE_POLL_SECONDS) or replays the first request's response rather than running
+it again. Duplicates within one worker wait on the first request in memory and
+don't touch the table.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import make_response, request
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from app.db import db
+from app.models.idempotent_request import IdempotentRequest
+from app.services import metrics
+
+COALESCE_TTL = float(os.getenv("COALESCE_TTL", "10"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "300"))
+COALESCE_CACHE_SIZE = int(os.getenv("COALESCE_CACHE_SIZE", "1000"))
+# How long a duplicate waits for the original before giving up with a 409 (a chat turn can take a while).
+# Also how long a claim lasts if the worker running the original dies.
+COALESCE_WAIT_SECONDS = float(os.getenv("COALESCE_WAIT_SECONDS", "120"))
+COALESCE_POLL_SECONDS = float(os.getenv("COALESCE_POLL_SECONDS", "0.5"))
+# Expired rows are deleted at most this often per worker
+COALESCE_PURGE_SECONDS = float(os.getenv("COALESCE_PURGE_SECONDS", "60"))
+
+RUNNING = "running"
+DONE = "done"
+
+coalesced_requests = metrics.Counter("coalesced_requests_total", "Duplicate requests answered from another request.",
+                                     ("endpoint", "source"))
+
+
+class _Call:
+    __slots__ = ("done", "result", "expires")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None   # (body, status, headers) once finished
+        self.expires = None  # Set when a successful result is stored
+
+
+_lock = threading.Lock()
+_calls = OrderedDict()  # key -> _Call, oldest first
+_purged_at = 0.0
+
+
+def request_key(*parts):
+    """A compact key for the given parts (e.g. user, chat and message) plus the Idempotency-Key header."""
+    digest = hashlib.sha256("\x1f".join(str(p) for p in parts).encode()).hexdigest()
+    return digest, request.headers.get("Idempotency-Key")
+
+
+def _expire(now):
+    for key in [k for k, call in _calls.items() if call.expires is not None and call.expires <= now]:
+        del _calls[key]
+    while len(_calls) > COALESCE_CACHE_SIZE:
+        key, call = next(iter(_calls.items()))
+        if not call.done.is_set():
+            break  # Never drop a running call that duplicates may be waiting on
+        del _calls[key]
+
+
+def _replay(result, source):
+    body, status, headers = result
+    response = make_response(body, status)
+    response.headers.update(headers)
+    response.headers["X-Coalesced"] = source
+    coalesced_requests.inc(endpoint=request.endpoint, source=source)
+    return response
+
+
+# --- Shared state in the IdempotentRequest table ---
+
+def _stored_key(key):
+    return hashlib.sha256("\x1f".join(str(p) for p in key).encode()).hexdigest()
+
+
+def _purge_expired(now):
+    global _purged_at
+    if time.monotonic() - _purged_at >= COALESCE_PURGE_SECONDS:
+        _purged_at = time.monotonic()
+        db.session.execute(delete(IdempotentRequest).where(IdempotentRequest.expiresAt <= now))
+
+
+def _claim(stored_key):
+    """
+    Claims the key for this request and commits. Returns None if it was claimed,
+    otherwise the unexpired row of the request that claimed it first.
+    """
+    for _ in range(3):
+        now = datetime.utcnow()
+        _purge_expired(now)
+        db.session.execute(delete(IdempotentRequest).where(IdempotentRequest.requestKey == stored_key,
+                                                           IdempotentRequest.expiresAt <= now))
+        db.session.add(IdempotentRequest(requestKey=stored_key, status=RUNNING,
+                                         expiresAt=now + timedelta(seconds=COALESCE_WAIT_SECONDS)))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+        row = db.session.execute(select(IdempotentRequest).where(IdempotentRequest.requestKey == stored_key)
+                                 .execution_options(populate_existing=True)).scalar_one_or_none()
+        if row is not None and row.expiresAt > now:
+            return row
+        # The claim was released (the request failed) or expired in the meantime; try again
+    raise RuntimeError("Could not claim the request")
+
+
+def _stored_result(row):
+    return row.body, row.statusCode, {"Content-Type": row.contentType}
+
+
+def _wait_for_other_worker(stored_key, row):
+    """Polls until the request that claimed the key finishes. Returns its result, or None if it didn't succeed."""
+    deadline = time.monotonic() + COALESCE_WAIT_SECONDS
+    while row is not None and row.status == RUNNING and time.monotonic() < deadline:
+        db.session.rollback()  # Ends the read transaction so the next read sees the other worker's commit
+        time.sleep(COALESCE_POLL_SECONDS)
+        row = db.session.execute(select(IdempotentRequest).where(IdempotentRequest.requestKey == stored_key)
+                                 .execution_options(populate_existing=True)).scalar_one_or_none()
+    return _stored_result(row) if row is not None and row.status == DONE else None
+
+
+def _release(stored_key, result, ttl):
+    """Stores a successful result for ttl seconds, or deletes the claim so a retry runs again."""
+    db.session.rollback()  # Nothing the view left uncommitted is saved
+    if result is None:
+        db.session.execute(delete(IdempotentRequest).where(IdempotentRequest.requestKey == stored_key))
+    else:
+        body, status, headers = result
+        db.session.execute(update(IdempotentRequest).where(IdempotentRequest.requestKey == stored_key)
+                           .values(status=DONE, statusCode=status, contentType=headers["Content-Type"], body=body,
+                                   expiresAt=datetime.utcnow() + timedelta(seconds=ttl)))
+    db.session.commit()
+
+
+def coalesced(key_func):
+    """
+    key_func() returns the request's key (see request_key), or None to not coalesce it
+    (e.g. when required fields are missing and the view will reject it anyway).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            key = key_func()
+            if key is None:
+                return view(*args, **kwargs)
+            key = (request.endpoint, *key)
+            ttl = IDEMPOTENCY_TTL if key[-1] else COALESCE_TTL
+
+            now = time.monotonic()
+            with _lock:
+                _expire(now)
+                call = _calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _calls[key] = _Call()
+
+            if not leader:
+                if call.done.is_set():
+                    return _replay(call.result, "stored")
+                if not call.done.wait(COALESCE_WAIT_SECONDS):
+                    return {"error": "An identical request is still being processed"}, 409
+                if call.result is None:
+                    return {"error": "An identical request failed, please try again"}, 500
+                return _replay(call.result, "in-flight")
+
+            # First in this worker; another worker may still have run it or be running it
+            stored_key, result, store = _stored_key(key), None, False
+            try:
+                other = _claim(stored_key)
+                if other is not None:
+                    source = "stored" if other.status == DONE else "in-flight"
+                    result = _wait_for_other_worker(stored_key, other)
+                    if result is None:
+                        if other.status == RUNNING:
+                            return {"error": "An identical request is still being processed"}, 409
+                        return {"error": "An identical request failed, please try again"}, 500
+                    return _replay(result, source)
+
+                response = None
+                try:
+                    response = make_response(view(*args, **kwargs))
+                    if not response.is_streamed:
+                        result = (response.get_data(), response.status_code,
+                                  {"Content-Type": response.content_type})
+                        store = response.status_code < 400
+                finally:
+                    try:
+                        _release(stored_key, result if store else None, ttl)
+                    except Exception:
+                        db.session.rollback()  # Duplicates on other workers run again once the claim expires
+                return response
+            finally:
+                with _lock:
+                    call.result = result
+                    if store:
+                        call.expires = time.monotonic() + ttl
+                    else:
+                        # Duplicates already waiting share the outcome; later ones run afresh
+                        _calls.pop(key, None)
+                    call.done.set()
+        return wrapped
+    return decorator
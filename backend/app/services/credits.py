@@ -0,0 +1,54 @@
+from datetime import datetime
+from sqlalchemy import bindparam, func, select, update
+from app.db import db
+from app.models.credit_requests import CreditRequest
+from app.models.module_assignment import ModuleAssignment
+from app.services.usage import record_grants
+
+# Most request IDs accepted by one bulk status change (keeps the IN list well under
+# SQL Server's 2100 parameter limit)
+MAX_BULK_REQUESTS = 1000
+
+
+def set_pending_status(status, request_ids=None, module_id=None):
+    """
+    Moves pending credit requests to status ('Approved' or 'Rejected'), selected either by
+    request_ids or as every pending request in module_id.
+
+    The status change is one UPDATE ... RETURNING, so exactly the rows this call moved out
+    of 'Pending' are returned and a request approved concurrently elsewhere is never granted
+    twice. Approved credits are then added per assignment with one executemany of
+    studentCredits = studentCredits + n, so concurrent grants don't overwrite each other,
+    and recorded in the module's usage summaries.
+
+    Returns the (requestID, assignmentID, creditsRequested) rows that changed. The caller commits.
+    """
+    statement = update(CreditRequest).where(CreditRequest.status == "Pending")
+    if request_ids is not None:
+        statement = statement.where(CreditRequest.requestID.in_(request_ids))
+    if module_id is not None:
+        assignment_ids = select(ModuleAssignment.assignmentID).where(ModuleAssignment.moduleID == module_id)
+        statement = statement.where(CreditRequest.assignmentID.in_(assignment_ids))
+
+    values = {"status": status}
+    if status == "Approved":
+        values.update(approvedAt=datetime.utcnow(), seen=False)
+    changed = db.session.execute(
+        statement.values(**values)
+        .returning(CreditRequest.requestID, CreditRequest.assignmentID, CreditRequest.creditsRequested)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    if status == "Approved" and changed:
+        grants = {}
+        for _, assignment_id, credits in changed:
+            grants[assignment_id] = grants.get(assignment_id, 0) + credits
+        assignments = ModuleAssignment.__table__
+        db.session.execute(
+            update(assignments)
+            .where(assignments.c.assignmentID == bindparam("grant_assignment_id"))
+            .values(studentCredits=func.coalesce(assignments.c.studentCredits, 0) + bindparam("grant_amount")),
+            [{"grant_assignment_id": a, "grant_amount": n} for a, n in grants.items()]
+        )
+        record_grants(grants)
+    return changed
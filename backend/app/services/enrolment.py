@@ -0,0 +1,256 @@
+import csv
+import io
+import re
+from sqlalchemy import insert
+from app.db import db
+from app.models.users import User
+from app.models.students import Student
+from app.models.module_assignment import ModuleAssignment
+
+# SQL Server allows at most 2100 parameters per statement
+IN_CHUNK_SIZE = 1000
+
+# Rows enrolled (and committed) per batch when streaming a CSV
+CSV_BATCH_SIZE = 500
+
+# Cap on how many individual IDs/messages a CSV report lists; the rest are only counted
+MAX_REPORTED_ROWS = 200
+
+# Normalised header names recognised as the student ID column
+STUDENT_ID_HEADERS = {"studentid", "studentno", "studentnumber", "matricno", "matricnumber", "id"}
+
+# Per-row outcomes returned by bulk_enrol
+ADDED = "added"
+NOT_FOUND = "not_found"
+ALREADY_ENROLLED = "already_enrolled"
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), IN_CHUNK_SIZE):
+        yield values[i:i + IN_CHUNK_SIZE]
+
+
+def _users_by_student_id(student_ids):
+    """Maps integer student ID -> userID for the given IDs (Users.studentID is an integer column)."""
+    users = {}
+    for chunk in _chunks(student_ids):
+        rows = db.session.query(User.studentID, User.userID).filter(User.studentID.in_(chunk)).all()
+        for student_id, user_id in rows:
+            users.setdefault(student_id, user_id)
+    return users
+
+
+def bulk_enrol(module_id, student_ids, initial_credit, create_missing_users=True):
+    """
+    Enrols a list of student IDs into a module using set-based lookups and bulk inserts,
+    so the number of queries depends on the number of IN chunks rather than on rows.
+
+    student_ids are the IDs as strings, in file order, and may contain duplicates;
+    IDs that are not all digits can never match and are reported as not found.
+    If create_missing_users is True, students that exist in the Students table but have
+    no account get a User created from their Students record; otherwise they are reported
+    as not found.
+
+    Returns a list of (student_id, outcome) in the same order as student_ids, where
+    outcome is ADDED, NOT_FOUND or ALREADY_ENROLLED. The caller commits.
+    """
+    unique_ids = [sid for sid in dict.fromkeys(student_ids) if sid.isdigit()]
+    if not unique_ids:
+        return [(sid, NOT_FOUND) for sid in student_ids]
+
+    users = _users_by_student_id({int(sid) for sid in unique_ids})
+
+    if create_missing_users:
+        missing = [sid for sid in unique_ids if int(sid) not in users]
+        students = {}
+        for chunk in _chunks(missing):
+            for student in db.session.query(Student.studentID, Student.fullName, Student.email)\
+                    .filter(Student.studentID.in_(chunk)).all():
+                students[student.studentID] = student
+
+        new_users = {}
+        for sid in missing:
+            if sid in students and int(sid) not in new_users:
+                new_users[int(sid)] = {
+                    "name": students[sid].fullName,
+                    "studentID": int(sid),
+                    "email": students[sid].email,
+                    "password": "teststudent",
+                    "role": "Student"
+                }
+        if new_users:
+            db.session.execute(insert(User), list(new_users.values()))
+            users.update(_users_by_student_id(new_users.keys()))
+
+    enrolled_user_ids = set()
+    for chunk in _chunks(set(users.values())):
+        enrolled_user_ids.update(
+            user_id for (user_id,) in db.session.query(ModuleAssignment.userID)
+            .filter(ModuleAssignment.moduleID == module_id, ModuleAssignment.userID.in_(chunk))
+        )
+
+    outcomes = []
+    new_assignments = []
+    for sid in student_ids:
+        user_id = users.get(int(sid)) if sid.isdigit() else None
+        if user_id is None:
+            outcomes.append((sid, NOT_FOUND))
+        elif user_id in enrolled_user_ids:
+            outcomes.append((sid, ALREADY_ENROLLED))
+        else:
+            enrolled_user_ids.add(user_id)
+            new_assignments.append({"userID": user_id, "moduleID": module_id, "studentCredits": initial_credit})
+            outcomes.append((sid, ADDED))
+
+    if new_assignments:
+        db.session.execute(insert(ModuleAssignment), new_assignments)
+
+    return outcomes
+
+
+def open_csv(file):
+    """
+    Wraps an uploaded file's binary stream in a text stream without reading it all.
+    The encoding is detected from a BOM, else from a sample: UTF-8 if it decodes, otherwise
+    Windows-1252 (what Excel writes for "CSV" on Windows).
+    """
+    stream = file.stream if hasattr(file, "stream") else file
+    sample = stream.read(64 * 1024)
+    stream.seek(0)
+
+    if sample.startswith(b"\xef\xbb\xbf"):
+        encoding = "utf-8-sig"
+    elif sample.startswith((b"\xff\xfe", b"\xfe\xff")):
+        encoding = "utf-16"
+    else:
+        try:
+            sample.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off at the end of the sample is still UTF-8
+            encoding = "utf-8" if e.start >= len(sample) - 3 and e.reason == "unexpected end of data" else "cp1252"
+    return io.TextIOWrapper(stream, encoding=encoding, newline="")
+
+
+def _normalise_header(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def iter_student_ids(text_stream, fallback_column=None):
+    """
+    Yields student IDs (stripped strings) from a CSV one row at a time.
+
+    The student ID column is found by header name (studentID, Student No, matric_no, ...).
+    If the first row has no recognisable header, fallback_column(row) picks the ID from each
+    row; a first row whose ID is all digits is then treated as data rather than a header.
+    Raises ValueError if the column can't be determined.
+    """
+    reader = csv.reader(text_stream)
+    first_row = next(reader, None)
+    if first_row is None:
+        return
+
+    headers = [_normalise_header(h) for h in first_row]
+    column = next((i for i, h in enumerate(headers) if h in STUDENT_ID_HEADERS), None)
+    if column is not None:
+        pick = lambda row: row[column] if len(row) > column else ""
+    elif fallback_column is not None:
+        pick = fallback_column
+        first_id = pick(first_row).strip()
+        if first_id.isdigit():
+            yield first_id
+    else:
+        raise ValueError("CSV must have a studentID column")
+
+    for row in reader:
+        if row:
+            yield pick(row).strip()
+
+
+class EnrolmentReport:
+    """Running totals for a streamed CSV enrolment, with a bounded sample of per-row messages."""
+
+    def __init__(self):
+        self.total = 0
+        self.added = 0
+        self.batches = 0
+        self.not_found_count = 0
+        self.not_found_ids = []
+        self.invalid_ids = []
+        self.skipped_count = 0
+        self.skipped = []
+
+    def not_found(self, student_id):
+        self.not_found_count += 1
+        if len(self.not_found_ids) < MAX_REPORTED_ROWS:
+            self.not_found_ids.append(student_id)
+
+    def invalid(self, student_id):
+        if len(self.invalid_ids) < MAX_REPORTED_ROWS:
+            self.invalid_ids.append(student_id)
+        self.skip(f"Invalid ID format: {student_id}")
+
+    def skip(self, message):
+        self.skipped_count += 1
+        if len(self.skipped) < MAX_REPORTED_ROWS:
+            self.skipped.append(message)
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "added": self.added,
+            "batches": self.batches,
+            "notFound": self.not_found_count,
+            "skipped": self.skipped_count,
+        }
+
+
+def stream_enrol(module_id, student_ids, initial_credit, create_missing_users=True,
+                 batch_size=CSV_BATCH_SIZE, on_progress=None, commit_batches=True):
+    """
+    Enrols student IDs from an iterator (e.g. iter_student_ids) in batches of batch_size,
+    committing after each batch, so memory use is bounded whatever the file size.
+    Non-digit IDs are reported as skipped with "Invalid ID format".
+    on_progress(report) is called after every batch.
+
+    Because batches are committed as they go, a failure part-way leaves the earlier
+    batches enrolled; re-uploading the file is safe since those rows are then skipped
+    as already enrolled. With commit_batches=False batches are only flushed and the
+    caller commits (or rolls back) everything at once, e.g. when the module itself is
+    created in the same transaction.
+    """
+    report = EnrolmentReport()
+    batch = []  # Rows in file order, including malformed IDs so messages keep row order
+
+    def flush():
+        outcomes = iter(bulk_enrol(module_id, [sid for sid in batch if sid.isdigit()],
+                                   initial_credit, create_missing_users))
+        for student_id in batch:
+            if not student_id.isdigit():
+                report.invalid(student_id)
+                continue
+            _, outcome = next(outcomes)
+            if outcome == ADDED:
+                report.added += 1
+            elif outcome == NOT_FOUND:
+                report.not_found(student_id)
+            elif outcome == ALREADY_ENROLLED:
+                report.skip(f"Already enrolled: {student_id}")
+        if commit_batches:
+            db.session.commit()
+        else:
+            db.session.flush()
+        report.batches += 1
+        batch.clear()
+        if on_progress:
+            on_progress(report)
+
+    for student_id in student_ids:
+        report.total += 1
+        batch.append(student_id)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
@@ -0,0 +1,87 @@
+"""
+Cached user identities for authenticated requests.
+
+Profiles are kept in a small per-process TTL cache keyed by user ID, so /me and
+user lookups don't query Users on every page view. update_user invalidates the
+entry in the worker that handled the update; other workers pick the change up
+when their entry expires after IDENTITY_CACHE_TTL seconds.
+
+With JWT_IDENTITY_CLAIMS enabled the profile, role and enrolled modules are also
+embedded in the access token at login, and /me answers from the token alone.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from app.db import db
+from app.models.module_assignment import ModuleAssignment
+from app.models.users import User
+
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "60"))
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+JWT_IDENTITY_CLAIMS = os.getenv("JWT_IDENTITY_CLAIMS", "false").lower() in ("1", "true", "yes")
+
+# Profile fields returned by /me, in response order
+PROFILE_FIELDS = ("userID", "name", "email", "mobileNumber", "role", "studentID")
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # userID -> (expires at, profile), least recently used first
+
+
+def _load_profile(user_id):
+    row = db.session.query(User.userID, User.name, User.email, User.mobileNumber, User.role, User.studentID)\
+        .filter(User.userID == user_id).first()
+    return dict(zip(PROFILE_FIELDS, row)) if row else None
+
+
+def get_profile(user_id):
+    """Returns the user's profile as a dict (see PROFILE_FIELDS), or None if the user doesn't exist."""
+    user_id = int(user_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+        if entry and entry[0] > now:
+            _cache.move_to_end(user_id)
+            return dict(entry[1])
+
+    profile = _load_profile(user_id)
+    if profile is None:
+        return None  # Not cached, so a user created later is found straight away
+    with _lock:
+        _cache[user_id] = (now + IDENTITY_CACHE_TTL, profile)
+        _cache.move_to_end(user_id)
+        while len(_cache) > IDENTITY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return dict(profile)
+
+
+def invalidate(user_id):
+    with _lock:
+        _cache.pop(int(user_id), None)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+
+
+def identity_claims(profile):
+    """
+    Extra JWT claims for a user when JWT_IDENTITY_CLAIMS is on: the profile (minus the ID,
+    which is the token's identity) and the IDs of the modules they're enrolled in.
+    """
+    if not JWT_IDENTITY_CLAIMS:
+        return {}
+    modules = [module_id for (module_id,) in db.session.query(ModuleAssignment.moduleID)
+               .filter(ModuleAssignment.userID == profile["userID"]).order_by(ModuleAssignment.moduleID)]
+    claims = {field: profile[field] for field in PROFILE_FIELDS if field != "userID"}
+    claims["modules"] = modules
+    return claims
+
+
+def profile_from_claims(identity, claims):
+    """The profile embedded by identity_claims, or None if the token doesn't carry one."""
+    if "role" not in claims:
+        return None
+    profile = {field: claims.get(field) for field in PROFILE_FIELDS if field != "userID"}
+    return {"userID": int(identity), **profile}
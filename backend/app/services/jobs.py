@@ -0,0 +1,140 @@
+"""
+Background jobs for operations too slow to run inside a request.
+
+A job runs in a daemon thread of the worker that started it, with its own app
+context and database session. Its status and progress are stored in the
+BackgroundJob table, so any worker can answer GET /api/jobs/<jobID>. Jobs are
+expected to be idempotent: if a worker dies mid-job, starting it again resumes
+the work.
+
+While a job runs, a heartbeat thread touches its updatedAt every
+JOB_HEARTBEAT_SECONDS. A job still marked running whose updatedAt is older than
+JOB_LEASE_SECONDS lost its worker (a crash, or gunicorn recycling the worker after
+max_requests, which kills daemon threads) and is marked failed, so a new request
+starts it again instead of waiting on it forever.
+"""
+import json
+import os
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from app.db import db
+from app.models.background_job import BackgroundJob
+
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+
+class JobContext:
+    """Handed to the job function to report progress."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.progress = {}
+
+    def report(self, **progress):
+        """Merges progress into the job's stored progress and commits it."""
+        self.progress.update(progress)
+        BackgroundJob.query.filter_by(jobID=self.job_id).update({
+            "progress": json.dumps(self.progress),
+            "updatedAt": datetime.utcnow()
+        })
+        db.session.commit()
+
+
+def _heartbeat(app, job_id, stopped):
+    """Touches the job's updatedAt until stopped is set, in its own session."""
+    with app.app_context():
+        while not stopped.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                BackgroundJob.query.filter_by(jobID=job_id, status=RUNNING).update({"updatedAt": datetime.utcnow()})
+                db.session.commit()
+            except Exception:
+                traceback.print_exc()
+                db.session.rollback()
+        db.session.remove()
+
+
+def _run(app, job_id, target, args):
+    stopped = threading.Event()
+    threading.Thread(target=_heartbeat, args=(app, job_id, stopped), name=f"job-heartbeat-{job_id}",
+                     daemon=True).start()
+    with app.app_context():
+        context = JobContext(job_id)
+        try:
+            target(context, *args)
+            status, error = SUCCEEDED, None
+        except Exception as e:
+            traceback.print_exc()
+            db.session.rollback()
+            status, error = FAILED, str(e)
+        finally:
+            stopped.set()
+        BackgroundJob.query.filter_by(jobID=job_id).update({
+            "status": status,
+            "error": error,
+            "progress": json.dumps(context.progress),
+            "updatedAt": datetime.utcnow()
+        })
+        db.session.commit()
+        db.session.remove()
+
+
+def fail_stale_jobs(**filters):
+    """
+    Marks running jobs (matching filters, e.g. kind and target) whose heartbeat stopped
+    more than JOB_LEASE_SECONDS ago as failed. Commits; returns how many were marked.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+    marked = BackgroundJob.query.filter_by(status=RUNNING, **filters)\
+        .filter(BackgroundJob.updatedAt < cutoff)\
+        .update({
+            "status": FAILED,
+            "error": f"The job's worker stopped (no heartbeat for {JOB_LEASE_SECONDS:g} seconds)",
+            "updatedAt": datetime.utcnow()
+        }, synchronize_session=False)
+    db.session.commit()
+    return marked
+
+
+def find_running_job(kind, target):
+    """The job of this kind still running on target, if any. A job whose worker died doesn't count."""
+    fail_stale_jobs(kind=kind, target=target)
+    return BackgroundJob.query.filter_by(kind=kind, target=target, status=RUNNING).first()
+
+
+def start_job(kind, target_id, target, *args):
+    """
+    Records a new job and runs target(context, *args) in a background thread.
+    Returns the job ID.
+    """
+    job_id = str(uuid.uuid4())
+    db.session.add(BackgroundJob(jobID=job_id, kind=kind, target=target_id, status=RUNNING, progress="{}"))
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    thread = threading.Thread(target=_run, args=(app, job_id, target, args), name=f"job-{kind}-{job_id}", daemon=True)
+    thread.start()
+    if app.config.get("TESTING"):
+        # Tests need the outcome, not the concurrency
+        thread.join()
+    return job_id
+
+
+def job_to_dict(job):
+    return {
+        "jobID": job.jobID,
+        "kind": job.kind,
+        "target": job.target,
+        "status": job.status,
+        "progress": json.loads(job.progress) if job.progress else {},
+        "error": job.error,
+        "createdAt": job.createdAt.isoformat(),
+        "updatedAt": job.updatedAt.isoformat()
+    }
@@ -0,0 +1,209 @@
+"""
+Admission control for chat turns, which each make one or more LLM calls.
+
+A turn must get a ticket from the scheduler before calling OpenRouter:
+
+- a student may have at most LLM_USER_MAX_IN_FLIGHT turns running, so parallel
+  requests can't overspend credits that are only deducted after the call;
+- each module has a token bucket refilled at LLM_MODULE_TOKENS_PER_MINUTE. A turn
+  reserves its estimated tokens up front and the estimate is corrected with the
+  real usage when it finishes;
+- at most LLM_MAX_CONCURRENT turns run at once. Further turns wait in a queue per
+  module, and free slots go to the modules in turn, so one busy module can't
+  starve the others. A turn that would wait more than LLM_QUEUE_TIMEOUT seconds,
+  or finds its module's queue full, is turned away.
+
+Turned away requests raise Saturated with a retry hint, which routes return as a
+429 with a Retry-After header.
+
+The scheduler's state is in memory, so every limit applies per worker process:
+with gunicorn running W workers (GUNICORN_WORKERS, one per CPU by default) the
+deployment as a whole allows up to W x LLM_MAX_CONCURRENT turns at once,
+W x LLM_MODULE_TOKENS_PER_MINUTE tokens per module and W x LLM_USER_MAX_IN_FLIGHT
+turns per student, as requests are spread over the workers. Set the values to the
+deployment-wide limit divided by W. The per-student limit can't be divided below 1,
+and credits are deducted atomically after each turn, so parallel turns on different
+workers can at worst take a student's balance negative by a few turns' cost.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from app.services import metrics
+
+# Request threads per gthread worker (gunicorn.conf.py reads the same variable)
+WORKER_THREADS = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Per worker process; multiply by the number of workers for the deployment-wide limits (see above)
+LLM_USER_MAX_IN_FLIGHT = int(os.getenv("LLM_USER_MAX_IN_FLIGHT", "2"))
+# Must be below WORKER_THREADS: a worker never runs more requests than it has threads, so with
+# more slots than that no turn would ever queue here and gunicorn's FIFO backlog would queue
+# them instead, without the per-module fairness, queue limit or timeout
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", max(1, WORKER_THREADS - 1)))
+LLM_MODULE_TOKENS_PER_MINUTE = float(os.getenv("LLM_MODULE_TOKENS_PER_MINUTE", "200000"))  # 0 disables
+LLM_MODULE_QUEUE_SIZE = int(os.getenv("LLM_MODULE_QUEUE_SIZE", "20"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+
+rejections = metrics.Counter("llm_scheduler_rejections_total", "Chat turns turned away by the LLM scheduler.",
+                             ("reason",))
+queue_wait = metrics.Histogram("llm_scheduler_queue_wait_seconds", "Time chat turns waited for an LLM slot.")
+
+
+class Saturated(Exception):
+    """Raised when a turn can't be admitted. retry_after is a hint in whole seconds."""
+
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+def estimate_tokens(text, max_tokens):
+    # About four characters per token, plus the most the completion may use
+    return len(text or "") // 4 + (max_tokens or 0)
+
+
+class Ticket:
+    __slots__ = ("user_id", "module_id", "reserved", "waited")
+
+    def __init__(self, user_id, module_id, reserved):
+        self.user_id = user_id
+        self.module_id = module_id
+        self.reserved = reserved
+        self.waited = 0.0
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrent=None, user_max_in_flight=None, module_tokens_per_minute=None,
+                 module_queue_size=None, queue_timeout=None):
+        self.max_concurrent = LLM_MAX_CONCURRENT if max_concurrent is None else max_concurrent
+        self.user_max_in_flight = LLM_USER_MAX_IN_FLIGHT if user_max_in_flight is None else user_max_in_flight
+        self.module_tokens_per_minute = (LLM_MODULE_TOKENS_PER_MINUTE if module_tokens_per_minute is None
+                                         else module_tokens_per_minute)
+        self.module_queue_size = LLM_MODULE_QUEUE_SIZE if module_queue_size is None else module_queue_size
+        self.queue_timeout = LLM_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+
+        self._lock = threading.Lock()
+        self._running = 0
+        self._user_in_flight = {}      # userID -> turns admitted and not yet released
+        self._buckets = {}             # moduleID -> (tokens available, last refill time)
+        self._queues = OrderedDict()   # moduleID -> deque of _Waiter, next module to serve first
+        self._avg_turn_seconds = 5.0   # Moving average, used for retry hints
+
+    # --- Token buckets ---
+
+    def _refill(self, module_id, now):
+        rate = self.module_tokens_per_minute / 60
+        tokens, updated = self._buckets.get(module_id, (self.module_tokens_per_minute, now))
+        tokens = min(self.module_tokens_per_minute, tokens + (now - updated) * rate)
+        self._buckets[module_id] = (tokens, now)
+        return tokens
+
+    def _reserve_tokens(self, module_id, tokens, now):
+        if self.module_tokens_per_minute <= 0:
+            return
+        available = self._refill(module_id, now)
+        # A turn larger than the whole bucket is admitted once the bucket is full
+        needed = min(tokens, self.module_tokens_per_minute)
+        if available < needed:
+            raise Saturated("This module has reached its usage limit, please try again shortly",
+                            (needed - available) / (self.module_tokens_per_minute / 60), "module_tokens")
+        self._buckets[module_id] = (available - tokens, now)
+
+    def _return_tokens(self, module_id, tokens):
+        if self.module_tokens_per_minute <= 0:
+            return
+        available, updated = self._buckets.get(module_id, (self.module_tokens_per_minute, time.monotonic()))
+        self._buckets[module_id] = (min(self.module_tokens_per_minute, available + tokens), updated)
+
+    # --- Admission ---
+
+    def acquire(self, user_id, module_id, estimated_tokens=0):
+        """Admits a turn, waiting for a slot if needed. Returns a Ticket; raises Saturated."""
+        try:
+            return self._acquire(user_id, module_id, estimated_tokens)
+        except Saturated as e:
+            rejections.inc(reason=e.reason)
+            raise
+
+    def _acquire(self, user_id, module_id, estimated_tokens):
+        started = time.monotonic()
+        with self._lock:
+            if self._user_in_flight.get(user_id, 0) >= self.user_max_in_flight:
+                raise Saturated("You already have a message being answered, please wait for it to finish",
+                                self._avg_turn_seconds, "user_in_flight")
+            queue = self._queues.get(module_id)
+            if queue is not None and len(queue) >= self.module_queue_size:
+                raise Saturated("The assistant is busy, please try again shortly",
+                                self._avg_turn_seconds, "module_queue_full")
+            self._reserve_tokens(module_id, estimated_tokens, started)
+            self._user_in_flight[user_id] = self._user_in_flight.get(user_id, 0) + 1
+
+            ticket = Ticket(user_id, module_id, estimated_tokens)
+            if self._running < self.max_concurrent and not self._queues:
+                self._running += 1
+                return ticket
+            waiter = _Waiter()
+            self._queues.setdefault(module_id, deque()).append(waiter)
+
+        waiter.event.wait(self.queue_timeout)
+        with self._lock:
+            if not waiter.granted:
+                self._queues[module_id].remove(waiter)
+                if not self._queues[module_id]:
+                    del self._queues[module_id]
+                self._forget(ticket, ticket.reserved)
+                raise Saturated("The assistant is busy, please try again shortly",
+                                self._avg_turn_seconds, "queue_timeout")
+        ticket.waited = time.monotonic() - started
+        queue_wait.observe(ticket.waited)
+        return ticket
+
+    def _forget(self, ticket, refund):
+        count = self._user_in_flight.get(ticket.user_id, 0) - 1
+        if count > 0:
+            self._user_in_flight[ticket.user_id] = count
+        else:
+            self._user_in_flight.pop(ticket.user_id, None)
+        self._return_tokens(ticket.module_id, refund)
+
+    def release(self, ticket, used_tokens=None, duration=None):
+        """
+        Ends a turn. used_tokens corrects the module's bucket for the real usage (None keeps
+        the estimate, e.g. when the call failed part-way); the slot goes to the next module.
+        """
+        with self._lock:
+            self._forget(ticket, 0 if used_tokens is None else ticket.reserved - used_tokens)
+            if duration is not None:
+                self._avg_turn_seconds = 0.9 * self._avg_turn_seconds + 0.1 * duration
+
+            # Hand the slot to the first waiting module, which then goes to the back
+            if self._queues:
+                module_id, queue = next(iter(self._queues.items()))
+                waiter = queue.popleft()
+                if queue:
+                    self._queues.move_to_end(module_id)
+                else:
+                    del self._queues[module_id]
+                waiter.granted = True
+                waiter.event.set()
+            else:
+                self._running -= 1
+
+    def queued(self):
+        with self._lock:
+            return {module_id: len(queue) for module_id, queue in self._queues.items()}
+
+
+scheduler = LLMScheduler()
+queued_turns = metrics.Gauge("llm_scheduler_queued", "Chat turns waiting for an LLM slot.", ("module",),
+                             callback=lambda: {(module_id,): n for module_id, n in scheduler.queued().items()})
@@ -0,0 +1,228 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+Counters, gauges and histograms are plain dicts guarded by a lock, so recording
+a value costs a dict update. Request metrics are recorded by before/after_request
+hooks; other modules record their own (external calls, embedding cache, credits).
+
+Values are per process, so every sample carries a pid label naming the worker
+that reported it. With several gunicorn workers each scrape is answered by one of
+them; the label keeps their series apart, so rates are taken per worker series
+and summed across workers in queries, e.g. sum without (pid) (rate(...)). A
+recycled worker's series is replaced by its successor's, under a new pid.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    # os.getpid() rather than a value saved at import, as workers are forked from a preloaded master
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra) + [f'pid="{os.getpid()}"']
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time by callback() -> {label values tuple: value}."""
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self._callback is None:
+            return super()._samples()
+        try:
+            return list(self._callback().items())
+        except Exception:
+            return []
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            samples = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in samples:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [le])} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Application metrics ---
+
+http_requests = Counter("http_requests_total", "HTTP requests handled.", ("route", "method", "status"))
+http_request_duration = Histogram("http_request_duration_seconds", "HTTP request latency.", ("route", "method"))
+http_in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+
+external_call_duration = Histogram("external_call_duration_seconds", "Latency of calls to external services.",
+                                   ("service", "operation"))
+external_call_errors = Counter("external_call_errors_total", "Failed calls to external services.",
+                               ("service", "operation"))
+
+embedding_cache = Counter("embedding_cache_requests_total", "Query embedding cache lookups.", ("result",))
+credits_consumed = Counter("credits_consumed_total", "Credits (USD) deducted for chat turns.", ("module",))
+
+
+def _db_pool_stats():
+    from app.db import db
+    pool = db.engine.pool
+    stats = {}
+    for state, method in (("checked_out", "checkedout"), ("idle", "checkedin"),
+                          ("size", "size"), ("overflow", "overflow")):
+        if hasattr(pool, method):
+            stats[(state,)] = getattr(pool, method)()
+    return stats
+
+
+db_pool = Gauge("db_pool_connections", "Database connection pool usage.", ("state",), callback=_db_pool_stats)
+
+
+@contextmanager
+def external_call(service, operation):
+    """Times a call to an external service (e.g. qdrant, openrouter), counting it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        external_call_errors.inc(service=service, operation=operation)
+        raise
+    finally:
+        external_call_duration.observe(time.perf_counter() - start, service=service, operation=operation)
+
+
+def init_app(app):
+    """Records request metrics and serves them at /metrics."""
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        http_in_flight.inc()
+
+    @app.after_request
+    def _record_request(response):
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_requests.inc(route=route, method=request.method, status=response.status_code)
+        if "metrics_start" in g:
+            http_request_duration.observe(time.perf_counter() - g.metrics_start, route=route, method=request.method)
+        return response
+
+    @app.teardown_request
+    def _end_request(exc):
+        if g.pop("metrics_start", None) is not None:
+            http_in_flight.dec()
+
+    def metrics_view():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
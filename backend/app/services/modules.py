@@ -0,0 +1,129 @@
+import shutil
+from sqlalchemy import delete, select, update
+from app.db import db
+from app.models.archived_chat import ArchivedChat
+from app.models.chat_history import ChatHistory
+from app.models.chat_message import ChatMessage
+from app.models.chat_usage_daily import ChatUsageDaily
+from app.models.chatbot_settings import ChatbotSettings
+from app.models.credit_requests import CreditRequest
+from app.models.module import Module
+from app.models.module_assignment import ModuleAssignment
+from app.models.module_document_usage import ModuleDocumentUsage
+from app.models.module_student_usage import ModuleStudentUsage
+from app.models.module_usage_daily import ModuleUsageDaily
+from app.services.chat_archive import module_archive_dir
+from app.services.vector_store import get_qdrant_client, delete_module_collection, rename_module_collection
+
+# Rows deleted per statement/transaction; keeps locks short and well under parameter limits
+DELETE_BATCH_SIZE = 1000
+# Usage rollups and summaries, keyed by moduleID
+USAGE_MODELS = (ChatUsageDaily, ModuleUsageDaily, ModuleStudentUsage, ModuleDocumentUsage)
+
+
+def _delete_in_batches(model, id_column, id_query, context, label):
+    """
+    Repeatedly deletes up to DELETE_BATCH_SIZE rows whose id is returned by id_query,
+    using a DELETE ... WHERE id IN (SELECT TOP n ...) so no ID list goes through Python.
+    Commits after each batch and reports the running total.
+    """
+    total = 0
+    while True:
+        batch = id_query.limit(DELETE_BATCH_SIZE).scalar_subquery()
+        result = db.session.execute(
+            delete(model).where(id_column.in_(batch)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount <= 0:
+            break
+        total += result.rowcount
+        context.report(stage=label, **{label: total})
+    return total
+
+
+def delete_module_data(context, module_id):
+    """
+    Background job body for /delete-module: deletes everything belonging to a module,
+    children before parents, in bounded batches. Safe to re-run if interrupted.
+    """
+    assignment_ids = select(ModuleAssignment.assignmentID).where(ModuleAssignment.moduleID == module_id)
+    chat_ids = select(ChatHistory.historyID).where(ChatHistory.assignmentID.in_(assignment_ids))
+
+    # 1. Chat messages and archive index entries, which reference ChatHistory
+    _delete_in_batches(ChatMessage, ChatMessage.messageID,
+                       select(ChatMessage.messageID).where(ChatMessage.chatID.in_(chat_ids)),
+                       context, "ChatMessage")
+    _delete_in_batches(ArchivedChat, ArchivedChat.historyID,
+                       select(ArchivedChat.historyID).where(ArchivedChat.moduleID == module_id),
+                       context, "ArchivedChat")
+
+    # 2. Chat sessions and credit requests, which reference ModuleAssignment
+    _delete_in_batches(ChatHistory, ChatHistory.historyID, chat_ids, context, "ChatHistory")
+    _delete_in_batches(CreditRequest, CreditRequest.requestID,
+                       select(CreditRequest.requestID).where(CreditRequest.assignmentID.in_(assignment_ids)),
+                       context, "CreditRequests")
+
+    # 3. Assignments, usage rollups, settings and finally the module itself
+    _delete_in_batches(ModuleAssignment, ModuleAssignment.assignmentID, assignment_ids, context, "ModuleAssignment")
+    for model in USAGE_MODELS:
+        _delete_in_batches(model, model.usageID, select(model.usageID).where(model.moduleID == module_id),
+                           context, model.__tablename__)
+    ChatbotSettings.query.filter_by(moduleID=module_id).delete()
+    Module.query.filter_by(moduleID=module_id).delete()
+    db.session.commit()
+    context.report(stage="Module")
+
+    # 4. Data outside the database
+    try:
+        delete_module_collection(get_qdrant_client(), module_id)
+        context.report(stage="Qdrant")
+    except Exception as e:
+        print(f"Error deleting Qdrant collection: {str(e)}")
+        context.report(stage="Qdrant", qdrantError=str(e))
+
+    shutil.rmtree(module_archive_dir(module_id), ignore_errors=True)
+    context.report(stage="done")
+
+
+def rename_module(module, new_module_id, module_name, module_desc, initial_credit):
+    """
+    Changes a module's ID. Every dependent table is repointed with one set-based UPDATE,
+    and the Qdrant collection is aliased under the new ID rather than copied, so the time
+    taken doesn't depend on the number of students, chats or documents.
+    Commits; on failure the database is rolled back and the collection keeps its old name.
+    """
+    old_module_id = module.moduleID
+    db.session.add(Module(
+        moduleID=new_module_id,
+        moduleName=module_name,
+        moduleDesc=module_desc,
+        initialCredit=module.initialCredit if initial_credit is None else initial_credit
+    ))
+    db.session.flush()  # The new module must exist before rows reference it
+
+    for model in (ModuleAssignment, ChatbotSettings, ArchivedChat, *USAGE_MODELS):
+        db.session.execute(
+            update(model).where(model.moduleID == old_module_id).values(moduleID=new_module_id)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.execute(delete(Module).where(Module.moduleID == old_module_id)
+                       .execution_options(synchronize_session=False))
+    db.session.expunge(module)
+
+    client = get_qdrant_client()
+    try:
+        rename_module_collection(client, old_module_id, new_module_id)
+    except Exception as e:
+        db.session.rollback()
+        raise RuntimeError(f"Could not move the documents of module {old_module_id}: {e}") from e
+
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        rename_module_collection(client, new_module_id, old_module_id)
+        raise
+
+    old_dir, new_dir = module_archive_dir(old_module_id), module_archive_dir(new_module_id)
+    if old_dir.exists() and not new_dir.exists():
+        old_dir.rename(new_dir)
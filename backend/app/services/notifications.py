@@ -0,0 +1,133 @@
+"""
+Notifications for students (credit approvals and balance changes).
+
+The frontend long-polls GET /credit-requests/notifications/<user>/poll, passing the
+version of the state it last received. The request is answered as soon as the
+student's unseen approvals or balances differ from that version, or after
+NOTIFICATION_WAIT_SECONDS with the state unchanged, and the frontend polls again
+straight away, so changes are pushed as they happen.
+
+A held request is woken immediately by changes made in the same worker (approvals
+and chat deductions call notify_*), and re-reads the state from the database every
+NOTIFICATION_CHECK_SECONDS to see changes made by other workers. Each held request
+occupies a worker thread, so at most NOTIFICATION_MAX_WAITING are held per worker;
+beyond that polls are answered at once and the frontend waits
+NOTIFICATION_POLL_SECONDS before the next one.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from app.db import db
+from app.models.credit_requests import CreditRequest
+from app.models.module import Module
+from app.models.module_assignment import ModuleAssignment
+
+NOTIFICATION_WAIT_SECONDS = float(os.getenv("NOTIFICATION_WAIT_SECONDS", "25"))
+NOTIFICATION_CHECK_SECONDS = float(os.getenv("NOTIFICATION_CHECK_SECONDS", "5"))
+# Leaves most of a gthread worker's threads (GUNICORN_THREADS) for other requests
+NOTIFICATION_MAX_WAITING = int(os.getenv("NOTIFICATION_MAX_WAITING",
+                                         max(1, int(os.getenv("GUNICORN_THREADS", "4")) // 2)))
+# How long the frontend waits before polling again when its poll couldn't be held
+NOTIFICATION_POLL_SECONDS = float(os.getenv("NOTIFICATION_POLL_SECONDS", "15"))
+
+_lock = threading.Lock()
+_waiting = {}  # userID -> set of Events, one per held poll
+
+
+def approval_message(credits_requested, module_name):
+    return f"Your request for {credits_requested} USD credits for {module_name} has been approved!"
+
+
+def _approval_event(request_id, credits_requested, approved_at, module_id, module_name):
+    return {
+        "requestID": request_id,
+        "creditsRequested": credits_requested,
+        "moduleID": module_id,
+        "moduleName": module_name,
+        "approvedAt": approved_at.isoformat() if approved_at else None,
+        "message": approval_message(credits_requested, module_name)
+    }
+
+
+def unseen_approvals(user_id):
+    """The user's approved credit requests they haven't marked as seen, oldest approval first."""
+    rows = db.session.query(
+        CreditRequest.requestID,
+        CreditRequest.creditsRequested,
+        CreditRequest.approvedAt,
+        Module.moduleID,
+        Module.moduleName
+    ).join(ModuleAssignment, CreditRequest.assignmentID == ModuleAssignment.assignmentID)\
+        .join(Module, ModuleAssignment.moduleID == Module.moduleID)\
+        .filter(ModuleAssignment.userID == user_id,
+                CreditRequest.status == 'Approved',
+                CreditRequest.seen.is_(False))\
+        .order_by(CreditRequest.approvedAt, CreditRequest.requestID).all()
+    return [_approval_event(*row) for row in rows]
+
+
+def balances(user_id):
+    """The user's current credit balance in every module they are enrolled in."""
+    rows = db.session.query(ModuleAssignment.assignmentID, ModuleAssignment.moduleID, ModuleAssignment.studentCredits)\
+        .filter(ModuleAssignment.userID == user_id).order_by(ModuleAssignment.assignmentID).all()
+    return [{"assignmentID": assignment_id, "moduleID": module_id, "studentCredits": credits}
+            for assignment_id, module_id, credits in rows]
+
+
+def current_state(user_id):
+    """The user's unseen approvals and balances, with a version that changes whenever either does."""
+    approvals, user_balances = unseen_approvals(user_id), balances(user_id)
+    digest = hashlib.sha256(json.dumps([[a["requestID"] for a in approvals], user_balances]).encode())
+    return {"approvals": approvals, "balances": user_balances, "version": digest.hexdigest()[:16]}
+
+
+def notify_users(user_ids):
+    """Wakes the polls held in this worker for these users."""
+    with _lock:
+        events = [event for user_id in user_ids for event in _waiting.get(user_id, ())]
+    for event in events:
+        event.set()
+
+
+def notify_assignments(assignment_ids):
+    """Wakes the polls held in this worker for the students of these assignments (no query if there are none)."""
+    if not _waiting or not assignment_ids:
+        return
+    user_ids = db.session.query(ModuleAssignment.userID)\
+        .filter(ModuleAssignment.assignmentID.in_(set(assignment_ids))).distinct()
+    notify_users([user_id for (user_id,) in user_ids])
+
+
+def wait_for_change(user_id, since=None):
+    """
+    current_state(user_id) once its version differs from since, or after NOTIFICATION_WAIT_SECONDS.
+    pollSeconds in the result is how long the frontend should wait before polling again.
+    """
+    state = current_state(user_id)
+    if since is None or state["version"] != since:
+        return {**state, "pollSeconds": 0}
+
+    event = threading.Event()
+    with _lock:
+        if sum(len(events) for events in _waiting.values()) >= NOTIFICATION_MAX_WAITING:
+            return {**state, "pollSeconds": NOTIFICATION_POLL_SECONDS}
+        _waiting.setdefault(user_id, set()).add(event)
+    try:
+        deadline = time.monotonic() + NOTIFICATION_WAIT_SECONDS
+        while (remaining := deadline - time.monotonic()) > 0:
+            db.session.close()  # Don't hold a pooled connection while waiting
+            event.wait(min(NOTIFICATION_CHECK_SECONDS, remaining))
+            event.clear()
+            state = current_state(user_id)
+            if state["version"] != since:
+                break
+    finally:
+        with _lock:
+            events = _waiting.get(user_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del _waiting[user_id]
+    return {**state, "pollSeconds": 0}
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+import requests
+from app.services import metrics
+
+# OpenRouter pricing changes rarely; refetching it on every chat turn only adds latency.
+PRICING_TTL_SECONDS = int(os.getenv("OPENROUTER_PRICING_TTL", "3600"))
+# After a failed fetch, the model list isn't refetched for this long
+FAILURE_TTL_SECONDS = int(os.getenv("OPENROUTER_FAILURE_TTL", "60"))
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()  # One fetch at a time; other callers wait for its result
+_models = {}
+_fetched_at = 0.0
+_misses = set()  # Model IDs not in the current list, so they aren't refetched until it expires
+_failed_at = None
+
+
+def get_base_url():
+    return os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+
+def refresh_models():
+    """
+    Fetches the model list from OpenRouter and replaces the cached copy.
+    Raises requests.exceptions.RequestException if OpenRouter is unreachable.
+    """
+    global _models, _fetched_at, _misses, _failed_at
+    try:
+        with metrics.external_call("openrouter", "models"):
+            response = requests.get(f"{get_base_url()}/models", timeout=10)
+            response.raise_for_status()
+    except requests.exceptions.RequestException:
+        _failed_at = time.monotonic()
+        raise
+    models = {m.get("id"): m for m in response.json().get("data", [])}
+    with _lock:
+        _models = models
+        _fetched_at = time.monotonic()
+        _misses = set()
+        _failed_at = None
+    return models
+
+
+def _cached(model_id):
+    """(True, entry or None) if the cache can answer for model_id, else (False, None)."""
+    if time.monotonic() - _fetched_at > PRICING_TTL_SECONDS:
+        return False, None
+    if model_id in _models:
+        return True, _models[model_id]
+    return model_id in _misses, None
+
+
+def get_model_info(model_id):
+    """
+    Returns the OpenRouter model entry for model_id, or None if it is unknown.
+    The model list is cached for PRICING_TTL_SECONDS and refetched once on a miss,
+    so newly published models are picked up without waiting for the TTL; a model
+    that is still missing is then remembered as unknown until the list expires.
+    After a failed fetch, stale pricing is served (or the failure raised) for
+    FAILURE_TTL_SECONDS before OpenRouter is tried again.
+    """
+    hit, model_info = _cached(model_id)
+    if hit:
+        return model_info
+    with _refresh_lock:
+        hit, model_info = _cached(model_id)  # Another caller may have just fetched it
+        if hit:
+            return model_info
+        models = _models
+        if _failed_at is not None and time.monotonic() - _failed_at <= FAILURE_TTL_SECONDS:
+            if model_id in models:
+                return models[model_id]
+            raise requests.exceptions.ConnectionError("OpenRouter model list is unavailable, please try again shortly")
+        try:
+            models = refresh_models()
+        except requests.exceptions.RequestException:
+            # Serve stale pricing rather than failing the chat turn
+            if model_id not in models:
+                raise
+        if model_id not in models:
+            with _lock:
+                _misses.add(model_id)
+    return models.get(model_id)
+
+
+def get_model_pricing(model_id):
+    """Returns (prompt_price, completion_price) per token, or None if the model is unknown."""
+    model_info = get_model_info(model_id)
+    if not model_info:
+        return None
+    pricing = model_info.get("pricing", {})
+    return float(pricing.get("prompt", 0)), float(pricing.get("completion", 0))
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(*values):
+    """Encodes sort key values (e.g. a timestamp and an ID) into an opaque URL-safe cursor."""
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, types):
+    """
+    Decodes a cursor produced by encode_cursor. types lists the expected type of each
+    value (datetime, int or str). Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    try:
+        return [datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types)]
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def keyset_after(sort_column, id_column, sort_value, id_value):
+    """Rows strictly after (sort_value, id_value) in ascending (sort, id) order."""
+    return or_(sort_column > sort_value, and_(sort_column == sort_value, id_column > id_value))
+
+
+def keyset_before(sort_column, id_column, sort_value, id_value):
+    """Rows strictly before (sort_value, id_value) in ascending (sort, id) order."""
+    return or_(sort_column < sort_value, and_(sort_column == sort_value, id_column < id_value))
+
+
+def get_limit(default=None, maximum=500):
+    """
+    Reads the 'limit' query param. Returns default if absent; raises ValueError if it's
+    not an integer between 1 and maximum.
+    """
+    limit = request.args.get("limit")
+    if limit is None:
+        return default
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
@@ -0,0 +1,191 @@
+"""
+In-memory search index for the enrolment autocomplete (/search-students).
+
+The Students directory is loaded once into sorted arrays, one of student IDs and
+one of name words, both case-folded, so a prefix lookup is a binary search plus a
+short scan instead of a LIKE query per keystroke. Changes made through the ORM
+are applied to the index when their transaction commits; the whole index is
+also rebuilt every STUDENT_INDEX_TTL seconds to pick up rows written by other
+workers or imported directly into the database.
+"""
+import difflib
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.db import db
+from app.models.students import Student
+
+STUDENT_INDEX_TTL = float(os.getenv("STUDENT_INDEX_TTL", "300"))
+# Name matches need at least this many characters; fuzzy matching is only tried when
+# nothing matches by prefix, as it compares against every name word
+MIN_NAME_QUERY = 2
+FUZZY_CUTOFF = 0.75
+
+
+class StudentSearchIndex:
+    """Sorted arrays of case-folded student IDs and name words. All methods are thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}   # studentID -> fullName
+        self._ids = []     # sorted (case-folded studentID, studentID)
+        self._words = []   # sorted (case-folded name word, studentID)
+        self._built_at = None
+
+    @staticmethod
+    def _name_words(full_name):
+        return set((full_name or "").casefold().split())
+
+    def rebuild(self, rows):
+        """Replaces the index with rows of (studentID, fullName)."""
+        names = {str(student_id): full_name for student_id, full_name in rows}
+        words = sorted((word, student_id) for student_id, full_name in names.items()
+                       for word in self._name_words(full_name))
+        with self._lock:
+            self._names = names
+            self._ids = sorted((student_id.casefold(), student_id) for student_id in names)
+            self._words = words
+            self._built_at = time.monotonic()
+
+    def is_stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > STUDENT_INDEX_TTL
+
+    def upsert(self, student_id, full_name):
+        with self._lock:
+            self._remove(student_id)
+            self._names[student_id] = full_name
+            insort(self._ids, (student_id.casefold(), student_id))
+            for word in self._name_words(full_name):
+                insort(self._words, (word, student_id))
+
+    def remove(self, student_id):
+        with self._lock:
+            self._remove(student_id)
+
+    def _remove(self, student_id):
+        full_name = self._names.pop(student_id, None)
+        if full_name is None:
+            return
+        del self._ids[bisect_left(self._ids, (student_id.casefold(), student_id))]
+        for word in self._name_words(full_name):
+            del self._words[bisect_left(self._words, (word, student_id))]
+
+    def search(self, query, limit):
+        """
+        Students whose ID starts with query, then students with a name word starting with it
+        (every word of a multi-word query must match), then, if nothing matched, names with a
+        word similar to it. Returns up to limit (studentID, fullName) pairs.
+        """
+        query = query.strip().casefold()
+        if not query:
+            return []
+        with self._lock:
+            found = list(dict.fromkeys(self._id_prefix(query, limit)))
+            if len(found) < limit and len(query) >= MIN_NAME_QUERY:
+                found = list(dict.fromkeys(found + self._name_prefix(query.split(), limit)))
+            if not found and len(query) >= MIN_NAME_QUERY + 1 and not query.isdigit():
+                found = self._fuzzy(query, limit)
+            return [(student_id, self._names[student_id]) for student_id in found[:limit]]
+
+    def _id_prefix(self, prefix, limit):
+        start = bisect_left(self._ids, (prefix,))
+        matches = []
+        for key, student_id in self._ids[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append(student_id)
+        return matches
+
+    def _word_prefix(self, prefix):
+        i = bisect_left(self._words, (prefix,))
+        while i < len(self._words) and self._words[i][0].startswith(prefix):
+            yield self._words[i][1]
+            i += 1
+
+    def _name_prefix(self, words, limit):
+        first, rest = words[0], words[1:]
+        matches = []
+        for student_id in dict.fromkeys(self._word_prefix(first)):
+            name_words = self._name_words(self._names[student_id])
+            if all(any(w.startswith(r) for w in name_words) for r in rest):
+                matches.append(student_id)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def _fuzzy(self, query, limit):
+        # Only words with the same first letter and a similar length are compared, which keeps
+        # this to a few milliseconds on a large directory (a mistyped first letter won't match)
+        term = query.split()[0]
+        candidates = []
+        i = bisect_left(self._words, (term[0],))
+        while i < len(self._words) and self._words[i][0].startswith(term[0]):
+            word = self._words[i][0]
+            if abs(len(word) - len(term)) <= 2 and (not candidates or candidates[-1] != word):
+                candidates.append(word)
+            i += 1
+
+        matches = []
+        for word in difflib.get_close_matches(term, candidates, n=limit, cutoff=FUZZY_CUTOFF):
+            i = bisect_left(self._words, (word,))
+            while i < len(self._words) and self._words[i][0] == word and len(matches) < limit:
+                matches.append(self._words[i][1])
+                i += 1
+        return list(dict.fromkeys(matches))[:limit]
+
+
+_index = StudentSearchIndex()
+_rebuild_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the shared index, (re)building it from the Students table if it's missing or stale."""
+    if _index.is_stale():
+        with _rebuild_lock:
+            if _index.is_stale():
+                _index.rebuild(db.session.query(Student.studentID, Student.fullName).all())
+    return _index
+
+
+def search_students(query, limit):
+    return get_index().search(query, limit)
+
+
+# --- Incremental updates from ORM changes, applied once the transaction commits ---
+
+def _pending(session):
+    return session.info.setdefault("student_index_changes", [])
+
+
+@event.listens_for(Student, "after_insert")
+@event.listens_for(Student, "after_update")
+def _student_saved(mapper, connection, target):
+    changes = _pending(Session.object_session(target))
+    for old_id in inspect(target).attrs.studentID.history.deleted:
+        changes.append((str(old_id), None))
+    changes.append((str(target.studentID), target.fullName))
+
+
+@event.listens_for(Student, "after_delete")
+def _student_deleted(mapper, connection, target):
+    _pending(Session.object_session(target)).append((str(target.studentID), None))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    changes = session.info.pop("student_index_changes", None)
+    if not changes or _index.is_stale():
+        return  # A stale index is rebuilt from the database on next use anyway
+    for student_id, full_name in changes:
+        if full_name is None:
+            _index.remove(student_id)
+        else:
+            _index.upsert(student_id, full_name)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("student_index_changes", None)
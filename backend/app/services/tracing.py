@@ -0,0 +1,167 @@
+"""
+Lightweight request tracing.
+
+Every request gets an ID (the incoming X-Request-ID header, or a new one) that is
+echoed back in the response. Code paths worth breaking down, such as a chat turn,
+create a Trace and time each stage as a span:
+
+    trace = Trace("chat")
+    span = trace.start("pricing")
+    ...
+    span.end(model=model)
+    trace.set(cost=cost)
+    trace.finish()
+
+Spans that wrap a call to another service can name it, start("llm", service="openrouter"),
+to have their durations and errors exported as external call metrics too.
+
+finish() writes one JSON log line with every span's duration and attributes to the
+"app.trace" logger, and adds the durations to a bounded in-memory sample per stage
+from which latency_percentiles() reports p50/p95/p99.
+"""
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from flask import g, has_request_context, request
+from app.services import metrics
+
+TRACE_SAMPLE_SIZE = int(os.getenv("TRACE_SAMPLE_SIZE", "2048"))
+TRACE_LOG_LEVEL = os.getenv("TRACE_LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("app.trace")
+
+_lock = threading.Lock()
+_samples = {}  # "trace.stage" -> deque of recent durations in ms
+
+
+def init_app(app):
+    """Assigns request IDs and sets up the trace log handler."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(TRACE_LOG_LEVEL)
+        logger.propagate = False
+
+    @app.before_request
+    def _assign_request_id():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+
+    @app.after_request
+    def _echo_request_id(response):
+        if "request_id" in g:
+            response.headers["X-Request-ID"] = g.request_id
+        return response
+
+
+def current_request_id():
+    return g.get("request_id") if has_request_context() else None
+
+
+def _record(key, duration_ms):
+    with _lock:
+        samples = _samples.get(key)
+        if samples is None:
+            samples = _samples[key] = deque(maxlen=TRACE_SAMPLE_SIZE)
+        samples.append(duration_ms)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "service", "_start", "duration_ms")
+
+    def __init__(self, name, attrs, service=None):
+        self.name = name
+        self.attrs = attrs
+        self.service = service
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, **attrs):
+        self.attrs.update(attrs)
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._start) * 1000
+            if self.service:
+                metrics.external_call_duration.observe(self.duration_ms / 1000,
+                                                       service=self.service, operation=self.name)
+                if "error" in self.attrs or "unfinished" in self.attrs:
+                    metrics.external_call_errors.inc(service=self.service, operation=self.name)
+        return self
+
+
+class Trace:
+    def __init__(self, name, request_id=None):
+        self.name = name
+        self.request_id = request_id or current_request_id() or uuid.uuid4().hex
+        self.spans = []
+        self.attrs = {}
+        self._start = time.perf_counter()
+        self._finished = False
+
+    def set(self, **attrs):
+        """Attributes of the whole trace (e.g. total cost), included in its log line."""
+        self.attrs.update(attrs)
+
+    def start(self, name, service=None, **attrs):
+        span = Span(name, attrs, service)
+        self.spans.append(span)
+        return span
+
+    def finish(self):
+        """Ends any open spans, logs the trace and records stage durations. Safe to call twice."""
+        if self._finished:
+            return
+        self._finished = True
+        total_ms = (time.perf_counter() - self._start) * 1000
+        for span in self.spans:
+            if span.duration_ms is None:
+                span.end(unfinished=True)
+            _record(f"{self.name}.{span.name}", span.duration_ms)
+        _record(f"{self.name}.total", total_ms)
+
+        if logger.isEnabledFor(logging.INFO):
+            record = {
+                "trace": self.name,
+                "requestID": self.request_id,
+                "totalMs": round(total_ms, 2),
+                "spans": [{"name": s.name, "ms": round(s.duration_ms, 2), **s.attrs} for s in self.spans],
+                **self.attrs
+            }
+            logger.info(json.dumps(record, default=str))
+
+
+def _percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def latency_percentiles(prefix=None):
+    """{stage: {count, p50, p95, p99, max}} in ms over the recent samples of each stage."""
+    with _lock:
+        snapshot = {key: list(values) for key, values in _samples.items()
+                    if not prefix or key.startswith(prefix)}
+    stats = {}
+    for key in sorted(snapshot):
+        values = sorted(snapshot[key])
+        if values:
+            stats[key] = {
+                "count": len(values),
+                "p50": round(_percentile(values, 50), 2),
+                "p95": round(_percentile(values, 95), 2),
+                "p99": round(_percentile(values, 99), 2),
+                "max": round(values[-1], 2),
+            }
+    return stats
+
+
+def reset():
+    with _lock:
+        _samples.clear()
@@ -0,0 +1,295 @@
+"""
+Chat usage accounting: the rollups behind spend reports and module analytics.
+
+- ChatUsageDaily: per module, student and day;
+- ModuleUsageDaily: per module and day, including credits granted;
+- ModuleStudentUsage: running totals per module and student;
+- ModuleDocumentUsage: how often each document was retrieved per module.
+
+record_turn() and record_grants() are called in the same transaction that saves a
+chat turn or grants credits, so the rollups always agree with the messages and
+credit balances they summarise. rebuild_summaries() recomputes all but the document
+counts from ChatUsageDaily and approved credit requests, and module_analytics()
+reads them for the module analytics endpoint.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.db import db
+from app.models.chat_usage_daily import ChatUsageDaily
+from app.models.credit_requests import CreditRequest
+from app.models.module_assignment import ModuleAssignment
+from app.models.module_document_usage import ModuleDocumentUsage
+from app.models.module_student_usage import ModuleStudentUsage
+from app.models.module_usage_daily import ModuleUsageDaily
+from app.models.users import User
+
+# Rows looked up or updated per statement when recording many grants (SQL Server allows 2100 parameters)
+USAGE_BATCH_SIZE = 500
+FILENAME_LENGTH = ModuleDocumentUsage.filename.type.length
+
+
+def _increment(model, key, amounts, values=None):
+    """
+    Adds amounts to the model's row identified by key, creating the row if it's missing.
+    Upserts with an UPDATE first, as the row usually exists. Returns True if it was created.
+    """
+    values = values or {}
+    statement = update(model).where(*(getattr(model, column) == value for column, value in key.items()))\
+        .values(**{column: getattr(model, column) + amount for column, amount in amounts.items()}, **values)\
+        .execution_options(synchronize_session=False)
+
+    if db.session.execute(statement).rowcount:
+        return False
+    try:
+        # Savepoint, so losing a race with another worker's insert doesn't undo the turn
+        with db.session.begin_nested():
+            db.session.add(model(**key, **amounts, **values))
+        return True
+    except IntegrityError:
+        db.session.execute(statement)
+        return False
+
+
+def _increment_many(model, key_columns, rows):
+    """
+    _increment for many rows (dicts of key columns and amounts, all with the same amount
+    columns): creates the missing rows, then adds the amounts with one executemany UPDATE.
+    """
+    if not rows:
+        return
+    amount_columns = [column for column in rows[0] if column not in key_columns]
+    for start in range(0, len(rows), USAGE_BATCH_SIZE):
+        batch = rows[start:start + USAGE_BATCH_SIZE]
+        key_of = lambda row: tuple(row[column] for column in key_columns)
+
+        lookup = select(*(getattr(model, column) for column in key_columns)).where(
+            *(getattr(model, column).in_({row[column] for row in batch}) for column in key_columns))
+        existing = {tuple(row) for row in db.session.execute(lookup)}
+        missing = [{**{c: row[c] for c in key_columns}, **{c: 0 for c in amount_columns}}
+                   for row in batch if key_of(row) not in existing]
+        if missing:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(model), missing)
+            except IntegrityError:
+                # Another worker created some of them; insert the rest one by one
+                for row in missing:
+                    try:
+                        with db.session.begin_nested():
+                            db.session.execute(insert(model), [row])
+                    except IntegrityError:
+                        pass
+
+        table = model.__table__
+        db.session.execute(
+            update(table)
+            .where(*(table.c[column] == bindparam(f"key_{column}") for column in key_columns))
+            .values(**{column: table.c[column] + bindparam(f"add_{column}") for column in amount_columns}),
+            [{**{f"key_{c}": row[c] for c in key_columns}, **{f"add_{c}": row[c] for c in amount_columns}}
+             for row in batch]
+        )
+
+
+def record_turn(module_id, user_id, prompt_tokens, completion_tokens, cost, documents=(), at=None):
+    """
+    Adds one chat turn to the module's and student's usage. documents are the filenames of
+    the chunks retrieved for the answer (repeated once per chunk). Does not commit.
+    """
+    at = at or datetime.utcnow()
+    module_id = str(module_id)
+    amounts = dict(messages=1, promptTokens=prompt_tokens or 0, completionTokens=completion_tokens or 0,
+                   cost=cost or 0.0)
+
+    first_today = _increment(ChatUsageDaily, dict(moduleID=module_id, userID=user_id, usageDate=at.date()),
+                             amounts)
+    _increment(ModuleUsageDaily, dict(moduleID=module_id, usageDate=at.date()),
+               dict(amounts, activeStudents=1 if first_today else 0))
+    _increment(ModuleStudentUsage, dict(moduleID=module_id, userID=user_id), amounts,
+               dict(lastMessageAt=at))
+
+    chunks = {}
+    for filename in documents:
+        filename = (filename or "Unknown")[:FILENAME_LENGTH]
+        chunks[filename] = chunks.get(filename, 0) + 1
+    for filename, count in sorted(chunks.items()):  # Sorted, so concurrent turns lock rows in the same order
+        _increment(ModuleDocumentUsage, dict(moduleID=module_id, filename=filename),
+                   dict(retrievals=count, answers=1), dict(lastRetrievedAt=at))
+
+
+def record_grants(grants, at=None):
+    """Adds approved credits ({assignmentID: credits}) to the module and student totals. Does not commit."""
+    if not grants:
+        return
+    usage_date = (at or datetime.utcnow()).date()
+    assignment_ids = list(grants)
+    students = []
+    for start in range(0, len(assignment_ids), USAGE_BATCH_SIZE):
+        students += db.session.execute(
+            select(ModuleAssignment.assignmentID, ModuleAssignment.moduleID, ModuleAssignment.userID)
+            .where(ModuleAssignment.assignmentID.in_(assignment_ids[start:start + USAGE_BATCH_SIZE]))
+        ).all()
+
+    per_module = {}
+    for assignment_id, module_id, _ in students:
+        per_module[module_id] = per_module.get(module_id, 0) + grants[assignment_id]
+    _increment_many(ModuleUsageDaily, ("moduleID", "usageDate"), [
+        {"moduleID": module_id, "usageDate": usage_date, "creditsGranted": credits}
+        for module_id, credits in sorted(per_module.items())
+    ])
+    _increment_many(ModuleStudentUsage, ("moduleID", "userID"), [
+        {"moduleID": module_id, "userID": user_id, "creditsGranted": grants[assignment_id]}
+        for assignment_id, module_id, user_id in students
+    ])
+
+
+def rebuild_summaries(module_id=None):
+    """
+    Recomputes ModuleUsageDaily and ModuleStudentUsage (for one module, or all) from
+    ChatUsageDaily and approved credit requests, e.g. to backfill them. Document counts
+    can't be recomputed and are left as they are, as are students' last message times.
+    Does not commit.
+    """
+    last_messages = select(ModuleStudentUsage.moduleID, ModuleStudentUsage.userID, ModuleStudentUsage.lastMessageAt)\
+        .where(ModuleStudentUsage.lastMessageAt.is_not(None))
+    if module_id is not None:
+        last_messages = last_messages.where(ModuleStudentUsage.moduleID == module_id)
+    last_message_at = {(m, u): at for m, u, at in db.session.execute(last_messages)}
+
+    for model in (ModuleUsageDaily, ModuleStudentUsage):
+        statement = delete(model)
+        if module_id is not None:
+            statement = statement.where(model.moduleID == module_id)
+        db.session.execute(statement.execution_options(synchronize_session=False))
+
+    daily, students = {}, {}
+
+    def add(totals, key, **amounts):
+        row = totals.setdefault(key, {})
+        for column, amount in amounts.items():
+            row[column] = row.get(column, 0) + amount
+
+    chats = select(ChatUsageDaily.moduleID, ChatUsageDaily.userID, ChatUsageDaily.usageDate,
+                   ChatUsageDaily.messages, ChatUsageDaily.promptTokens, ChatUsageDaily.completionTokens,
+                   ChatUsageDaily.cost)
+    grants = select(ModuleAssignment.moduleID, ModuleAssignment.userID, CreditRequest.approvedAt,
+                    CreditRequest.requestDate, CreditRequest.creditsRequested)\
+        .join(ModuleAssignment, ModuleAssignment.assignmentID == CreditRequest.assignmentID)\
+        .where(CreditRequest.status == "Approved")
+    if module_id is not None:
+        chats = chats.where(ChatUsageDaily.moduleID == module_id)
+        grants = grants.where(ModuleAssignment.moduleID == module_id)
+
+    for row in db.session.execute(chats.execution_options(yield_per=USAGE_BATCH_SIZE)):
+        amounts = dict(messages=row.messages, promptTokens=row.promptTokens,
+                       completionTokens=row.completionTokens, cost=row.cost)
+        add(daily, (row.moduleID, row.usageDate), activeStudents=1, **amounts)
+        add(students, (row.moduleID, row.userID), **amounts)
+    for row in db.session.execute(grants.execution_options(yield_per=USAGE_BATCH_SIZE)):
+        # Requests approved before approval times were recorded count on their request date
+        granted_on = (row.approvedAt or row.requestDate).date()
+        add(daily, (row.moduleID, granted_on), creditsGranted=row.creditsRequested or 0)
+        add(students, (row.moduleID, row.userID), creditsGranted=row.creditsRequested or 0)
+
+    zero = dict(messages=0, promptTokens=0, completionTokens=0, cost=0.0, creditsGranted=0.0)
+    if daily:
+        db.session.execute(insert(ModuleUsageDaily), [
+            {**zero, "activeStudents": 0, **totals, "moduleID": m, "usageDate": d}
+            for (m, d), totals in daily.items()
+        ])
+    if students:
+        db.session.execute(insert(ModuleStudentUsage), [
+            {**zero, **totals, "moduleID": m, "userID": u, "lastMessageAt": last_message_at.get((m, u))}
+            for (m, u), totals in students.items()
+        ])
+
+
+def module_analytics(module_id, days=30, top_documents=10, credits_below=1.0, today=None):
+    """
+    Spend and usage of a module, read from the summaries with a few indexed queries:
+    lifetime totals, the last `days` days (including days without activity), each
+    enrolled student's totals (highest spend first), the students with fewer than
+    credits_below credits left and the most retrieved documents.
+    """
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=days - 1)
+
+    totals = db.session.execute(
+        select(func.coalesce(func.sum(ModuleUsageDaily.messages), 0).label("messages"),
+               func.coalesce(func.sum(ModuleUsageDaily.promptTokens), 0).label("promptTokens"),
+               func.coalesce(func.sum(ModuleUsageDaily.completionTokens), 0).label("completionTokens"),
+               func.coalesce(func.sum(ModuleUsageDaily.cost), 0.0).label("cost"),
+               func.coalesce(func.sum(ModuleUsageDaily.creditsGranted), 0.0).label("creditsGranted"))
+        .where(ModuleUsageDaily.moduleID == module_id)
+    ).one()
+
+    by_date = {row.usageDate: row for row in db.session.execute(
+        select(ModuleUsageDaily.usageDate, ModuleUsageDaily.messages, ModuleUsageDaily.activeStudents,
+               ModuleUsageDaily.cost, ModuleUsageDaily.creditsGranted)
+        .where(ModuleUsageDaily.moduleID == module_id, ModuleUsageDaily.usageDate >= first_day,
+               ModuleUsageDaily.usageDate <= today)
+    )}
+    daily = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        row = by_date.get(day)
+        daily.append({
+            "date": day.isoformat(),
+            "messages": row.messages if row else 0,
+            "activeStudents": row.activeStudents if row else 0,
+            "cost": row.cost if row else 0.0,
+            "creditsGranted": row.creditsGranted if row else 0.0,
+        })
+
+    students = [{
+        "userID": row.userID,
+        "studentID": row.studentID,
+        "name": row.name,
+        "studentCredits": row.studentCredits,
+        "messages": row.messages or 0,
+        "cost": row.cost or 0.0,
+        "creditsGranted": row.creditsGranted or 0.0,
+        "lastMessageAt": row.lastMessageAt.isoformat() if row.lastMessageAt else None,
+    } for row in db.session.execute(
+        select(ModuleAssignment.userID, User.studentID, User.name, ModuleAssignment.studentCredits,
+               ModuleStudentUsage.messages, ModuleStudentUsage.cost, ModuleStudentUsage.creditsGranted,
+               ModuleStudentUsage.lastMessageAt)
+        .join(User, User.userID == ModuleAssignment.userID)
+        .outerjoin(ModuleStudentUsage, (ModuleStudentUsage.moduleID == ModuleAssignment.moduleID) &
+                   (ModuleStudentUsage.userID == ModuleAssignment.userID))
+        .where(ModuleAssignment.moduleID == module_id)
+    )]
+    students.sort(key=lambda s: (-s["cost"], s["userID"]))
+
+    documents = db.session.execute(
+        select(ModuleDocumentUsage.filename, ModuleDocumentUsage.retrievals, ModuleDocumentUsage.answers,
+               ModuleDocumentUsage.lastRetrievedAt)
+        .where(ModuleDocumentUsage.moduleID == module_id)
+        .order_by(ModuleDocumentUsage.retrievals.desc(), ModuleDocumentUsage.filename)
+        .limit(top_documents)
+    ).all()
+
+    return {
+        "moduleID": module_id,
+        "totals": {
+            "messages": totals.messages,
+            "promptTokens": totals.promptTokens,
+            "completionTokens": totals.completionTokens,
+            "cost": totals.cost,
+            "creditsGranted": totals.creditsGranted,
+            "students": len(students),
+            "activeStudents": sum(1 for s in students if s["messages"]),
+        },
+        "daily": daily,
+        "students": students,
+        "lowCredits": sorted(
+            (s for s in students if (s["studentCredits"] or 0) < credits_below),
+            key=lambda s: (s["studentCredits"] or 0, s["userID"])
+        ),
+        "topDocuments": [{
+            "filename": row.filename,
+            "retrievals": row.retrievals,
+            "answers": row.answers,
+            "lastRetrievedAt": row.lastRetrievedAt.isoformat() if row.lastRetrievedAt else None,
+        } for row in documents],
+    }
@@ -0,0 +1,269 @@
+import functools
+import inspect
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from app.services import metrics
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en-v1.5")
+# Query vectors kept per process; repeated questions (and the dimension check
+# QdrantVectorStore runs on every chat turn) then skip the model
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+
+QDRANT_MODES = ("remote", "local", "memory")
+
+_lock = threading.Lock()
+_clients = {}
+_embeddings = None
+
+
+def qdrant_mode():
+    """
+    Where vectors are stored, from QDRANT_MODE:
+      remote - a Qdrant server at QDRANT_HOST (default)
+      local  - embedded in this process, persisted under QDRANT_PATH; no network hop, but the
+               storage can only be opened by one process, so run a single (threaded) worker
+      memory - embedded and discarded on exit, for tests and benchmarks
+    """
+    mode = os.getenv("QDRANT_MODE", "remote").lower()
+    if mode not in QDRANT_MODES:
+        raise ValueError(f"QDRANT_MODE must be one of {', '.join(QDRANT_MODES)}, not {mode!r}")
+    return mode
+
+
+def _create_client():
+    from qdrant_client import QdrantClient
+
+    mode = qdrant_mode()
+    if mode == "remote":
+        return QdrantClient(
+            url=os.getenv("QDRANT_HOST"),
+            api_key=os.getenv("QDRANT_API_KEY"),
+            prefer_grpc=False,
+            https=True,
+            timeout=10.0,
+            check_compatibility=False
+        )
+    if mode == "local":
+        return _serialized(QdrantClient(path=os.getenv("QDRANT_PATH", "qdrant_data")))
+    return _serialized(QdrantClient(location=":memory:"))
+
+
+def _serialized(client):
+    """
+    Makes every call on an embedded client take a lock. Embedded Qdrant isn't thread-safe
+    (concurrent upserts corrupt its in-memory arrays); a server needs no such lock.
+    """
+    lock = threading.RLock()
+
+    def locked(method):
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            with lock:
+                return method(*args, **kwargs)
+        return call
+
+    for name, _ in inspect.getmembers(type(client), inspect.isfunction):
+        if not name.startswith("_"):
+            setattr(client, name, locked(getattr(client, name)))
+    return client
+
+
+def get_qdrant_client():
+    """
+    Returns the Qdrant client for the current process (see qdrant_mode).
+
+    Clients are cached per PID: a client created in the gunicorn master before
+    forking holds sockets that must not be shared with the workers.
+    """
+    pid = os.getpid()
+    client = _clients.get(pid)
+    if client is None:
+        with _lock:
+            client = _clients.get(pid)
+            if client is None:
+                client = _create_client()
+                _clients.clear()
+                _clients[pid] = client
+    return client
+
+
+def close_qdrant_client():
+    """
+    Closes this process's client, if any. An embedded client locks its storage folder,
+    so the gunicorn master must release it before forking the worker that will use it.
+    """
+    with _lock:
+        client = _clients.pop(os.getpid(), None)
+    if client is not None:
+        client.close()
+
+
+def get_embeddings():
+    """
+    Returns the shared embedding model, loading it on first use.
+
+    When the app is preloaded by gunicorn the model is loaded once in the
+    master and shared copy-on-write with every forked worker.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                from langchain_core.embeddings import Embeddings
+                from langchain_huggingface import HuggingFaceEmbeddings
+                Embeddings.register(CachedEmbeddings)
+                _embeddings = CachedEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL))
+    return _embeddings
+
+
+def set_embeddings(model):
+    """Uses model (a LangChain Embeddings) instead of loading EMBEDDING_MODEL, behind the same cache."""
+    global _embeddings
+    from langchain_core.embeddings import Embeddings
+    Embeddings.register(CachedEmbeddings)
+    with _lock:
+        _embeddings = CachedEmbeddings(model)
+
+
+class CachedEmbeddings:
+    """
+    Wraps an embedding model with an LRU cache of single texts. Batches of documents
+    being indexed are passed straight through, as they're rarely embedded twice.
+    """
+
+    def __init__(self, model, size=None):
+        self.model = model
+        self.size = EMBEDDING_CACHE_SIZE if size is None else size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _embed_one(self, kind, text, embed):
+        key = (kind, text)  # Models may embed queries and documents differently
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+        if vector is not None:
+            metrics.embedding_cache.inc(result="hit")
+            return list(vector)
+
+        metrics.embedding_cache.inc(result="miss")
+        vector = embed(text)
+        with self._lock:
+            self._cache[key] = tuple(vector)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def embed_query(self, text):
+        return self._embed_one("query", text, self.model.embed_query)
+
+    def embed_documents(self, texts):
+        if len(texts) == 1:
+            return [self._embed_one("document", texts[0], lambda text: self.model.embed_documents([text])[0])]
+        return self.model.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+
+def collection_name(module_id):
+    """Name under which a module's documents are stored (a collection or an alias of one)."""
+    return f"module_{module_id}"
+
+
+def _aliases(client):
+    return {a.alias_name: a.collection_name for a in client.get_aliases().aliases}
+
+
+def resolve_collection(client, module_id):
+    """
+    Returns the real collection holding a module's documents, or None if it has none yet.
+
+    Renamed modules reach their collection through an alias. A collection that other
+    modules alias belongs to them, not to a later module that happens to reuse its name.
+    """
+    name = collection_name(module_id)
+    aliases = _aliases(client)
+    if name in aliases:
+        return aliases[name]
+    if name in aliases.values():
+        return None
+    if name in {c.name for c in client.get_collections().collections}:
+        return name
+    return None
+
+
+def collection_exists(client, module_id):
+    return resolve_collection(client, module_id) is not None
+
+
+def create_module_collection(client, module_id, vectors_config):
+    """
+    Creates a uniquely named collection for a module and points module_<id> at it, so the
+    module can later be renamed by moving the alias. Returns the real collection name.
+
+    Raises RuntimeError if module_<id> is still the name of a renamed module's collection
+    (created before aliases were used), as Qdrant aliases can't shadow a collection.
+    """
+    from qdrant_client import models
+
+    name = collection_name(module_id)
+    if client.collection_exists(name):
+        raise RuntimeError(f"Qdrant collection {name} already belongs to another module")
+
+    real = f"{name}_{uuid.uuid4().hex[:8]}"
+    client.create_collection(collection_name=real, vectors_config=vectors_config)
+    client.update_collection_aliases(change_aliases_operations=[
+        models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=real, alias_name=name))
+    ])
+    return real
+
+
+def rename_module_collection(client, old_module_id, new_module_id):
+    """
+    Points module_<new_module_id> at the old module's collection by swapping aliases in a
+    single atomic request, so no vectors are copied or re-embedded. Returns the real
+    collection name, or None if the old module has no collection.
+    """
+    from qdrant_client import models
+
+    real = resolve_collection(client, old_module_id)
+    if real is None:
+        return None
+
+    old_name, new_name = collection_name(old_module_id), collection_name(new_module_id)
+    aliases = _aliases(client)
+    operations = [
+        models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias))
+        for alias in (old_name, new_name) if alias in aliases
+    ]
+    if new_name != real:
+        # Renaming back to the collection's own name only needs the old alias removed
+        operations.append(models.CreateAliasOperation(
+            create_alias=models.CreateAlias(collection_name=real, alias_name=new_name)
+        ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return real
+
+
+def delete_module_collection(client, module_id):
+    """Deletes a module's collection and any aliases pointing at it. Returns True if one existed."""
+    from qdrant_client import models
+
+    real = resolve_collection(client, module_id)
+    if real is None:
+        return False
+    stale = [alias for alias, target in _aliases(client).items() if target == real]
+    if stale:
+        client.update_collection_aliases(change_aliases_operations=[
+            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)) for alias in stale
+        ])
+    client.delete_collection(collection_name=real)
+    return True
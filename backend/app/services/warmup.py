@@ -0,0 +1,59 @@
+import os
+import time
+from sqlalchemy import text
+from app.db import db
+from app.services import openrouter, vector_store
+
+
+def _env_flag(name, default="true"):
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def warm_up(app):
+    """
+    Initialises everything a chat turn would otherwise load lazily, so the first
+    requests after a (re)start do not pay for it. Each step is best effort: a
+    failure is reported and the app still starts.
+    Returns a dict of step name -> True/False.
+    """
+    steps = [("database", _warm_database)]
+    if _env_flag("WARMUP_QDRANT"):
+        steps.append(("qdrant", _warm_qdrant))
+    if _env_flag("WARMUP_PRICING"):
+        steps.append(("pricing", _warm_pricing))
+    if _env_flag("WARMUP_EMBEDDINGS") and not app.config.get("API_ONLY"):
+        steps.append(("embeddings", _warm_embeddings))
+
+    results = {}
+    with app.app_context():
+        for name, step in steps:
+            started = time.perf_counter()
+            try:
+                step()
+                results[name] = True
+                print(f"✅ Warm-up '{name}' done in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                results[name] = False
+                print(f"❌ Warm-up '{name}' failed:", e)
+    return results
+
+
+def _warm_database():
+    db.session.execute(text("SELECT 1"))
+    db.session.remove()
+
+
+def _warm_qdrant():
+    vector_store.get_qdrant_client().get_collections()
+    if vector_store.qdrant_mode() == "local":
+        # Checks the storage opens, then releases its lock for the worker that will serve it
+        vector_store.close_qdrant_client()
+
+
+def _warm_pricing():
+    openrouter.refresh_models()
+
+
+def _warm_embeddings():
+    # Embedding one string forces the model weights and tokenizer into memory
+    vector_store.get_embeddings().embed_query("warm-up")
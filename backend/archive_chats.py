@@ -0,0 +1,22 @@
+# Moves chats idle for longer than CHAT_ARCHIVE_AFTER_DAYS into compressed archive files:
+#   python archive_chats.py [--days N] [--module MODULE_ID]
+# Meant to be run periodically (e.g. a nightly cron job).
+import argparse
+import os
+from dotenv import load_dotenv
+from app import create_app
+from app.services.chat_archive import archive_old_chats
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+
+parser = argparse.ArgumentParser(description="Archive old chat sessions")
+parser.add_argument("--days", type=int, help="archive chats idle for longer than this many days")
+parser.add_argument("--module", help="only archive chats of this module")
+args = parser.parse_args()
+
+app = create_app()
+with app.app_context():
+    archived = archive_old_chats(older_than_days=args.days, module_id=args.module)
+    for module_id, count in archived.items():
+        print(f"🗄️ Archived {count} chats from {module_id}")
+    print(f"✅ Archived {sum(archived.values())} chats in total")
@@ -0,0 +1,140 @@
+"""
+A local stand-in for the OpenRouter API, so benchmarks measure the app rather than a remote LLM.
+
+Serves GET /models (with pricing) and POST /chat/completions in the OpenAI format, both plain
+and streamed (stream: true), after a configurable delay. Token usage is reported from the
+prompt's word count and a fixed completion length, so credit deductions stay realistic.
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL = "bench/fake-model"
+PROMPT_PRICE = 0.000001      # USD per token
+COMPLETION_PRICE = 0.000002
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default of 5 drops connections under load, adding 1s SYN retries
+
+
+class FakeOpenRouter:
+    """
+    latency_ms       - time to the first token (or to the whole response when not streaming)
+    jitter_ms        - random extra latency, uniform in [0, jitter_ms]
+    completion_tokens - tokens in every completion
+    token_delay_ms   - delay between streamed chunks
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=300, jitter_ms=100,
+                 completion_tokens=120, token_delay_ms=5):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.completion_tokens = completion_tokens
+        self.token_delay_ms = token_delay_ms
+        self._requests = itertools.count()
+        self.requests = 0
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self):
+        time.sleep((self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000)
+
+    def _completion(self, body):
+        prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        prompt_tokens = max(1, len(prompt.split()))
+        words = ["lorem"] * self.completion_tokens
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": self.completion_tokens,
+                 "total_tokens": prompt_tokens + self.completion_tokens}
+        return " ".join(words), usage
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass  # Keep benchmark output readable
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"data": [{
+                        "id": MODEL,
+                        "pricing": {"prompt": str(PROMPT_PRICE), "completion": str(COMPLETION_PRICE)}
+                    }]})
+                else:
+                    self._send_json(404, {"error": {"message": "Not found"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake.requests = next(fake._requests) + 1
+                fake._delay()
+                text, usage = fake._completion(body)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                base = {"id": completion_id, "created": int(time.time()), "model": body.get("model", MODEL)}
+
+                if not body.get("stream"):
+                    self._send_json(200, {
+                        **base, "object": "chat.completion",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": text}}],
+                        "usage": usage
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                chunk = {**base, "object": "chat.completion.chunk"}
+                for i, word in enumerate(text.split(" ")):
+                    delta = {"role": "assistant", "content": word} if i == 0 else {"content": " " + word}
+                    self._send_event({**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+                    time.sleep(fake.token_delay_ms / 1000)
+                self._send_event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                                  "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def _send_event(self, payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+        return Handler
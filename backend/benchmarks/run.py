@@ -0,0 +1,266 @@
+"""
+End-to-end benchmarks of the main API paths, run against local stand-ins:
+
+    python -m benchmarks.run [--requests N] [--concurrency C] [--scenarios send-message,roster ...]
+
+The app is served by a threaded Werkzeug server over a fresh SQLite database (or
+BENCH_DATABASE_URI), with a fake OpenRouter (benchmarks/fake_openrouter.py), an in-memory
+Qdrant (QDRANT_MODE=memory) and deterministic fake embeddings, so only the app's own work is measured plus
+the configured LLM latency. Data is seeded at --scale (see benchmarks/seed.py) and each
+scenario reports requests/sec and p50/p95/p99 latency; --json writes the results to a file.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+SCALES = {
+    # modules, students, chats per student, messages per chat, documents per module
+    "small": dict(modules=3, students=500, chats_per_student=1, messages_per_chat=6, documents_per_module=2),
+    "medium": dict(modules=10, students=5000, chats_per_student=2, messages_per_chat=10, documents_per_module=3),
+    "large": dict(modules=40, students=30000, chats_per_student=3, messages_per_chat=20, documents_per_module=5),
+}
+CSV_ENROL_SIZE = 200
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile, as reported by /api/traces/latency
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def enrol_module_ids(count):
+    return [f"ENROL{n:05d}" for n in range(count)]
+
+
+def docx_bytes(text):
+    from docx import Document
+    doc = Document()
+    for paragraph in text.split("\n\n"):
+        doc.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class Scenarios:
+    """Each scenario sends one request, given a requests.Session and the request's sequence number."""
+
+    def __init__(self, base_url, data, rng):
+        from benchmarks.seed import document_text, sentence
+        self.base_url = base_url
+        self.data = data
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._sentence = sentence
+        self._document = docx_bytes(document_text(random.Random(1), paragraphs=20))
+        # Credit requests need an assignment without a pending request, so each gets its own
+        self._free_assignments = iter(data.assignments)
+
+    def _random(self, values):
+        with self._lock:
+            return self.rng.choice(values)
+
+    def send_message(self, session, n):
+        # Half the turns continue a seeded chat (history + condensed question), half start one (title)
+        chat_id, user_id, module_id = self._random(self.data.chats)
+        payload = {"module_id": module_id, "user_id": user_id, "message": self._sentence(self.rng)}
+        if n % 2 == 0:
+            payload["chat_id"] = chat_id
+        return session.post(f"{self.base_url}/api/send-message", json=payload)
+
+    def tag_document(self, session, n):
+        module_id = self._random(self.data.modules)
+        files = {"file": (f"bench-{n}.docx", self._document)}
+        return session.post(f"{self.base_url}/api/tag-document", data={"moduleID": module_id}, files=files)
+
+    def roster(self, session, n):
+        module_id = self._random(self.data.modules)
+        return session.get(f"{self.base_url}/api/students-in-module/{module_id}",
+                           params={"page": 1 + n % 5, "perPage": 50})
+
+    def enrol_csv(self, session, n):
+        # Each upload goes to its own empty module (see enrol_module_ids), so it really enrols students
+        module_id = enrol_module_ids(n + 1)[n]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["studentID"])
+        with self._lock:
+            sample = self.rng.sample(self.data.student_ids, min(CSV_ENROL_SIZE, len(self.data.student_ids)))
+        writer.writerows([sid] for sid in sample)
+        files = {"file": ("students.csv", buffer.getvalue().encode())}
+        return session.post(f"{self.base_url}/api/enroll-students-csv", data={"moduleID": module_id}, files=files)
+
+    def credit_request(self, session, n):
+        with self._lock:
+            assignment_id = next(self._free_assignments)[0]
+        return session.post(f"{self.base_url}/api/credit-requests",
+                            json={"assignmentID": assignment_id, "creditsRequested": 5})
+
+    def credit_requests_list(self, session, n):
+        return session.get(f"{self.base_url}/api/credit-requests", params={"status": "Pending", "limit": 100})
+
+
+SCENARIOS = {
+    "send-message": Scenarios.send_message,
+    "tag-document": Scenarios.tag_document,
+    "roster": Scenarios.roster,
+    "enrol-csv": Scenarios.enrol_csv,
+    "credit-request": Scenarios.credit_request,
+    "credit-requests-list": Scenarios.credit_requests_list,
+}
+
+
+def run_scenario(scenarios, name, requests_count, concurrency, warmup=0, on_warm=None):
+    """
+    Sends requests_count requests from concurrency threads and summarises their latencies.
+    The first warmup requests are sent but not measured (first-use costs such as creating
+    HTTP clients would otherwise dominate the tail).
+    """
+    import requests
+
+    local = threading.local()
+    scenario = SCENARIOS[name]
+
+    def one(n):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = scenario(scenarios, local.session, n).status_code
+        except Exception as e:
+            status = type(e).__name__
+        return (time.perf_counter() - start) * 1000, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_count, requests_count + warmup)))
+        if on_warm:
+            on_warm()
+        started = time.perf_counter()
+        results = list(pool.map(one, range(requests_count)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(ms for ms, _ in results)
+    errors = [status for _, status in results if not (isinstance(status, int) and status < 400)]
+    return {
+        "scenario": name,
+        "requests": requests_count,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "errorStatuses": sorted({str(s) for s in errors}),
+        "rps": round(requests_count / elapsed, 2),
+        "p50": round(percentile(latencies, 50), 2),
+        "p95": round(percentile(latencies, 95), 2),
+        "p99": round(percentile(latencies, 99), 2),
+        "max": round(latencies[-1], 2),
+    }
+
+
+def print_report(results):
+    print(f"\n{'scenario':<22}{'reqs':>7}{'conc':>6}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for r in results:
+        print(f"{r['scenario']:<22}{r['requests']:>7}{r['concurrency']:>6}{r['errors']:>8}{r['rps']:>10}"
+              f"{r['p50']:>10}{r['p95']:>10}{r['p99']:>10}")
+        if r["errorStatuses"]:
+            print(f"{'':<22}error statuses: {', '.join(r['errorStatuses'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against local OpenRouter and Qdrant stand-ins")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated, from: " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, help="unmeasured requests per scenario (default: 2 per client)")
+    parser.add_argument("--scale", choices=SCALES, default="medium", help="size of the seeded data")
+    parser.add_argument("--llm-latency", type=int, default=300, help="fake OpenRouter latency in ms")
+    parser.add_argument("--llm-jitter", type=int, default=100, help="random extra latency in ms")
+    parser.add_argument("--completion-tokens", type=int, default=120, help="tokens per fake completion")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    warmup = 2 * args.concurrency if args.warmup is None else args.warmup
+    scenario_names = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenario_names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    from benchmarks.fake_openrouter import FakeOpenRouter, MODEL
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    fake = FakeOpenRouter(latency_ms=args.llm_latency, jitter_ms=args.llm_jitter,
+                          completion_tokens=args.completion_tokens).start()
+
+    # Must be set before the app (and the modules reading them at import) is loaded
+    os.environ["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+        "BENCH_DATABASE_URI", f"sqlite:///{os.path.join(workdir, 'bench.db')}?timeout=30")
+    os.environ["OPENROUTER_BASE_URL"] = fake.base_url
+    os.environ["OPENROUTER_API_KEY"] = "bench"
+    os.environ["QDRANT_MODE"] = "memory"
+    os.environ["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY") or "bench-secret-key-that-is-long-enough"
+    os.environ.setdefault("TRACE_LOG_LEVEL", "WARNING")
+    os.environ.setdefault("CHAT_ARCHIVE_DIR", os.path.join(workdir, "archive"))
+
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from werkzeug.serving import make_server
+    from app import create_app
+    from app.db import db
+    from app.migrations import run_migrations
+    from app.routes.chatbot_bp import tag_document_to_qdrant
+    from app.services import tracing, vector_store
+    from benchmarks.seed import create_modules, seed
+
+    app = create_app()
+    with app.app_context():
+        run_migrations()
+        vector_store.set_embeddings(DeterministicFakeEmbedding(size=384))
+        started = time.perf_counter()
+        data = seed(model=MODEL, tag_document=tag_document_to_qdrant, **SCALES[args.scale])
+        if "enrol-csv" in scenario_names:
+            create_modules(enrol_module_ids(args.requests + warmup), MODEL)
+            db.session.commit()
+        print(f"🌱 Seeded {len(data.student_ids)} students, {len(data.assignments)} enrolments and "
+              f"{len(data.chats)} chats in {time.perf_counter() - started:.1f}s")
+        db.session.remove()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # No access log line per request
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    scenarios = Scenarios(base_url, data, random.Random(7))
+
+    results = []
+    try:
+        for name in scenario_names:
+            count = args.requests
+            if name == "credit-request":
+                count = min(count, len(data.assignments) - warmup)
+            print(f"⏱️  {name}: {count} requests, {args.concurrency} concurrent")
+            results.append(run_scenario(scenarios, name, count, args.concurrency, warmup,
+                                        on_warm=lambda: tracing.reset() if name == "send-message" else None))
+    finally:
+        server.shutdown()
+        fake.stop()
+
+    print_report(results)
+    stages = tracing.latency_percentiles("chat.")
+    if stages:
+        print("\nChat turn stages (ms):")
+        for stage, stats in stages.items():
+            print(f"  {stage:<22}p50 {stats['p50']:>9}  p95 {stats['p95']:>9}  p99 {stats['p99']:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scale": args.scale, "llmLatencyMs": args.llm_latency,
+                       "results": results, "chatStages": stages}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Synthetic data for benchmarks: modules with chatbot settings and tagged documents, a student
+directory, enrolments with credit, and chat histories. Rows are bulk inserted, so seeding tens
+of thousands of messages takes seconds. Must be called inside an app context.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app.db import db
+from app.models.chat_history import ChatHistory
+from app.models.chat_message import ChatMessage
+from app.models.chatbot_settings import ChatbotSettings
+from app.models.module import Module
+from app.models.module_assignment import ModuleAssignment
+from app.models.students import Student
+from app.models.users import User
+
+WORDS = ("algorithm array binary cache compiler database graph hash heap index kernel latency "
+         "matrix network object pointer queue recursion schema stack thread tree vector").split()
+FIRST_STUDENT_ID = 2300000
+STUDENT_CREDITS = 1000.0  # Enough that benchmark turns never run a student out of credit
+
+
+@dataclass
+class SeededData:
+    modules: list = field(default_factory=list)
+    student_ids: list = field(default_factory=list)      # Whole directory, enrolled or not
+    assignments: list = field(default_factory=list)      # (assignmentID, userID, moduleID)
+    chats: list = field(default_factory=list)            # (historyID, userID, moduleID)
+
+
+def sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def document_text(rng, paragraphs=40):
+    return "\n\n".join(" ".join(sentence(rng) for _ in range(6)) for _ in range(paragraphs))
+
+
+def _bulk_insert(model, rows, batch_size=5000):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(model), rows[start:start + batch_size])
+
+
+def create_modules(module_ids, model="bench/fake-model"):
+    """Inserts empty modules with chatbot settings (not committed)."""
+    _bulk_insert(Module, [{"moduleID": m, "moduleName": f"Benchmark module {m}", "moduleDesc": None,
+                           "initialCredit": 10} for m in module_ids])
+    _bulk_insert(ChatbotSettings, [{"moduleID": m, "model": model, "temperature": 0.7,
+                                    "system_prompt": "You are a helpful teaching assistant.", "max_tokens": 256}
+                                   for m in module_ids])
+
+
+def seed(modules=5, students=5000, enrolled_fraction=0.6, modules_per_student=2, chats_per_student=2,
+         messages_per_chat=10, documents_per_module=3, model="bench/fake-model", rng_seed=42, tag_document=None):
+    """
+    Seeds the database and returns a SeededData describing what was created.
+
+    tag_document(module_id, text, filename) indexes a document into Qdrant; pass
+    routes.chatbot_bp.tag_document_to_qdrant to embed documents the way the app does.
+    """
+    rng = random.Random(rng_seed)
+    data = SeededData(modules=[f"BENCH{i:03d}" for i in range(modules)])
+
+    create_modules(data.modules, model)
+
+    data.student_ids = [str(FIRST_STUDENT_ID + i) for i in range(students)]
+    _bulk_insert(Student, [{"studentID": sid, "fullName": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+                            "email": f"{sid}@students.bench", "mobileNumber": None} for sid in data.student_ids])
+
+    enrolled = data.student_ids[:int(students * enrolled_fraction)]
+    _bulk_insert(User, [{"name": f"Student {sid}", "email": f"{sid}@students.bench", "password": "bench",
+                         "role": "Student", "studentID": int(sid)} for sid in enrolled])
+    users = db.session.query(User.userID).filter(User.studentID >= FIRST_STUDENT_ID,
+                                                 User.studentID < FIRST_STUDENT_ID + students).all()
+    _bulk_insert(ModuleAssignment, [{"userID": user_id, "moduleID": m, "studentCredits": STUDENT_CREDITS}
+                                    for (user_id,) in users
+                                    for m in rng.sample(data.modules, min(modules_per_student, modules))])
+    data.assignments = db.session.query(ModuleAssignment.assignmentID, ModuleAssignment.userID,
+                                        ModuleAssignment.moduleID)\
+        .filter(ModuleAssignment.moduleID.in_(data.modules)).all()
+
+    now = datetime.utcnow()
+    _bulk_insert(ChatHistory, [{"assignmentID": assignment_id, "chatlog": sentence(rng, 4),
+                                "dateStarted": now - timedelta(days=rng.randint(0, 60))}
+                               for assignment_id, _, _ in data.assignments for _ in range(chats_per_student)])
+    data.chats = db.session.query(ChatHistory.historyID, ModuleAssignment.userID, ModuleAssignment.moduleID)\
+        .join(ModuleAssignment, ModuleAssignment.assignmentID == ChatHistory.assignmentID)\
+        .filter(ModuleAssignment.moduleID.in_(data.modules)).all()
+
+    messages = []
+    for history_id, _, _ in data.chats:
+        started = now - timedelta(days=rng.randint(0, 60))
+        for n in range(messages_per_chat):
+            messages.append({"chatID": history_id, "sender": "user" if n % 2 == 0 else "ai",
+                             "content": sentence(rng, 30 if n % 2 else 12),
+                             "timestamp": started + timedelta(seconds=30 * n)})
+    _bulk_insert(ChatMessage, messages)
+    db.session.commit()
+
+    if tag_document:
+        for module_id in data.modules:
+            for n in range(documents_per_module):
+                tag_document(module_id, document_text(rng), f"notes-{n}.txt")
+    return data
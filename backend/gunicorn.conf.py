@@ -0,0 +1,66 @@
+# Gunicorn configuration for production: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is preloaded in the master and warmed up (database, Qdrant, OpenRouter
+# pricing, embedding model) before any worker is forked, so workers share the
+# model weights copy-on-write and never cold-start on their first chat.
+#
+# A separate pool of light workers can be run with API_ONLY=true: they serve every
+# endpoint except /send-message and /tag-document and never import the ML stack.
+#
+# Reloading: `kill -HUP <master>` gracefully replaces workers with the new config.
+# Because the app is preloaded, code changes need a fresh master: send USR2 to
+# start a new master alongside the old one, then WINCH/QUIT the old one.
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Chat turns are dominated by waiting on OpenRouter/Qdrant, so threads are cheap
+# concurrency; processes are what multiply memory.
+worker_class = "gthread"
+# Embedded Qdrant storage (QDRANT_MODE=local) can only be opened by one process
+single_process = os.getenv("QDRANT_MODE", "remote").lower() == "local"
+# The LLM scheduler's LLM_* limits are per worker, so the deployment-wide limits are
+# the configured values times the number of workers (see app/services/llm_scheduler.py)
+workers = int(os.getenv("GUNICORN_WORKERS", 1 if single_process else multiprocessing.cpu_count()))
+# Notification long-polls hold a thread each, up to NOTIFICATION_MAX_WAITING per worker
+# (half of GUNICORN_THREADS by default, see app/services/notifications.py). LLM_MAX_CONCURRENT
+# defaults to one less than this, so chat turns beyond it queue fairly per module in the
+# LLM scheduler; raise both together
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+preload_app = True
+
+# LLM calls can take a while; don't kill workers mid-response
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting all at once.
+# Background jobs a recycled worker was running are restarted by the next request for
+# them once their heartbeat lapses (JOB_LEASE_SECONDS, see app/services/jobs.py)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before workers are forked
+    from app.services.warmup import warm_up
+    warm_up(server.app.wsgi())
+
+    # Move everything loaded so far out of the GC's reach so collections in the
+    # workers don't touch (and therefore copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connections opened by the master must not be shared across processes
+    from app.db import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
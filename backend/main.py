@@ -2,8 +2,9 @@ import os
 from app import create_app
 from dotenv import load_dotenv
 
-debug = True
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+# Development server only; production runs gunicorn -c gunicorn.conf.py wsgi:app
+debug = os.getenv("FLASK_DEBUG", "true").lower() == "true"
 
 app = create_app()
 
@@ -1,6 +1,11 @@
+# Brings the database schema up to date: python migrate.py
+# Safe to run repeatedly and on databases created before migrations existed.
 from app import create_app
-from app.db import db
+from app.migrations import run_migrations, current_version
 
 app = create_app()
 with app.app_context():
-    db.create_all()
\ No newline at end of file
+    applied = run_migrations()
+    if not applied:
+        print("✅ Database schema is up to date")
+    print(f"Schema version: {current_version()}")
@@ -17,6 +17,13 @@ def import_all_models():
     from app.models.students import Student
     from app.models.chat_message import ChatMessage
     from app.models.credit_requests import CreditRequest
+    from app.models.archived_chat import ArchivedChat
+    from app.models.background_job import BackgroundJob
+    from app.models.chat_usage_daily import ChatUsageDaily
+    from app.models.module_usage_daily import ModuleUsageDaily
+    from app.models.module_student_usage import ModuleStudentUsage
+    from app.models.module_document_usage import ModuleDocumentUsage
+    from app.models.idempotent_request import IdempotentRequest
 
 
 @pytest.fixture(scope="session")
@@ -42,3 +42,183 @@ def test_search_students_empty_query(test_client):
     response = test_client.get('/api/search-students')
     assert response.status_code == 200
     assert response.json == []
+
+def _seed_roster(module_id, count, first_student_id):
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+
+    for i in range(count):
+        user = User(name=f"Roster Student {i:03d}", email=f"roster{i}@{module_id}.test",
+                    password="x", role="Student", studentID=first_student_id + i)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(ModuleAssignment(userID=user.userID, moduleID=module_id, studentCredits=float(i)))
+    db.session.commit()
+
+def test_students_in_module_single_query(test_client):
+    """
+    GIVEN a module with many enrolled students
+    WHEN the '/api/students-in-module/<module_id>' page is requested (GET)
+    THEN check that the whole roster is returned from one query
+    """
+    from sqlalchemy import event
+    from app.db import db
+
+    _seed_roster("ROSTER1", 40, 2400000)
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        response = test_client.get('/api/students-in-module/ROSTER1')
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == 200
+    assert len(response.json) == 40
+    assert len(statements) == 1
+
+def test_students_in_module_paginated_and_filtered(test_client):
+    """
+    GIVEN a module with many enrolled students
+    WHEN the roster is requested with a credit filter, sorting and pagination
+    THEN check that only the requested page is returned along with the filtered total
+    """
+    _seed_roster("ROSTER2", 30, 2401000)
+    response = test_client.get('/api/students-in-module/ROSTER2'
+                               '?creditsBelow=10&sort=studentCredits&order=desc&page=2&perPage=4')
+    assert response.status_code == 200
+    assert response.headers['X-Total-Count'] == '10'
+    assert [s['studentCredits'] for s in response.json] == [5.0, 4.0, 3.0, 2.0]
+
+    # A page past the end is empty but still reports the total
+    response = test_client.get('/api/students-in-module/ROSTER2?creditsBelow=10&page=4&perPage=4')
+    assert response.status_code == 200
+    assert response.json == []
+    assert response.headers['X-Total-Count'] == '10'
+
+    response = test_client.get('/api/students-in-module/ROSTER2?q=student 02')
+    assert sorted(s['name'] for s in response.json) == [f"Roster Student 02{i}" for i in range(10)]
+
+def test_enroll_students_csv_bulk(test_client):
+    """
+    GIVEN a module and a large CSV roster with already-enrolled, unknown and malformed IDs
+    WHEN the '/api/enroll-students-csv' page is posted to (POST)
+    THEN check that the per-row report is correct and the query count doesn't grow with the roster
+    """
+    import io
+    from sqlalchemy import event, insert
+    from app.db import db
+    from app.models.module import Module
+    from app.models.students import Student
+
+    roster_size = 1000
+    first_id = 2500000
+    db.session.add(Module(moduleID="BULK1", moduleName="Bulk", initialCredit=5))
+    db.session.execute(insert(Student), [
+        {"studentID": str(first_id + i), "fullName": f"Bulk {i}", "email": f"bulk{i}@test"}
+        for i in range(roster_size)
+    ])
+    db.session.commit()
+    _seed_roster("BULK1", 1, first_id)  # first student is already enrolled
+
+    ids = [str(first_id + i) for i in range(roster_size)] + ["9999999", "abc", str(first_id + 1)]
+    csv_data = "name,studentID\n" + "".join(f"x,{sid}\n" for sid in ids)
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        response = test_client.post('/api/enroll-students-csv', data={
+            'moduleID': 'BULK1',
+            'file': (io.BytesIO(csv_data.encode()), 'roster.csv'),
+        })
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == 200
+    assert response.json['message'] == f"{roster_size - 1}/{roster_size + 3} students added successfully. 1 student not found. (9999999)"
+    assert response.json['skipped'] == [f"Already enrolled: {first_id}", "Invalid ID format: abc", f"Already enrolled: {first_id + 1}"]
+    # A handful of statements per committed batch, however many rows each batch holds
+    assert response.json['summary']['batches'] == 3
+    assert len(statements) <= 6 * response.json['summary']['batches']
+
+    roster = test_client.get('/api/students-in-module/BULK1?perPage=1')
+    assert roster.headers['X-Total-Count'] == str(roster_size)
+
+def test_csv_stream_detects_encoding_and_header():
+    """
+    GIVEN CSV uploads in different encodings and header layouts
+    WHEN student IDs are streamed from them
+    THEN check that the encoding and the student ID column are detected
+    """
+    import io
+    from app.services.enrolment import open_csv, iter_student_ids
+
+    excel_csv = "Nom,Student No\r\nJos\xe9,2700001\r\n".encode("cp1252")
+    assert list(iter_student_ids(open_csv(io.BytesIO(excel_csv)))) == ["2700001"]
+
+    bom_csv = b"\xef\xbb\xbfstudentID,name\n2700002,A\n"
+    assert list(iter_student_ids(open_csv(io.BytesIO(bom_csv)))) == ["2700002"]
+
+    headerless_csv = b"A,2700003\nB,2700004\n"
+    fallback = lambda row: row[1]
+    assert list(iter_student_ids(open_csv(io.BytesIO(headerless_csv)), fallback)) == ["2700003", "2700004"]
+
+def test_search_students_uses_in_memory_index(test_client):
+    """
+    GIVEN students in the Students directory
+    WHEN the '/api/search-students' page is requested (GET) by ID prefix, name prefix and misspelt name
+    THEN check that matches come from the index, which follows committed inserts and deletes
+    """
+    from app.db import db
+    from app.models.students import Student
+    from app.services import student_search
+
+    db.session.add_all([
+        Student(studentID="3100001", fullName="Alice Tan", email="alice@test"),
+        Student(studentID="3100002", fullName="Bob Lim", email="bob@test"),
+        Student(studentID="3100103", fullName="Alicia Wong", email="alicia@test"),
+    ])
+    db.session.commit()
+    student_search._index.rebuild([])  # Force a rebuild from the table on next use
+    student_search._index._built_at = None
+
+    ids = lambda q: [s['studentID'] for s in test_client.get(f'/api/search-students?q={q}').json]
+    assert ids("310000") == ["3100001", "3100002"]
+    assert ids("ali") == ["3100001", "3100103"]
+    assert ids("alice t") == ["3100001"]
+    assert ids("wnog") == ["3100103"]  # Misspelt: no prefix match, so fuzzy
+    assert ids("zzz") == []
+    assert len(test_client.get('/api/search-students?q=31&limit=1').json) == 1
+
+    # Committed changes are applied to the index without a rebuild
+    db.session.add(Student(studentID="3100004", fullName="Carol Ng", email="carol@test"))
+    db.session.commit()
+    assert ids("carol") == ["3100004"]
+    db.session.delete(db.session.get(Student, "3100002"))
+    db.session.commit()
+    assert ids("bob") == []
+
+def test_student_index_is_case_insensitive():
+    """
+    GIVEN an index of students with mixed-case IDs and names
+    WHEN it is searched in a different case
+    THEN check that matches are found and returned in order
+    """
+    from app.services.student_search import StudentSearchIndex
+
+    index = StudentSearchIndex()
+    index.rebuild([("a100", "ÉLODIE Martin"), ("A101", "Zoe STRASSE"), ("B200", "élodie Roux")])
+    assert [s for s, _ in index.search("A1", 10)] == ["a100", "A101"]
+    assert {s for s, _ in index.search("Élodie", 10)} == {"a100", "B200"}
+    assert [s for s, _ in index.search("straße", 10)] == ["A101"]
+
+    index.upsert("a102", "Anna LEE")
+    index.remove("A101")
+    assert [s for s, _ in index.search("a1", 10)] == ["a100", "a102"]
+    assert [s for s, _ in index.search("lee", 10)] == ["a102"]
@@ -69,3 +69,402 @@ def test_get_module_model_not_found(test_client):
     response = test_client.get('/api/get-module-model/nonexistent')
     assert response.status_code == 404
     assert response.json['error'] == 'Chatbot settings not found for this module'
+
+def _seed_chat(message_count):
+    from datetime import datetime, timedelta
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+
+    user = User(name="Chat Student", email="chat@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="CHAT1", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    started = datetime(2025, 1, 1)
+    chats = [ChatHistory(assignmentID=assignment.assignmentID, chatlog=f"Chat {i}",
+                         dateStarted=started + timedelta(days=i)) for i in range(3)]
+    db.session.add_all(chats)
+    db.session.flush()
+    for i in range(message_count):
+        # Pairs of messages share a timestamp, so ordering must fall back to messageID
+        db.session.add(ChatMessage(chatID=chats[0].historyID, sender="user" if i % 2 == 0 else "ai",
+                                   content=f"message {i}", timestamp=started + timedelta(seconds=i // 2)))
+    db.session.commit()
+    return user.userID, chats[0].historyID
+
+def test_get_chat_message_keyset_pagination(test_client):
+    """
+    GIVEN a chat with many messages, some sharing a timestamp
+    WHEN messages are paged backwards with limit/before and refreshed with since
+    THEN check that every message is returned exactly once, in order
+    """
+    _, chat_id = _seed_chat(9)
+
+    everything = test_client.get(f'/api/get-chat-message/{chat_id}').json
+    assert [m['content'] for m in everything] == [f"message {i}" for i in range(9)]
+
+    latest = test_client.get(f'/api/get-chat-message/{chat_id}?limit=4').json
+    assert [m['content'] for m in latest] == [f"message {i}" for i in range(5, 9)]
+
+    older = test_client.get(f'/api/get-chat-message/{chat_id}?limit=4&before={latest[0]["cursor"]}').json
+    assert [m['content'] for m in older] == [f"message {i}" for i in range(1, 5)]
+
+    newer = test_client.get(f'/api/get-chat-history/{chat_id}?since={everything[6]["cursor"]}').json
+    assert [m['content'] for m in newer['chat_history']] == ["message 7", "message 8"]
+
+    response = test_client.get(f'/api/get-chat-message/{chat_id}?before=garbage')
+    assert response.status_code == 400
+
+def test_get_chat_sessions_keyset_pagination(test_client):
+    """
+    GIVEN a student with several chat sessions
+    WHEN the sessions are requested page by page
+    THEN check that pages follow each other newest first
+    """
+    user_id, _ = _seed_chat(0)
+
+    first = test_client.get(f'/api/get-chat-history/{user_id}/CHAT1?limit=2').json
+    assert [c['chatlog'] for c in first] == ["Chat 2", "Chat 1"]
+
+    second = test_client.get(f'/api/get-chat-history/{user_id}/CHAT1?limit=2&cursor={first[-1]["cursor"]}').json
+    assert [c['chatlog'] for c in second] == ["Chat 0"]
+
+def test_archived_chat_is_served_from_archive(test_client, tmp_path, monkeypatch):
+    """
+    GIVEN a chat whose last message is older than the archive age
+    WHEN old chats are archived
+    THEN check that its messages leave ChatMessage but are still returned by the chat endpoints
+    """
+    from app.db import db
+    from app.models.chat_message import ChatMessage
+    from app.services import chat_archive
+
+    monkeypatch.setattr(chat_archive, "ARCHIVE_DIR", tmp_path)
+    _, chat_id = _seed_chat(6)
+    before = test_client.get(f'/api/get-chat-message/{chat_id}').json
+
+    archived = chat_archive.archive_old_chats(older_than_days=30, module_id="CHAT1")
+    assert archived["CHAT1"] >= 1
+    assert ChatMessage.query.filter_by(chatID=chat_id).count() == 0
+    assert list(tmp_path.glob(f"CHAT1/*{chat_archive.ARCHIVE_EXTENSION}"))
+
+    assert test_client.get(f'/api/get-chat-message/{chat_id}').json == before
+    latest = test_client.get(f'/api/get-chat-history/{chat_id}?limit=2').json['chat_history']
+    assert [m['content'] for m in latest] == ["message 4", "message 5"]
+
+    assert chat_archive.restore_chat(chat_id)
+    db.session.commit()
+    assert ChatMessage.query.filter_by(chatID=chat_id).count() == 6
+
+def test_send_message_is_traced_per_stage(test_client, monkeypatch):
+    """
+    GIVEN a student in a module whose model pricing can't be fetched
+    WHEN the '/api/send-message' page is posted to (POST) with an X-Request-ID
+    THEN check that the stages run are logged under that request ID and reported in the latency stats
+    """
+    import logging
+    import requests
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chatbot_settings import ChatbotSettings
+    from app.routes import chatbot_bp
+    from app.services import tracing
+
+    def pricing_unavailable(model_id):
+        raise requests.exceptions.ConnectionError("OpenRouter unavailable")
+
+    monkeypatch.setattr(chatbot_bp, "get_model_pricing", pricing_unavailable)
+    user = User(name="Traced", email="traced@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(ModuleAssignment(userID=user.userID, moduleID="TRACE1", studentCredits=1.0))
+    db.session.add(ChatbotSettings(moduleID="TRACE1", model="m", temperature=1.0, system_prompt="", max_tokens=1))
+    db.session.commit()
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = lambda record: records.append(json.loads(record.getMessage()))
+    tracing.logger.addHandler(handler)
+    try:
+        response = test_client.post('/api/send-message', headers={"X-Request-ID": "trace-test-1"},
+                                    json={"module_id": "TRACE1", "message": "hi", "user_id": user.userID})
+    finally:
+        tracing.logger.removeHandler(handler)
+
+    assert response.status_code == 500
+    assert response.headers["X-Request-ID"] == "trace-test-1"
+    assert records[-1]["requestID"] == "trace-test-1"
+    assert records[-1]["moduleID"] == "TRACE1"
+    assert [span["name"] for span in records[-1]["spans"]] == ["db.lookup", "queue", "db.chat", "pricing"]
+    assert records[-1]["spans"][-1]["unfinished"] is True
+
+    stats = test_client.get('/api/traces/latency?prefix=chat.').json
+    assert stats["chat.pricing"]["count"] >= 1
+    assert set(stats["chat.total"]) == {"count", "p50", "p95", "p99", "max"}
+
+def test_send_message_rejects_parallel_turns_with_429(test_client, monkeypatch):
+    """
+    GIVEN a student who already has a chat turn being answered
+    WHEN the '/api/send-message' page is posted to (POST) again
+    THEN check that it is turned away with a 429 and a Retry-After hint before any chat is created
+    """
+    from app.db import db
+    from app.models.users import User
+    from app.models.chat_history import ChatHistory
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chatbot_settings import ChatbotSettings
+    from app.routes import chatbot_bp
+    from app.services.llm_scheduler import LLMScheduler
+
+    monkeypatch.setattr(chatbot_bp, "scheduler", LLMScheduler(user_max_in_flight=1))
+    user = User(name="Busy", email="busy@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="SCHED1", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.add(ChatbotSettings(moduleID="SCHED1", model="m", temperature=1.0, system_prompt="", max_tokens=1))
+    db.session.commit()
+
+    ticket = chatbot_bp.scheduler.acquire(user.userID, "SCHED1")
+    response = test_client.post('/api/send-message',
+                                json={"module_id": "SCHED1", "message": "hi", "user_id": user.userID})
+
+    assert response.status_code == 429
+    assert response.json["reason"] == "user_in_flight"
+    assert int(response.headers["Retry-After"]) >= 1
+    assert ChatHistory.query.filter_by(assignmentID=assignment.assignmentID).count() == 0
+    chatbot_bp.scheduler.release(ticket)
+
+def test_archiving_keeps_messages_saved_while_it_runs(test_client, tmp_path, monkeypatch):
+    """
+    GIVEN two idle chats, one of which gets a new message after being selected for archiving
+        and the other while its archive frame is being written
+    WHEN old chats are archived
+    THEN check that the first chat isn't archived and no new message is deleted
+    """
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+    from app.models.archived_chat import ArchivedChat
+    from app.services import chat_archive
+
+    monkeypatch.setattr(chat_archive, "ARCHIVE_DIR", tmp_path)
+    user = User(name="Archive Race", email="archive-race@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="ARCHIVE-RACE", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    resumed, written = [ChatHistory(assignmentID=assignment.assignmentID, chatlog=f"Idle {i}",
+                                    dateStarted=datetime(2024, 1, 1)) for i in range(2)]
+    db.session.add_all([resumed, written])
+    db.session.flush()
+    for chat in (resumed, written):
+        db.session.add_all(ChatMessage(chatID=chat.historyID, sender="user", content=f"old {i}",
+                                       timestamp=datetime(2024, 1, 1) + timedelta(seconds=i)) for i in range(2))
+    db.session.commit()
+    resumed_id, written_id = resumed.historyID, written.historyID
+
+    def new_message(chat_id):
+        db.session.execute(insert(ChatMessage).values(chatID=chat_id, sender="user", content="new",
+                                                      timestamp=datetime.utcnow()))
+
+    select_chats, compress = chat_archive._chats_to_archive, chat_archive._compress
+
+    def selected_then_resumed(*args):
+        rows = select_chats(*args)
+        if any(history_id == resumed_id for history_id, _ in rows):
+            new_message(resumed_id)
+        return rows
+
+    def written_then_replied(data):
+        if b'"Idle 1"' in data:
+            new_message(written_id)
+        return compress(data)
+
+    monkeypatch.setattr(chat_archive, "_chats_to_archive", selected_then_resumed)
+    monkeypatch.setattr(chat_archive, "_compress", written_then_replied)
+
+    assert chat_archive.archive_old_chats(older_than_days=30, module_id="ARCHIVE-RACE") == {"ARCHIVE-RACE": 1}
+    assert db.session.get(ArchivedChat, resumed_id) is None
+    assert ChatMessage.query.filter_by(chatID=resumed_id).count() == 3
+    assert db.session.get(ArchivedChat, written_id).messageCount == 2
+    assert [m.content for m in ChatMessage.query.filter_by(chatID=written_id)] == ["new"]
+
+def _fake_llm(monkeypatch, on_call=None, prompt_tokens=100, completion_tokens=50):
+    """Replaces OpenRouter and Qdrant for /send-message; on_call() runs during each LLM call."""
+    import langchain_openai
+    from langchain_core.messages import AIMessage
+    from app.routes import chatbot_bp
+
+    calls = []
+
+    class FakeChatOpenAI:
+        def __init__(self, **kwargs):
+            self.model_name = kwargs.get("model_name")
+
+        def invoke(self, messages):
+            calls.append(self.model_name)
+            if on_call:
+                on_call()
+            return AIMessage(content="An answer", response_metadata={"token_usage": {
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}})
+
+    class NoDocuments:
+        def scroll(self, collection_name):
+            return [], None
+
+    monkeypatch.setattr(langchain_openai, "ChatOpenAI", FakeChatOpenAI)
+    monkeypatch.setattr(chatbot_bp, "get_qdrant_client", lambda: NoDocuments())
+    monkeypatch.setattr(chatbot_bp, "get_model_pricing", lambda model_id: (0.001, 0.002))
+    return calls
+
+def test_send_message_keeps_credits_granted_during_the_llm_call(test_client, monkeypatch):
+    """
+    GIVEN a student whose credit request is approved while their message is being answered
+    WHEN the '/api/send-message' turn finishes
+    THEN check that the cost is deducted from the new balance rather than the one read before the call
+    """
+    from datetime import datetime
+    from sqlalchemy import update
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chatbot_settings import ChatbotSettings
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+
+    user = User(name="Granted", email="granted@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="DEDUCT1", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.add(ChatbotSettings(moduleID="DEDUCT1", model="m", temperature=1.0, system_prompt="Be brief", max_tokens=50))
+    db.session.flush()
+    # An ongoing chat, so nothing is committed between reading the balance and deducting from it
+    chat = ChatHistory(assignmentID=assignment.assignmentID, chatlog="Ongoing", dateStarted=datetime.utcnow())
+    db.session.add(chat)
+    db.session.flush()
+    db.session.add_all([ChatMessage(chatID=chat.historyID, sender="user", content="q", timestamp=datetime.utcnow()),
+                        ChatMessage(chatID=chat.historyID, sender="ai", content="a", timestamp=datetime.utcnow())])
+    db.session.commit()
+    assignment_id, chat_id = assignment.assignmentID, chat.historyID
+
+    def grant():
+        # Like set_pending_status: atomic, and leaves the route's loaded assignment untouched
+        db.session.execute(update(ModuleAssignment).where(ModuleAssignment.assignmentID == assignment_id)
+                           .values(studentCredits=ModuleAssignment.studentCredits + 5)
+                           .execution_options(synchronize_session=False))
+
+    _fake_llm(monkeypatch, on_call=grant)
+    response = test_client.post('/api/send-message', json={"module_id": "DEDUCT1", "message": "hi",
+                                                          "user_id": user.userID, "chat_id": chat_id})
+
+    assert response.status_code == 200
+    assert response.json["cost"] == 0.2
+    db.session.expire_all()
+    assert db.session.get(ModuleAssignment, assignment_id).studentCredits == 1.0 + 5 - 0.2
+
+def test_send_message_duplicates_are_coalesced_per_model(test_client, monkeypatch):
+    """
+    GIVEN an ongoing chat
+    WHEN the same message is sent with one model, then with another, then with the first again
+    THEN check that each model is called once and the repeat gets the stored answer
+    """
+    from datetime import datetime
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chatbot_settings import ChatbotSettings
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+
+    user = User(name="Model Switcher", email="model-switcher@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="COALESCE1", studentCredits=10.0)
+    db.session.add(assignment)
+    db.session.add(ChatbotSettings(moduleID="COALESCE1", model="m", temperature=1.0, system_prompt="Be brief",
+                                   max_tokens=50))
+    db.session.flush()
+    chat = ChatHistory(assignmentID=assignment.assignmentID, chatlog="Ongoing", dateStarted=datetime.utcnow())
+    db.session.add(chat)
+    db.session.flush()
+    db.session.add_all([ChatMessage(chatID=chat.historyID, sender="user", content="q", timestamp=datetime.utcnow()),
+                        ChatMessage(chatID=chat.historyID, sender="ai", content="a", timestamp=datetime.utcnow())])
+    db.session.commit()
+
+    calls = _fake_llm(monkeypatch)
+    payload = {"module_id": "COALESCE1", "message": "compare", "user_id": user.userID, "chat_id": chat.historyID}
+    responses = [test_client.post('/api/send-message', json={**payload, "model": model}) for model in ("a", "b", "a")]
+
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert calls == ["a", "b"]
+    assert responses[2].headers["X-Coalesced"] == "stored"
+
+def test_send_message_queues_turns_beyond_the_llm_slots(test_client, monkeypatch):
+    """
+    GIVEN a scheduler with the default number of LLM slots, and as many students as a worker has threads
+    WHEN they all post to the '/api/send-message' page (POST) at once while the LLM is slow
+    THEN check that the turns beyond the slots wait in the scheduler's queue and time out with a 429
+    """
+    import threading
+    import time
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chatbot_settings import ChatbotSettings
+    from app.routes import chatbot_bp
+    from app.services import llm_scheduler
+
+    scheduler = llm_scheduler.LLMScheduler(module_tokens_per_minute=0, queue_timeout=1)
+    assert scheduler.max_concurrent < llm_scheduler.WORKER_THREADS
+    monkeypatch.setattr(chatbot_bp, "scheduler", scheduler)
+    db.session.add(ChatbotSettings(moduleID="SCHED2", model="m", temperature=1.0, system_prompt="Be brief",
+                                   max_tokens=50))
+    user_ids = []
+    for i in range(llm_scheduler.WORKER_THREADS):
+        user = User(name=f"Queued {i}", email=f"queued{i}@test", password="x", role="Student")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(ModuleAssignment(userID=user.userID, moduleID="SCHED2", studentCredits=10.0))
+        user_ids.append(user.userID)
+    db.session.commit()
+
+    slow = threading.Event()
+    _fake_llm(monkeypatch, on_call=lambda: slow.wait(10))
+    responses = []
+
+    def send(user_id):
+        response = test_client.application.test_client().post('/api/send-message', json={
+            "module_id": "SCHED2", "message": "queue me", "user_id": user_id})
+        responses.append(response)
+
+    threads = [threading.Thread(target=send, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while scheduler.queued().get("SCHED2", 0) < len(user_ids) - scheduler.max_concurrent \
+            and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert scheduler.queued() == {"SCHED2": len(user_ids) - scheduler.max_concurrent}
+
+    deadline = time.monotonic() + 5
+    while not responses and time.monotonic() < deadline:
+        time.sleep(0.01)
+    slow.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert sorted(r.status_code for r in responses) == [200] * scheduler.max_concurrent + \
+        [429] * (len(user_ids) - scheduler.max_concurrent)
+    assert {r.json["reason"] for r in responses if r.status_code == 429} == {"queue_timeout"}
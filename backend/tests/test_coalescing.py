@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+from flask import Flask, jsonify, request
+from app.db import db
+from app.models.idempotent_request import IdempotentRequest
+from app.services import coalescing
+
+
+def _counting_app(started, proceed, tmp_path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'coalescing.db'}",
+                      SQLALCHEMY_ENGINE_OPTIONS={"execution_options": {"schema_translate_map": {"dbo": None}}})
+    db.init_app(app)
+    with app.app_context():
+        IdempotentRequest.__table__.create(db.engine)
+    calls = []
+
+    @app.route('/echo', methods=['POST'])
+    @coalescing.coalesced(lambda: coalescing.request_key(request.json["user"], request.json["message"]))
+    def echo():
+        calls.append(request.json["message"])
+        started.set()
+        proceed.wait(5)
+        if request.json["message"] == "fail":
+            return jsonify({"error": "boom"}), 500
+        return jsonify({"call": len(calls), "message": request.json["message"]})
+
+    return app, calls
+
+
+def test_duplicates_share_one_call_while_in_flight_and_after(tmp_path):
+    """
+    GIVEN a coalesced endpoint whose first request is still running
+    WHEN an identical request arrives during it and another after it finished
+    THEN check that the endpoint ran once and all three got the same response
+    """
+    started, proceed = threading.Event(), threading.Event()
+    app, calls = _counting_app(started, proceed, tmp_path)
+    client = app.test_client()
+    payload = {"user": 1, "message": "coalesce me"}
+    responses = []
+
+    first = threading.Thread(target=lambda: responses.append(app.test_client().post('/echo', json=payload)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: responses.append(app.test_client().post('/echo', json=payload)))
+    second.start()
+    proceed.set()
+    first.join(5)
+    second.join(5)
+    third = client.post('/echo', json=payload)
+
+    assert calls == ["coalesce me"]
+    assert [r.json for r in responses + [third]] == [{"call": 1, "message": "coalesce me"}] * 3
+    assert sorted(r.headers.get("X-Coalesced", "") for r in responses) == ["", "in-flight"]
+    assert third.headers["X-Coalesced"] == "stored"
+
+
+def test_idempotency_key_and_errors_are_not_shared_across_attempts(tmp_path):
+    """
+    GIVEN a coalesced endpoint
+    WHEN the same message is sent with different Idempotency-Keys, and a failing request is retried
+    THEN check that each key runs separately and the failure isn't replayed to the retry
+    """
+    started, proceed = threading.Event(), threading.Event()
+    proceed.set()
+    app, calls = _counting_app(started, proceed, tmp_path)
+    client = app.test_client()
+
+    client.post('/echo', json={"user": 2, "message": "again"}, headers={"Idempotency-Key": "a"})
+    replay = client.post('/echo', json={"user": 2, "message": "again"}, headers={"Idempotency-Key": "a"})
+    client.post('/echo', json={"user": 2, "message": "again"}, headers={"Idempotency-Key": "b"})
+    assert calls == ["again", "again"]
+    assert replay.headers["X-Coalesced"] == "stored"
+
+    assert client.post('/echo', json={"user": 2, "message": "fail"}).status_code == 500
+    assert client.post('/echo', json={"user": 2, "message": "fail"}).status_code == 500
+    assert calls.count("fail") == 2
+
+
+def test_duplicates_on_other_workers_share_the_stored_response(tmp_path, monkeypatch):
+    """
+    GIVEN a coalesced endpoint that already answered a request, and a request claimed by another worker
+    WHEN identical requests arrive at a worker that hasn't seen them
+    THEN check that the endpoint doesn't run again and the other worker's responses are returned
+    """
+    started, proceed = threading.Event(), threading.Event()
+    proceed.set()
+    app, calls = _counting_app(started, proceed, tmp_path)
+    client = app.test_client()
+    monkeypatch.setattr(coalescing, "COALESCE_POLL_SECONDS", 0.05)
+
+    client.post('/echo', json={"user": 4, "message": "once"}, headers={"Idempotency-Key": "k"})
+    monkeypatch.setattr(coalescing, "_calls", OrderedDict())  # As seen from another worker
+    replay = client.post('/echo', json={"user": 4, "message": "once"}, headers={"Idempotency-Key": "k"})
+    assert calls == ["once"]
+    assert (replay.json, replay.headers["X-Coalesced"]) == ({"call": 1, "message": "once"}, "stored")
+
+    # Another worker is running this request; it finishes while this one waits
+    with app.test_request_context('/echo', method='POST', headers={"Idempotency-Key": "w"}):
+        stored_key = coalescing._stored_key(("echo", *coalescing.request_key(4, "waiting")))
+    with app.app_context():
+        assert coalescing._claim(stored_key) is None
+
+    def finish():
+        with app.app_context():
+            coalescing._release(stored_key, (b'{"call": 99}', 200, {"Content-Type": "application/json"}), 60)
+
+    timer = threading.Timer(0.2, finish)
+    timer.start()
+    waited = client.post('/echo', json={"user": 4, "message": "waiting"}, headers={"Idempotency-Key": "w"})
+    timer.join()
+    assert calls == ["once"]
+    assert (waited.json, waited.headers["X-Coalesced"]) == ({"call": 99}, "in-flight")
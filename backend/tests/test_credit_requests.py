@@ -43,3 +43,243 @@ def test_delete_credit_request_not_found(test_client):
     response = test_client.delete('/api/credit-requests/999')
     assert response.status_code == 404
     assert response.json['error'] == 'Credit request not found'
+
+def test_get_credit_requests_filters_and_pages(test_client):
+    """
+    GIVEN credit requests with different statuses in two modules
+    WHEN the '/api/credit-requests' page is requested (GET) with filters and a limit
+    THEN check that only matching requests are returned, newest first, one page at a time
+    """
+    from datetime import datetime, timedelta
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.credit_requests import CreditRequest
+
+    start = datetime(2030, 1, 1)
+    for module_id in ("CRQ1", "CRQ2"):
+        db.session.add(Module(moduleID=module_id, moduleName=f"Module {module_id}", initialCredit=1))
+        user = User(name=f"Requester {module_id}", email=f"{module_id}@test", password="x", role="Student",
+                    studentID=2700000 + int(module_id[-1]))
+        db.session.add(user)
+        db.session.flush()
+        assignment = ModuleAssignment(userID=user.userID, moduleID=module_id, studentCredits=0)
+        db.session.add(assignment)
+        db.session.flush()
+        for i in range(5):
+            db.session.add(CreditRequest(assignmentID=assignment.assignmentID, creditsRequested=i + 1,
+                                         status="Pending" if i % 2 == 0 else "Approved",
+                                         requestDate=start + timedelta(days=i)))
+    db.session.commit()
+
+    page = test_client.get('/api/credit-requests?moduleID=CRQ1&status=Pending&limit=2').json
+    assert [r['creditsRequested'] for r in page] == [5, 3]
+    assert page[0]['studentName'] == "Requester CRQ1"
+    assert page[0]['moduleName'] == "Module CRQ1"
+
+    rest = test_client.get(f"/api/credit-requests?moduleID=CRQ1&status=Pending&limit=2&cursor={page[-1]['cursor']}").json
+    assert [r['creditsRequested'] for r in rest] == [1]
+
+    ranged = test_client.get('/api/credit-requests?moduleID=CRQ2&status=Pending,Approved'
+                             '&from=2030-01-02&to=2030-01-04').json
+    assert [r['creditsRequested'] for r in ranged] == [3, 2]
+
+    assert test_client.get('/api/credit-requests?status=Unknown').status_code == 400
+    assert test_client.get('/api/credit-requests?from=yesterday').status_code == 400
+
+def test_bulk_update_credit_request_status(test_client):
+    """
+    GIVEN pending and already approved credit requests for two students in a module
+    WHEN the '/api/credit-requests/status' page is patched (PATCH) to approve a list of them
+    THEN check that only pending ones are approved and each student's credits go up once
+    """
+    from datetime import datetime
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.credit_requests import CreditRequest
+
+    db.session.add(Module(moduleID="CRBULK", moduleName="Bulk", initialCredit=1))
+    assignments = []
+    for i in range(2):
+        user = User(name=f"Bulk {i}", email=f"bulk{i}@test", password="x", role="Student")
+        db.session.add(user)
+        db.session.flush()
+        assignment = ModuleAssignment(userID=user.userID, moduleID="CRBULK", studentCredits=1.0)
+        db.session.add(assignment)
+        db.session.flush()
+        assignments.append(assignment.assignmentID)
+    requests = [
+        CreditRequest(assignmentID=assignments[0], creditsRequested=2, status="Pending", requestDate=datetime.utcnow()),
+        CreditRequest(assignmentID=assignments[0], creditsRequested=3, status="Pending", requestDate=datetime.utcnow()),
+        CreditRequest(assignmentID=assignments[1], creditsRequested=5, status="Approved", requestDate=datetime.utcnow()),
+        CreditRequest(assignmentID=assignments[1], creditsRequested=7, status="Pending", requestDate=datetime.utcnow()),
+    ]
+    db.session.add_all(requests)
+    db.session.commit()
+    ids = [r.requestID for r in requests]
+
+    response = test_client.patch('/api/credit-requests/status',
+                                 json={"status": "Approved", "requestIDs": ids[:3]})
+    assert response.status_code == 200
+    assert response.json['updated'] == 2
+    assert response.json['skipped'] == [ids[2]]
+    assert response.json['creditsGranted'] == 5
+
+    # Approving the same requests again grants nothing
+    again = test_client.patch('/api/credit-requests/status', json={"status": "Approved", "requestIDs": ids[:2]})
+    assert again.json['updated'] == 0
+
+    rejected = test_client.patch('/api/credit-requests/status', json={"status": "Rejected", "moduleID": "CRBULK"})
+    assert rejected.json['requestIDs'] == [ids[3]]
+
+    db.session.expire_all()
+    assert db.session.get(ModuleAssignment, assignments[0]).studentCredits == 6.0
+    assert db.session.get(ModuleAssignment, assignments[1]).studentCredits == 1.0
+    assert db.session.get(CreditRequest, ids[3]).status == "Rejected"
+
+    assert test_client.patch('/api/credit-requests/status', json={"status": "Approved"}).status_code == 400
+
+def test_single_approval_grants_credits_once(test_client):
+    """
+    GIVEN a pending credit request
+    WHEN the '/api/credit-requests/<id>/status' page is patched (PATCH) to approve it twice
+    THEN check that the second approval is refused and the credits are granted and recorded only once
+    """
+    from datetime import datetime
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.credit_requests import CreditRequest
+    from app.models.module_student_usage import ModuleStudentUsage
+    from app.models.module_usage_daily import ModuleUsageDaily
+
+    db.session.add(Module(moduleID="CRSINGLE", moduleName="Single", initialCredit=1))
+    user = User(name="Single", email="single@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="CRSINGLE", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    credit_request = CreditRequest(assignmentID=assignment.assignmentID, creditsRequested=4,
+                                   status="Pending", requestDate=datetime.utcnow())
+    db.session.add(credit_request)
+    db.session.commit()
+    user_id, assignment_id, request_id = user.userID, assignment.assignmentID, credit_request.requestID
+
+    first = test_client.patch(f'/api/credit-requests/{request_id}/status', json={"status": "Approved"})
+    assert first.status_code == 200
+    assert first.json['status'] == "Approved"
+    second = test_client.patch(f'/api/credit-requests/{request_id}/status', json={"status": "Approved"})
+    assert second.status_code == 409
+
+    db.session.expire_all()
+    assert db.session.get(ModuleAssignment, assignment_id).studentCredits == 5.0
+    # The grant is counted once in the module and student usage totals
+    assert ModuleStudentUsage.query.filter_by(moduleID="CRSINGLE", userID=user_id).one().creditsGranted == 4
+    assert sum(d.creditsGranted for d in ModuleUsageDaily.query.filter_by(moduleID="CRSINGLE")) == 4
+    assert test_client.patch('/api/credit-requests/999999/status', json={"status": "Approved"}).status_code == 404
+
+def test_credit_approval_notifications(test_client):
+    """
+    GIVEN a student with a pending credit request
+    WHEN the request is approved, notifications are polled without a version and the notification is marked seen
+    THEN check that the poll returns the approval with the new balance, and not the approval once seen
+    """
+    from datetime import datetime
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.credit_requests import CreditRequest
+
+    db.session.add(Module(moduleID="NOTE1", moduleName="Notify", initialCredit=1))
+    user = User(name="Notified", email="notified@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="NOTE1", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    credit_request = CreditRequest(assignmentID=assignment.assignmentID, creditsRequested=4,
+                                   status="Pending", requestDate=datetime.utcnow())
+    db.session.add(credit_request)
+    db.session.commit()
+    user_id, request_id = user.userID, credit_request.requestID
+
+    assert test_client.get(f'/api/credit-requests/notifications/{user_id}/poll').json['approvals'] == []
+    test_client.patch(f'/api/credit-requests/{request_id}/status', json={"status": "Approved"})
+
+    polled = test_client.get(f'/api/credit-requests/notifications/{user_id}/poll').json
+    assert [a['requestID'] for a in polled['approvals']] == [request_id]
+    assert "has been approved" in polled['approvals'][0]['message']
+    assert polled['balances'] == [{"assignmentID": assignment.assignmentID, "moduleID": "NOTE1",
+                                   "studentCredits": 5.0}]
+    assert polled['pollSeconds'] == 0 and polled['version']
+
+    assert test_client.get(f'/api/credit-requests/notifications/{user_id}').json[0]['requestID'] == request_id
+    seen = test_client.post(f'/api/credit-requests/notifications/{user_id}/seen', json={"requestIDs": [request_id]})
+    assert seen.json['updated'] == 1
+    assert test_client.get(f'/api/credit-requests/user/{user_id}/approved').json == []
+    assert test_client.get(f'/api/credit-requests/notifications/{user_id}/poll').json['approvals'] == []
+
+
+def test_notification_poll_is_held_until_something_changes(test_client, monkeypatch):
+    """
+    GIVEN a student whose notification state the frontend already has
+    WHEN it polls with that version and a credit request is approved meanwhile, when nothing changes,
+        and when the worker already holds as many polls as it may
+    THEN check that the poll returns as soon as the approval is made, after the wait, and at once respectively
+    """
+    import threading
+    import time
+    from datetime import datetime
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.credit_requests import CreditRequest
+    from app.services import notifications
+
+    db.session.add(Module(moduleID="NOTE2", moduleName="Long poll", initialCredit=1))
+    user = User(name="Long Poller", email="long-poller@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="NOTE2", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    credit_request = CreditRequest(assignmentID=assignment.assignmentID, creditsRequested=2,
+                                   status="Pending", requestDate=datetime.utcnow())
+    db.session.add(credit_request)
+    db.session.commit()
+    user_id, request_id = user.userID, credit_request.requestID
+    url = f'/api/credit-requests/notifications/{user_id}/poll'
+    version = test_client.get(url).json['version']
+
+    # Only the approval's wake-up can end the wait early
+    monkeypatch.setattr(notifications, "NOTIFICATION_WAIT_SECONDS", 10)
+    monkeypatch.setattr(notifications, "NOTIFICATION_CHECK_SECONDS", 10)
+    monkeypatch.setattr(notifications, "NOTIFICATION_MAX_WAITING", 1)
+    approve = threading.Timer(0.3, lambda: test_client.application.test_client().patch(
+        f'/api/credit-requests/{request_id}/status', json={"status": "Approved"}))
+    started = time.monotonic()
+    approve.start()
+    pushed = test_client.get(f'{url}?since={version}').json
+    approve.join()
+    assert time.monotonic() - started < 5
+    assert [a['requestID'] for a in pushed['approvals']] == [request_id]
+    assert pushed['balances'][0]['studentCredits'] == 3.0
+    assert pushed['version'] != version and pushed['pollSeconds'] == 0
+
+    monkeypatch.setattr(notifications, "NOTIFICATION_WAIT_SECONDS", 0.2)
+    unchanged = test_client.get(f"{url}?since={pushed['version']}").json
+    assert (unchanged['version'], unchanged['pollSeconds']) == (pushed['version'], 0)
+
+    monkeypatch.setattr(notifications, "NOTIFICATION_MAX_WAITING", 0)
+    monkeypatch.setattr(notifications, "NOTIFICATION_WAIT_SECONDS", 10)
+    started = time.monotonic()
+    refused = test_client.get(f"{url}?since={pushed['version']}").json
+    assert time.monotonic() - started < 5
+    assert refused['pollSeconds'] == notifications.NOTIFICATION_POLL_SECONDS
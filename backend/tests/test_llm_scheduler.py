@@ -0,0 +1,78 @@
+import threading
+import time
+import pytest
+from app.services.llm_scheduler import LLMScheduler, Saturated
+
+
+def _wait_for_queue(scheduler, expected):
+    deadline = time.monotonic() + 2
+    while sum(scheduler.queued().values()) < expected and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_free_slots_are_shared_fairly_between_modules():
+    """
+    GIVEN a scheduler with one slot, held by a turn, and three turns of module A queued before one of module B
+    WHEN the slot is released after each turn
+    THEN check that module B is served second rather than after all of module A
+    """
+    scheduler = LLMScheduler(max_concurrent=1, module_tokens_per_minute=0, queue_timeout=5)
+    first = scheduler.acquire("u0", "A")
+    served = []
+
+    def turn(user_id, module_id):
+        ticket = scheduler.acquire(user_id, module_id)
+        served.append(module_id)
+        scheduler.release(ticket)
+
+    threads = []
+    for n, module_id in enumerate(["A", "A", "A", "B"]):
+        threads.append(threading.Thread(target=turn, args=(f"u{n + 1}", module_id)))
+        threads[-1].start()
+        _wait_for_queue(scheduler, n + 1)
+    scheduler.release(first)
+    for thread in threads:
+        thread.join(5)
+
+    assert served == ["A", "B", "A", "A"]
+
+
+def test_user_in_flight_limit_and_queue_timeout():
+    """
+    GIVEN a scheduler with one slot and one turn per student
+    WHEN a student starts a second turn, and another student waits longer than the queue timeout
+    THEN check that both are turned away with a retry hint and the limits are freed afterwards
+    """
+    scheduler = LLMScheduler(max_concurrent=1, user_max_in_flight=1, module_tokens_per_minute=0,
+                             queue_timeout=0.05)
+    ticket = scheduler.acquire("u1", "A")
+
+    with pytest.raises(Saturated) as e:
+        scheduler.acquire("u1", "A")
+    assert e.value.reason == "user_in_flight" and e.value.retry_after >= 1
+
+    with pytest.raises(Saturated) as e:
+        scheduler.acquire("u2", "A")
+    assert e.value.reason == "queue_timeout"
+    assert scheduler.queued() == {}
+
+    scheduler.release(ticket)
+    scheduler.release(scheduler.acquire("u2", "A"))
+
+
+def test_module_token_budget_is_corrected_by_real_usage():
+    """
+    GIVEN a module budget of 600 tokens per minute
+    WHEN a turn reserves 500 tokens but uses 100, and later turns reserve more than is left
+    THEN check that unused tokens are returned and an over-budget turn gets a retry hint for the refill
+    """
+    scheduler = LLMScheduler(module_tokens_per_minute=600, user_max_in_flight=10)
+    scheduler.release(scheduler.acquire("u1", "A", 500), used_tokens=100)
+
+    ticket = scheduler.acquire("u1", "A", 450)   # 500 left
+    with pytest.raises(Saturated) as e:
+        scheduler.acquire("u2", "A", 100)        # 50 left, 10 tokens/s
+    assert e.value.reason == "module_tokens"
+    assert 4 <= e.value.retry_after <= 6
+    scheduler.acquire("u2", "B", 100)            # Other modules have their own budget
+    scheduler.release(ticket, used_tokens=450)
@@ -0,0 +1,54 @@
+from app.services import metrics
+
+
+def test_metrics_endpoint_reports_request_counts_and_latency(test_client):
+    """
+    GIVEN a Flask application configured for testing
+    WHEN a route is requested and then '/metrics' is scraped (GET)
+    THEN check that the request is counted under its route template and worker pid with a latency histogram
+    """
+    import os
+
+    test_client.get('/api/get-model-settings/METRICS1')
+    response = test_client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    pid = f'pid="{os.getpid()}"'
+    assert (f'http_requests_total{{route="/api/get-model-settings/<module_id>",method="GET",status="404",{pid}}}'
+            in body)
+    assert (f'http_request_duration_seconds_count{{route="/api/get-model-settings/<module_id>",method="GET",{pid}}}'
+            in body)
+    assert f'http_requests_in_flight{{{pid}}}' in body
+    assert 'db_pool_connections{state=' in body
+
+
+def test_embedding_cache_counts_hits_and_misses():
+    """
+    GIVEN a cached embedding model
+    WHEN the same query is embedded twice and a batch of documents once
+    THEN check that the model is only called once for the query and cache hits and misses are counted
+    """
+    from app.services.vector_store import CachedEmbeddings
+
+    calls = []
+
+    class FakeModel:
+        def embed_query(self, text):
+            calls.append(text)
+            return [float(len(text))]
+
+        def embed_documents(self, texts):
+            calls.extend(texts)
+            return [[float(len(t))] for t in texts]
+
+    hits, misses = metrics.embedding_cache.value(result="hit"), metrics.embedding_cache.value(result="miss")
+    embeddings = CachedEmbeddings(FakeModel(), size=2)
+
+    assert embeddings.embed_query("what is a stack?") == [16.0]
+    assert embeddings.embed_query("what is a stack?") == [16.0]
+    assert embeddings.embed_documents(["a", "bb"]) == [[1.0], [2.0]]
+    assert calls == ["what is a stack?", "a", "bb"]
+    assert metrics.embedding_cache.value(result="hit") == hits + 1
+    assert metrics.embedding_cache.value(result="miss") == misses + 1
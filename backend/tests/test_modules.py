@@ -1,5 +1,6 @@
 
 import json
+import pytest
 
 def test_get_assigned_modules_no_user_id(test_client):
     """
@@ -39,3 +40,340 @@ def test_edit_module_missing_data(test_client):
     response = test_client.put('/api/edit-module', data=json.dumps({}), content_type='application/json')
     assert response.status_code == 400
     assert response.json['error'] == 'Missing required fields'
+
+def test_add_module_with_csv(test_client):
+    """
+    GIVEN an existing student account
+    WHEN the '/api/add-module' page is posted to (POST) with a CSV containing that student and an unknown one
+    THEN check that the module is created and the unknown student is reported
+    """
+    import io
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+
+    db.session.add(User(name="CSV Student", email="csv@test", password="x", role="Student", studentID=2600001))
+    db.session.commit()
+
+    response = test_client.post('/api/add-module', data={
+        'userID': '1',
+        'moduleID': 'CSV1',
+        'moduleName': 'CSV Module',
+        'moduleDescription': '',
+        'initialCredit': '10',
+        'csvFile': (io.BytesIO(b"studentID\n2600001\n2600002\n"), 'students.csv'),
+    })
+    assert response.status_code == 201
+    assert response.json['warnings'].endswith("2600002")
+    assert ModuleAssignment.query.filter_by(moduleID='CSV1').count() == 2  # owner + student
+
+def test_add_module_with_bad_csv_creates_nothing(test_client, monkeypatch):
+    """
+    GIVEN a CSV whose reading fails after the first batch of students was enrolled
+    WHEN the '/api/add-module' page is posted to (POST) with it, and then again with a good CSV
+    THEN check that the failed upload leaves no module behind and the retry creates it
+    """
+    import io
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.routes import modules_bp
+    from app.services import enrolment
+
+    db.session.add(User(name="Retry Student", email="csv-retry@test", password="x", role="Student", studentID=2600101))
+    db.session.commit()
+
+    def bad_file(text_stream):
+        yield "2600101"
+        raise ValueError("Row 2 is not valid CSV")
+
+    monkeypatch.setattr(modules_bp, "stream_enrol", lambda *args, **kwargs: enrolment.stream_enrol(
+        *args, batch_size=1, **kwargs))
+    monkeypatch.setattr(modules_bp, "iter_student_ids", bad_file)
+    form = lambda: {'userID': '1', 'moduleID': 'CSV2', 'moduleName': 'Retried', 'moduleDescription': '',
+                    'initialCredit': '10', 'csvFile': (io.BytesIO(b"studentID\n2600101\n"), 'students.csv')}
+
+    response = test_client.post('/api/add-module', data=form())
+    assert response.status_code == 400
+    assert db.session.get(Module, 'CSV2') is None
+    assert ModuleAssignment.query.filter_by(moduleID='CSV2').count() == 0
+
+    monkeypatch.setattr(modules_bp, "iter_student_ids", enrolment.iter_student_ids)
+    assert test_client.post('/api/add-module', data=form()).status_code == 201
+    assert ModuleAssignment.query.filter_by(moduleID='CSV2').count() == 2  # owner + student
+
+def test_delete_module_runs_batched_background_job(test_client, monkeypatch):
+    """
+    GIVEN a module with students, chats, messages and credit requests
+    WHEN the '/api/delete-module' page is requested (DELETE)
+    THEN check that a job is started which deletes every related row in batches
+    """
+    from datetime import datetime
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+    from app.models.credit_requests import CreditRequest
+    from app.models.chatbot_settings import ChatbotSettings
+    from app.services import modules
+
+    def qdrant_unavailable():
+        raise ConnectionError("Qdrant unavailable")
+
+    monkeypatch.setattr(modules, "DELETE_BATCH_SIZE", 2)
+    monkeypatch.setattr(modules, "get_qdrant_client", qdrant_unavailable)
+
+    db.session.add(Module(moduleID="DEL1", moduleName="Delete me", initialCredit=1))
+    db.session.add(ChatbotSettings(moduleID="DEL1", model="m", temperature=1.0, system_prompt="", max_tokens=1))
+    for i in range(3):
+        user = User(name=f"Del {i}", email=f"del{i}@test", password="x", role="Student")
+        db.session.add(user)
+        db.session.flush()
+        assignment = ModuleAssignment(userID=user.userID, moduleID="DEL1", studentCredits=1.0)
+        db.session.add(assignment)
+        db.session.flush()
+        chat = ChatHistory(assignmentID=assignment.assignmentID, chatlog="c", dateStarted=datetime.utcnow())
+        db.session.add(chat)
+        db.session.flush()
+        db.session.add_all([ChatMessage(chatID=chat.historyID, sender="user", content="hi") for _ in range(3)])
+        db.session.add(CreditRequest(assignmentID=assignment.assignmentID, creditsRequested=1,
+                                     status="Pending", requestDate=datetime.utcnow()))
+    db.session.commit()
+
+    response = test_client.delete('/api/delete-module', json={"moduleID": "DEL1"})
+    assert response.status_code == 202
+
+    job = test_client.get(f"/api/jobs/{response.json['jobID']}").json
+    assert job['status'] == 'succeeded'
+    assert job['progress']['ChatMessage'] == 9
+    assert job['progress']['ModuleAssignment'] == 3
+    assert 'qdrantError' in job['progress']
+
+    assert db.session.get(Module, "DEL1") is None
+    assert ModuleAssignment.query.filter_by(moduleID="DEL1").count() == 0
+    assert ChatbotSettings.query.filter_by(moduleID="DEL1").count() == 0
+
+def test_delete_module_restarts_job_whose_worker_died(test_client, monkeypatch):
+    """
+    GIVEN a module whose deletion job is still marked running, first recently updated and then not for a long time
+    WHEN the '/api/delete-module' page is requested (DELETE)
+    THEN check that a live job is joined, and a stale one is marked failed and started again
+    """
+    from datetime import datetime, timedelta
+    from app.db import db
+    from app.models.module import Module
+    from app.models.background_job import BackgroundJob
+    from app.services import modules
+
+    def qdrant_unavailable():
+        raise ConnectionError("Qdrant unavailable")
+
+    monkeypatch.setattr(modules, "get_qdrant_client", qdrant_unavailable)
+    db.session.add(Module(moduleID="DEL2", moduleName="Orphaned deletion", initialCredit=1))
+    db.session.add(BackgroundJob(jobID="dead-worker-job", kind="delete-module", target="DEL2", status="running",
+                                 progress="{}", updatedAt=datetime.utcnow()))
+    db.session.commit()
+
+    response = test_client.delete('/api/delete-module', json={"moduleID": "DEL2"})
+    assert response.json['jobID'] == "dead-worker-job"
+
+    BackgroundJob.query.filter_by(jobID="dead-worker-job").update({"updatedAt": datetime.utcnow() - timedelta(hours=1)})
+    db.session.commit()
+    assert test_client.get("/api/jobs/dead-worker-job").json['status'] == 'failed'
+
+    response = test_client.delete('/api/delete-module', json={"moduleID": "DEL2"})
+    assert response.status_code == 202
+    assert response.json['jobID'] != "dead-worker-job"
+    assert test_client.get(f"/api/jobs/{response.json['jobID']}").json['status'] == 'succeeded'
+    assert db.session.get(Module, "DEL2") is None
+
+def test_edit_module_rename_moves_rows_documents_and_archives(test_client, monkeypatch, tmp_path):
+    """
+    GIVEN a module with a student, chatbot settings, an archived chat and documents in Qdrant
+    WHEN the '/api/edit-module' page is requested (PUT) with a new module ID
+    THEN check that every row, the documents and the archive directory move to the new ID
+    """
+    from datetime import datetime
+    from qdrant_client import QdrantClient, models
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chat_history import ChatHistory
+    from app.models.archived_chat import ArchivedChat
+    from app.models.chatbot_settings import ChatbotSettings
+    from app.services import chat_archive, modules, vector_store
+
+    client = QdrantClient(location=":memory:")
+    client.create_collection("module_REN1", vectors_config=models.VectorParams(size=2, distance=models.Distance.COSINE))
+    client.upsert("module_REN1", points=[models.PointStruct(id=1, vector=[1.0, 0.0], payload={"filename": "notes.pdf"})])
+    monkeypatch.setattr(modules, "get_qdrant_client", lambda: client)
+    monkeypatch.setattr(chat_archive, "ARCHIVE_DIR", tmp_path)
+
+    db.session.add(Module(moduleID="REN1", moduleName="Rename me", initialCredit=5))
+    db.session.add(ChatbotSettings(moduleID="REN1", model="m", temperature=1.0, system_prompt="", max_tokens=1))
+    user = User(name="Rename Student", email="ren@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="REN1", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    chat = ChatHistory(assignmentID=assignment.assignmentID, chatlog="c", dateStarted=datetime.utcnow())
+    db.session.add(chat)
+    db.session.flush()
+    db.session.add(ArchivedChat(historyID=chat.historyID, moduleID="REN1", archivePath="a.jsonl.gz",
+                                offset=0, length=0, messageCount=0))
+    db.session.commit()
+    (tmp_path / "REN1").mkdir()
+    (tmp_path / "REN1" / "a.jsonl.gz").write_bytes(b"")
+
+    response = test_client.put('/api/edit-module', json={
+        "oldModuleID": "REN1", "moduleID": "REN2", "moduleName": "Renamed", "moduleDesc": ""
+    })
+    assert response.status_code == 200
+
+    assert db.session.get(Module, "REN1") is None
+    assert db.session.get(Module, "REN2").initialCredit == 5
+    assert ModuleAssignment.query.filter_by(moduleID="REN2").count() == 1
+    assert ChatbotSettings.query.filter_by(moduleID="REN2").count() == 1
+    entry = db.session.get(ArchivedChat, chat.historyID)
+    assert entry.moduleID == "REN2"
+    assert chat_archive.archive_file_path(entry).exists()
+
+    # Documents are reachable under the new name without being copied
+    assert vector_store.resolve_collection(client, "REN2") == "module_REN1"
+    assert client.scroll("module_REN2")[0][0].payload["filename"] == "notes.pdf"
+    assert not vector_store.collection_exists(client, "REN1")
+
+    # The old ID can't reuse a collection name that is still a real collection...
+    vectors = models.VectorParams(size=2, distance=models.Distance.COSINE)
+    with pytest.raises(RuntimeError):
+        vector_store.create_module_collection(client, "REN1", vectors)
+
+    # ...but collections created by the app are aliased, so renaming frees their name
+    vector_store.create_module_collection(client, "REN3", vectors)
+    vector_store.rename_module_collection(client, "REN3", "REN4")
+    assert vector_store.collection_exists(client, "REN4")
+    assert not vector_store.collection_exists(client, "REN3")
+    vector_store.create_module_collection(client, "REN3", vectors)
+    assert vector_store.resolve_collection(client, "REN3") != vector_store.resolve_collection(client, "REN4")
+
+    # Deleting the renamed module removes the aliased collection
+    assert vector_store.delete_module_collection(client, "REN2")
+    assert not vector_store.collection_exists(client, "REN2")
+    assert not client.collection_exists("module_REN1")
+
+def _seed_export_module(module_id, chats, messages_per_chat):
+    from datetime import datetime, timedelta
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+
+    db.session.add(Module(moduleID=module_id, moduleName="Export", initialCredit=5))
+    user = User(name="Export, Student", email=f"export@{module_id}.test", password="x", role="Student",
+                studentID=2900001)
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID=module_id, studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    started = datetime(2024, 1, 1)
+    for c in range(chats):
+        chat = ChatHistory(assignmentID=assignment.assignmentID, chatlog=f"Chat {c}", dateStarted=started)
+        db.session.add(chat)
+        db.session.flush()
+        db.session.add_all(ChatMessage(
+            chatID=chat.historyID, sender="user" if i % 2 == 0 else "ai",
+            content=f'chat {c} message {i}, with "quotes"\nand a newline',
+            timestamp=started + timedelta(seconds=i), cost=0.01 if i % 2 else None
+        ) for i in range(messages_per_chat))
+    db.session.commit()
+
+def test_export_module_chats_streams_csv_and_jsonl(test_client, monkeypatch, tmp_path):
+    """
+    GIVEN a module with live and archived chats
+    WHEN the '/api/export-module-chats/<module_id>' page is requested (GET) in each format
+    THEN check that every message is streamed in chunks, with archived chats unless they are left out
+    """
+    import csv
+    import gzip
+    import io
+    from app.services import chat_archive, chat_export
+
+    monkeypatch.setattr(chat_archive, "ARCHIVE_DIR", tmp_path)
+    monkeypatch.setattr(chat_export, "EXPORT_BATCH_SIZE", 7)
+    monkeypatch.setattr(chat_export, "EXPORT_CHUNK_SIZE", 1024)
+    _seed_export_module("EXPORT1", 4, 30)
+    chat_archive.archive_old_chats(older_than_days=30, module_id="EXPORT1", batch_size=2)
+    _seed_export_module("EXPORT1-LIVE", 2, 10)  # Other modules' chats are never exported
+
+    response = test_client.get('/api/export-module-chats/EXPORT1')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="EXPORT1-chats.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 120
+    assert rows[0]['content'] == 'chat 0 message 0, with "quotes"\nand a newline'
+    assert rows[0]['studentName'] == "Export, Student"
+    assert {r['archived'] for r in rows} == {"True"}
+    assert [r['cost'] for r in rows[:2]] == ["", "0.01"]
+
+    response = test_client.get('/api/export-module-chats/EXPORT1?includeArchived=false')
+    assert response.get_data(as_text=True).count("\n") == 1  # header only
+
+    response = test_client.get('/api/export-module-chats/EXPORT1-LIVE?format=jsonl&gzip=true')
+    assert response.mimetype == 'application/gzip'
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    messages = [json.loads(line) for line in lines]
+    assert len(messages) == 20
+    assert [m['content'] for m in messages[:2]] == [f'chat 0 message {i}, with "quotes"\nand a newline' for i in (0, 1)]
+    assert messages[1]['cost'] == 0.01 and messages[1]['archived'] is False
+
+    assert test_client.get('/api/export-module-chats/EXPORT1?format=xml').status_code == 400
+    assert test_client.get('/api/export-module-chats/NO-SUCH-MODULE').status_code == 404
+
+def test_export_module_chats_escapes_formulas_and_marks_failures(test_client, monkeypatch):
+    """
+    GIVEN a module with a message that a spreadsheet would run as a formula
+    WHEN its chats are exported as CSV, and then reading the messages fails partway through
+    THEN check that the formula is exported as text and a failed export ends with an error row
+    """
+    import csv
+    import io
+    from app.db import db
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+    from app.services import chat_export
+
+    _seed_export_module("EXPORT2", 1, 3)
+    messages = ChatMessage.query.join(ChatHistory, ChatHistory.historyID == ChatMessage.chatID)\
+        .join(ModuleAssignment, ModuleAssignment.assignmentID == ChatHistory.assignmentID)\
+        .filter(ModuleAssignment.moduleID == "EXPORT2").order_by(ChatMessage.messageID).all()
+    for message, content in zip(messages, ('=HYPERLINK("http://evil")', "-1+1", "@SUM(A1)")):
+        message.content = content
+    db.session.commit()
+
+    rows = list(csv.reader(io.StringIO(test_client.get('/api/export-module-chats/EXPORT2').get_data(as_text=True))))
+    content = rows[0].index("content")
+    assert [r[content] for r in rows[1:]] == ["'=HYPERLINK(\"http://evil\")", "'-1+1", "'@SUM(A1)"]
+
+    def failing_messages(module_id):
+        yield from list(original(module_id))[:2]
+        raise ConnectionError("database went away")
+
+    original = chat_export._live_messages
+    monkeypatch.setattr(chat_export, "_live_messages", failing_messages)
+    rows = list(csv.reader(io.StringIO(test_client.get('/api/export-module-chats/EXPORT2').get_data(as_text=True))))
+    assert len(rows) == 4
+    assert rows[-1] == [chat_export.EXPORT_ERROR_MESSAGE]
+
+    lines = test_client.get('/api/export-module-chats/EXPORT2?format=jsonl').get_data(as_text=True).splitlines()
+    assert json.loads(lines[-1]) == {"error": chat_export.EXPORT_ERROR_MESSAGE}
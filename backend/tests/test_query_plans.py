@@ -0,0 +1,109 @@
+
+import pytest
+from sqlalchemy import text
+from app.db import db
+from app.models.chat_history import ChatHistory
+from app.models.chat_message import ChatMessage
+from app.models.chatbot_settings import ChatbotSettings
+from app.models.credit_requests import CreditRequest
+from app.models.module_assignment import ModuleAssignment
+from app.models.module_usage_daily import ModuleUsageDaily
+from app.models.users import User
+
+
+def _query_plan(query):
+    translate = db.engine.get_execution_options().get("schema_translate_map")
+    statement = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True},
+                                        schema_translate_map=translate, render_schema_translate=True)
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    return [row[-1] for row in rows]
+
+
+HOT_PATH_QUERIES = {
+    # /send-message, /get-chat-history/<user>/<module>
+    "assignment by user and module": lambda: ModuleAssignment.query.filter_by(userID=1, moduleID="M1"),
+    # /students-in-module, /delete-module
+    "assignments by module": lambda: ModuleAssignment.query.filter_by(moduleID="M1"),
+    # /get-chat-message, /get-chat-history/<chat>, /send-message
+    "messages by chat": lambda: ChatMessage.query.filter_by(chatID=1).order_by(ChatMessage.timestamp.asc()),
+    # /get-chat-history/<user>/<module>
+    "chats by assignment": lambda: ChatHistory.query.filter_by(assignmentID=1).order_by(ChatHistory.dateStarted.desc()),
+    # POST /credit-requests
+    "pending request by assignment": lambda: CreditRequest.query.filter_by(assignmentID=1, status="Pending"),
+    # GET /credit-requests?status=Pending
+    "requests by status, newest first": lambda: CreditRequest.query.filter_by(status="Pending")
+        .order_by(CreditRequest.requestDate.desc(), CreditRequest.requestID.desc()),
+    # CSV enrolment
+    "user by student ID": lambda: User.query.filter_by(studentID=2400001),
+    # /login
+    "user by email": lambda: User.query.filter_by(email="a@b.c"),
+    # /send-message, /get-model-settings
+    "settings by module": lambda: ChatbotSettings.query.filter_by(moduleID="M1"),
+    # /module-analytics, /send-message
+    "module usage by day": lambda: ModuleUsageDaily.query.filter(
+        ModuleUsageDaily.moduleID == "M1", ModuleUsageDaily.usageDate >= "2025-01-01"),
+}
+
+
+@pytest.mark.parametrize("name", HOT_PATH_QUERIES)
+def test_hot_path_queries_use_indexes(test_client, name):
+    """
+    GIVEN the schema created from the models
+    WHEN the query plan of a hot-path lookup is inspected
+    THEN check that it searches an index instead of scanning the table
+    """
+    from sqlalchemy.engine.url import make_url
+    if make_url(str(db.engine.url)).get_backend_name() != "sqlite":
+        pytest.skip("Query plans are only checked on SQLite")
+
+    plan = _query_plan(HOT_PATH_QUERIES[name]())
+    assert any("USING INDEX" in step or "USING COVERING INDEX" in step for step in plan), plan
+    assert not any(step.startswith("SCAN") for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_migrations_are_idempotent(test_client):
+    """
+    GIVEN a database whose tables already exist
+    WHEN migrations are run twice
+    THEN check that every migration is recorded once and the second run applies nothing
+    """
+    from app.migrations import run_migrations, current_version, MIGRATIONS
+
+    run_migrations()
+    assert run_migrations() == []
+    assert current_version() == MIGRATIONS[-1][0]
+
+
+def test_notification_migration_marks_past_approvals_seen(test_client):
+    """
+    GIVEN credit requests approved before approvals were tracked, and a pending one
+    WHEN the notification migration runs
+    THEN check that past approvals are marked seen and dated by their request, and the pending one is left alone
+    """
+    from datetime import datetime
+    from app.db import db
+    from app.migrations import _add_credit_request_notifications
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.credit_requests import CreditRequest
+
+    user = User(name="Migrated", email="migrated@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="MIGRATE6", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    approved = CreditRequest(assignmentID=assignment.assignmentID, creditsRequested=2, status="Approved",
+                             requestDate=datetime(2024, 3, 1))
+    pending = CreditRequest(assignmentID=assignment.assignmentID, creditsRequested=3, status="Pending",
+                            requestDate=datetime(2024, 3, 2))
+    db.session.add_all([approved, pending])
+    db.session.commit()
+
+    _add_credit_request_notifications()
+    db.session.commit()
+    db.session.expire_all()
+
+    assert (approved.seen, approved.approvedAt) == (True, datetime(2024, 3, 1))
+    assert (pending.seen, pending.approvedAt) == (False, None)
@@ -0,0 +1,52 @@
+
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_huggingface", "torch", "transformers",
+                 "qdrant_client", "pdfplumber", "openpyxl", "pptx", "docx"]
+# Generous enough for a slow CI runner; eager ML imports alone take several seconds
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "2.0"))
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _probe(env_overrides):
+    env = dict(os.environ, SQLALCHEMY_DATABASE_URI="sqlite:///:memory:", **env_overrides)
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_startup_does_not_import_ml_stack():
+    """
+    GIVEN a fresh interpreter
+    WHEN the app is imported and created
+    THEN check that no heavy ML/document library is loaded and startup stays within budget
+    """
+    result = _probe({})
+    assert result["loaded"] == []
+    assert result["elapsed"] < IMPORT_TIME_BUDGET
+
+
+def test_api_only_worker_rejects_ml_endpoints(test_client):
+    """
+    GIVEN an API-only worker
+    WHEN the '/api/send-message' page is posted to (POST)
+    THEN check that the response is a 503 error
+    """
+    test_client.application.config["API_ONLY"] = True
+    try:
+        response = test_client.post('/api/send-message', json={})
+    finally:
+        test_client.application.config["API_ONLY"] = False
+    assert response.status_code == 503
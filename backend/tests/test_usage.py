@@ -0,0 +1,173 @@
+from datetime import datetime
+
+
+def test_record_turn_rolls_up_per_student_per_day(test_client):
+    """
+    GIVEN a student chatting in a module over two days
+    WHEN each turn's usage is recorded
+    THEN check that there is one rollup row per day holding that day's totals
+    """
+    from app.db import db
+    from app.models.users import User
+    from app.models.chat_usage_daily import ChatUsageDaily
+    from app.services.usage import record_turn
+
+    user = User(name="Usage Student", email="usage@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.commit()
+
+    record_turn("USAGE1", user.userID, 100, 20, 0.5, at=datetime(2025, 3, 1, 9))
+    record_turn("USAGE1", user.userID, 50, 10, 0.25, at=datetime(2025, 3, 1, 17))
+    record_turn("USAGE1", user.userID, None, None, None, at=datetime(2025, 3, 2, 8))
+    db.session.commit()
+
+    rows = ChatUsageDaily.query.filter_by(moduleID="USAGE1", userID=user.userID) \
+        .order_by(ChatUsageDaily.usageDate).all()
+    assert [(r.usageDate.day, r.messages, r.promptTokens, r.completionTokens, r.cost) for r in rows] == [
+        (1, 2, 150, 30, 0.75),
+        (2, 1, 0, 0, 0.0),
+    ]
+
+
+def test_message_usage_survives_archiving(test_client, tmp_path, monkeypatch):
+    """
+    GIVEN an old chat whose answer has its token usage and cost recorded
+    WHEN the chat is archived and then restored
+    THEN check that the usage fields are restored with the message
+    """
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.models.chat_history import ChatHistory
+    from app.models.chat_message import ChatMessage
+    from app.services import chat_archive
+
+    monkeypatch.setattr(chat_archive, "ARCHIVE_DIR", tmp_path)
+    user = User(name="Archived Usage", email="archived-usage@test", password="x", role="Student")
+    db.session.add(user)
+    db.session.flush()
+    assignment = ModuleAssignment(userID=user.userID, moduleID="USAGE2", studentCredits=1.0)
+    db.session.add(assignment)
+    db.session.flush()
+    chat = ChatHistory(assignmentID=assignment.assignmentID, chatlog="Old", dateStarted=datetime(2024, 1, 1))
+    db.session.add(chat)
+    db.session.flush()
+    db.session.add_all([
+        ChatMessage(chatID=chat.historyID, sender="user", content="q", timestamp=datetime(2024, 1, 1)),
+        ChatMessage(chatID=chat.historyID, sender="ai", content="a", timestamp=datetime(2024, 1, 1),
+                    model="m", promptTokens=12, completionTokens=3, cost=0.01, latencyMs=250, retrievalHits=2),
+    ])
+    db.session.commit()
+
+    assert chat_archive.archive_old_chats(older_than_days=30, module_id="USAGE2")["USAGE2"] == 1
+    assert chat_archive.restore_chat(chat.historyID)
+    db.session.commit()
+
+    user_msg, ai_msg = ChatMessage.query.filter_by(chatID=chat.historyID).order_by(ChatMessage.messageID).all()
+    assert user_msg.promptTokens is None and user_msg.cost is None
+    assert (ai_msg.model, ai_msg.promptTokens, ai_msg.completionTokens, ai_msg.cost,
+            ai_msg.latencyMs, ai_msg.retrievalHits) == ("m", 12, 3, 0.01, 250, 2)
+
+
+def _seed_module(module_id, credits):
+    from app.db import db
+    from app.models.module import Module
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+
+    db.session.add(Module(moduleID=module_id, moduleName="Analytics", initialCredit=5))
+    assignments = []
+    for i, balance in enumerate(credits):
+        user = User(name=f"Analytics {i}", email=f"analytics{i}@{module_id}.test", password="x", role="Student")
+        db.session.add(user)
+        db.session.flush()
+        assignment = ModuleAssignment(userID=user.userID, moduleID=module_id, studentCredits=balance)
+        db.session.add(assignment)
+        assignments.append(assignment)
+    db.session.commit()
+    return assignments
+
+
+def test_module_analytics_from_summaries(test_client):
+    """
+    GIVEN a module whose students chatted over two days and were granted credits
+    WHEN the '/api/module-analytics/<module_id>' page is requested (GET)
+    THEN check that spend, daily activity, low balances and top documents come from a few queries
+    """
+    from datetime import date
+    from sqlalchemy import event
+    from app.db import db
+    from app.models.credit_requests import CreditRequest
+    from app.services.usage import module_analytics, record_turn
+
+    a, b, c = _seed_module("ANALYTICS1", [4.0, 0.5, 0.0])
+    record_turn("ANALYTICS1", a.userID, 100, 10, 0.2, documents=["notes.pdf", "notes.pdf", "slides.pdf"],
+                at=datetime(2025, 5, 1, 10))
+    record_turn("ANALYTICS1", a.userID, 100, 10, 0.2, documents=["notes.pdf"], at=datetime(2025, 5, 2, 10))
+    record_turn("ANALYTICS1", b.userID, 50, 5, 0.1, documents=["slides.pdf"], at=datetime(2025, 5, 2, 11))
+    requests = [CreditRequest(assignmentID=x.assignmentID, creditsRequested=n, status="Pending",
+                              requestDate=datetime(2025, 5, 1)) for x, n in ((b, 3), (c, 2), (c, 1))]
+    db.session.add_all(requests)
+    db.session.commit()
+
+    assert test_client.patch('/api/credit-requests/status', json={
+        "status": "Approved", "requestIDs": [requests[0].requestID, requests[1].requestID]}).status_code == 200
+    assert test_client.patch(f'/api/credit-requests/{requests[2].requestID}/status',
+                             json={"status": "Approved"}).status_code == 200
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        response = test_client.get('/api/module-analytics/ANALYTICS1?days=400')
+        assert response.status_code == 400
+        response = test_client.get('/api/module-analytics/ANALYTICS1?days=3&top=1&creditsBelow=3.5')
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == 200
+    assert len(statements) <= 5
+    analytics = response.json
+    assert analytics["totals"]["messages"] == 3
+    assert analytics["totals"]["cost"] == 0.5
+    assert analytics["totals"]["creditsGranted"] == 6
+    assert (analytics["totals"]["students"], analytics["totals"]["activeStudents"]) == (3, 2)
+    assert [(s["userID"], s["cost"], s["creditsGranted"]) for s in analytics["students"]] == [
+        (a.userID, 0.4, 0), (b.userID, 0.1, 3), (c.userID, 0.0, 3)]
+    assert [s["userID"] for s in analytics["lowCredits"]] == [c.userID]  # c has 3 credits, b 3.5
+    assert analytics["topDocuments"] == [{"filename": "notes.pdf", "retrievals": 3, "answers": 2,
+                                          "lastRetrievedAt": "2025-05-02T10:00:00"}]
+
+    # Requests were approved today, so the dated window is checked directly
+    daily = module_analytics("ANALYTICS1", days=3, today=date(2025, 5, 2))["daily"]
+    assert [(d["date"], d["messages"], d["activeStudents"]) for d in daily] == [
+        ("2025-04-30", 0, 0), ("2025-05-01", 1, 1), ("2025-05-02", 2, 2)]
+
+    assert test_client.get('/api/module-analytics/NO-SUCH-MODULE').status_code == 404
+
+
+def test_rebuild_summaries_matches_incremental_totals(test_client):
+    """
+    GIVEN a module whose usage summaries were maintained turn by turn
+    WHEN the summaries are rebuilt from the daily rollups and approved credit requests
+    THEN check that the analytics are unchanged
+    """
+    from app.db import db
+    from app.models.credit_requests import CreditRequest
+    from app.services.usage import module_analytics, rebuild_summaries, record_turn
+
+    a, b = _seed_module("ANALYTICS2", [1.0, 1.0])
+    for day, assignment in ((1, a), (1, b), (2, b), (2, b)):
+        record_turn("ANALYTICS2", assignment.userID, 10, 1, 0.01, at=datetime(2025, 6, day, 9))
+    request = CreditRequest(assignmentID=a.assignmentID, creditsRequested=4, status="Pending",
+                            requestDate=datetime(2025, 6, 1))
+    db.session.add(request)
+    db.session.commit()
+    test_client.patch('/api/credit-requests/status', json={"status": "Approved", "requestIDs": [request.requestID]})
+
+    before = module_analytics("ANALYTICS2")
+    rebuild_summaries("ANALYTICS2")
+    db.session.commit()
+    assert module_analytics("ANALYTICS2") == before
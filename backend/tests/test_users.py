@@ -11,3 +11,104 @@ def test_login(test_client):
                                 data=json.dumps(dict(email='test@test.com', password='password')),
                                 content_type='application/json')
     assert response.status_code == 401 # Unauthorized since the user does not exist
+
+def test_me_uses_identity_cache_until_user_is_updated(test_client, monkeypatch):
+    """
+    GIVEN a logged-in user whose profile has been fetched once
+    WHEN '/api/me' is requested again, before and after '/api/users/<id>' is updated (PUT)
+    THEN check that the cached profile is served without a query until the update invalidates it
+    """
+    from sqlalchemy import event
+    from app.db import db
+    from app.models.users import User
+    from app.services import identity
+
+    monkeypatch.setitem(test_client.application.config, "JWT_SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+    identity.clear()
+    user = User(name="Cached", email="cached@test", password="pw", role="Student", studentID=2800001)
+    db.session.add(user)
+    db.session.commit()
+
+    client = test_client.application.test_client()
+    client.post('/api/login', json={"email": "cached@test", "password": "pw"}, base_url="https://localhost")
+    assert client.get('/api/me', base_url="https://localhost").json['name'] == "Cached"
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        assert client.get('/api/me', base_url="https://localhost").json['studentID'] == 2800001
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert statements == []
+
+    client.put(f'/api/users/{user.userID}', json={"name": "Renamed"}, base_url="https://localhost")
+    assert client.get('/api/me', base_url="https://localhost").json['name'] == "Renamed"
+
+
+def test_me_answers_from_token_claims(test_client, monkeypatch):
+    """
+    GIVEN JWT_IDENTITY_CLAIMS is enabled and a user enrolled in a module logs in
+    WHEN '/api/me' is requested
+    THEN check that the profile comes from the token and the token lists the user's modules
+    """
+    from flask_jwt_extended import decode_token
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+    from app.routes import users_bp
+    from app.services import identity
+
+    monkeypatch.setitem(test_client.application.config, "JWT_SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+    monkeypatch.setattr(identity, "JWT_IDENTITY_CLAIMS", True)
+    user = User(name="Claims", email="claims@test", password="pw", role="Student", studentID=2800002)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(ModuleAssignment(userID=user.userID, moduleID="CLM1", studentCredits=1.0))
+    db.session.commit()
+
+    client = test_client.application.test_client()
+    client.post('/api/login', json={"email": "claims@test", "password": "pw"}, base_url="https://localhost")
+    token = client.get_cookie("access_token_cookie").value
+    assert decode_token(token)["modules"] == ["CLM1"]
+
+    monkeypatch.setattr(users_bp, "get_profile", lambda user_id: None)  # Would 404 if consulted
+    response = client.get('/api/me', base_url="https://localhost")
+    assert response.status_code == 200
+    assert response.json['email'] == "claims@test"
+
+
+def test_get_all_users_filters_pages_and_exports(test_client):
+    """
+    GIVEN students enrolled in a module
+    WHEN '/api/users' is requested (GET) with module, search and limit filters, and as an NDJSON export
+    THEN check that matching users are paged by userID and passwords are never returned
+    """
+    from app.db import db
+    from app.models.users import User
+    from app.models.module_assignment import ModuleAssignment
+
+    for i in range(5):
+        user = User(name=f"Listed {i}", email=f"listed{i}@test", password="secret", role="Student",
+                    studentID=2900000 + i)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(ModuleAssignment(userID=user.userID, moduleID="USR1", studentCredits=1.0))
+    db.session.commit()
+
+    page = test_client.get('/api/users?moduleID=USR1&limit=3').json
+    assert [u['name'] for u in page] == ["Listed 0", "Listed 1", "Listed 2"]
+    assert all('password' not in u for u in page)
+    rest = test_client.get(f"/api/users?moduleID=USR1&limit=3&cursor={page[-1]['cursor']}").json
+    assert [u['name'] for u in rest] == ["Listed 3", "Listed 4"]
+
+    assert [u['name'] for u in test_client.get('/api/users?q=2900004').json] == ["Listed 4"]
+    assert len(test_client.get('/api/users?moduleID=USR1&q=listed1@').json) == 1
+
+    export = test_client.get('/api/users?moduleID=USR1&format=ndjson')
+    assert export.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in export.get_data(as_text=True).splitlines()]
+    assert [u['studentID'] for u in lines] == [2900000 + i for i in range(5)]
+    assert b"secret" not in export.data
+
+    assert test_client.get('/api/users?limit=0').status_code == 400
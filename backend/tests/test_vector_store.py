@@ -0,0 +1,62 @@
+import pytest
+from app.services import vector_store
+
+
+@pytest.fixture
+def embedded_qdrant(monkeypatch):
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    # Fresh client and embeddings for this test, restored afterwards
+    monkeypatch.setattr(vector_store, "_clients", {})
+    monkeypatch.setattr(vector_store, "_embeddings", None)
+    vector_store.set_embeddings(DeterministicFakeEmbedding(size=16))
+    yield
+    vector_store.close_qdrant_client()
+
+
+def test_memory_mode_tags_and_untags_documents(embedded_qdrant, monkeypatch):
+    """
+    GIVEN QDRANT_MODE=memory
+    WHEN a document is tagged to a module and then untagged
+    THEN check that its chunks are stored in an embedded collection and then removed
+    """
+    from app.routes.chatbot_bp import tag_document_to_qdrant, untag_document_from_qdrant
+
+    monkeypatch.setenv("QDRANT_MODE", "memory")
+    client = vector_store.get_qdrant_client()
+    assert client._client.__class__.__name__ == "QdrantLocal"
+
+    chunks = tag_document_to_qdrant("VSMEM1", "word " * 500, "notes.docx")
+    tag_document_to_qdrant("VSMEM1", "other " * 100, "other.docx")
+    assert vector_store.collection_exists(client, "VSMEM1")
+    assert client.count(vector_store.collection_name("VSMEM1")).count == len(chunks) + 1
+
+    untag_document_from_qdrant("VSMEM1", "notes.docx")
+    assert client.count(vector_store.collection_name("VSMEM1")).count == 1
+
+
+def test_local_mode_persists_to_disk(embedded_qdrant, monkeypatch, tmp_path):
+    """
+    GIVEN QDRANT_MODE=local with a storage path
+    WHEN a module collection is created and the client is closed and reopened
+    THEN check that the collection is still there
+    """
+    from qdrant_client.models import Distance, VectorParams
+
+    monkeypatch.setenv("QDRANT_MODE", "local")
+    monkeypatch.setenv("QDRANT_PATH", str(tmp_path / "qdrant"))
+    vector_store.create_module_collection(vector_store.get_qdrant_client(), "VSLOCAL1",
+                                          VectorParams(size=4, distance=Distance.COSINE))
+    vector_store.close_qdrant_client()
+
+    assert vector_store.collection_exists(vector_store.get_qdrant_client(), "VSLOCAL1")
+
+
+def test_unknown_qdrant_mode_is_rejected(monkeypatch):
+    """
+    GIVEN an unsupported QDRANT_MODE
+    WHEN the Qdrant mode is read
+    THEN check that a ValueError names the valid modes
+    """
+    monkeypatch.setenv("QDRANT_MODE", "cloud")
+    with pytest.raises(ValueError, match="remote, local, memory"):
+        vector_store.qdrant_mode()
@@ -0,0 +1,87 @@
+
+import pytest
+import requests
+from app.services import openrouter, warmup
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"data": self._data}
+
+
+def test_model_pricing_is_cached(monkeypatch):
+    """
+    GIVEN the OpenRouter model list
+    WHEN pricing for the same model is looked up twice
+    THEN check that OpenRouter is only called once
+    """
+    calls = []
+
+    def fake_get(url, timeout=None):
+        calls.append(url)
+        return FakeResponse([{"id": "test/model", "pricing": {"prompt": "0.001", "completion": "0.002"}}])
+
+    monkeypatch.setattr(openrouter.requests, "get", fake_get)
+    monkeypatch.setattr(openrouter, "_fetched_at", 0.0)
+
+    assert openrouter.get_model_pricing("test/model") == (0.001, 0.002)
+    assert openrouter.get_model_pricing("test/model") == (0.001, 0.002)
+    assert len(calls) == 1
+
+
+def test_unknown_models_and_failed_fetches_are_cached(monkeypatch):
+    """
+    GIVEN an OpenRouter model list without the requested model, and then OpenRouter going down
+    WHEN pricing for the unknown model is looked up repeatedly
+    THEN check that the list is refetched once per miss and not at all while a failure is cached
+    """
+    calls = []
+
+    def fake_get(url, timeout=None):
+        calls.append(url)
+        return FakeResponse([{"id": "test/model", "pricing": {"prompt": "0.001", "completion": "0.002"}}])
+
+    monkeypatch.setattr(openrouter.requests, "get", fake_get)
+    monkeypatch.setattr(openrouter, "_fetched_at", 0.0)
+    monkeypatch.setattr(openrouter, "_failed_at", None)
+
+    assert openrouter.get_model_pricing("no/such-model") is None
+    assert openrouter.get_model_pricing("no/such-model") is None
+    assert openrouter.get_model_pricing("test/model") == (0.001, 0.002)
+    assert len(calls) == 1
+
+    def unreachable(url, timeout=None):
+        calls.append(url)
+        raise requests.exceptions.ConnectionError("unreachable")
+
+    monkeypatch.setattr(openrouter.requests, "get", unreachable)
+    monkeypatch.setattr(openrouter, "_fetched_at", 0.0)  # Expire the list
+    for _ in range(3):
+        assert openrouter.get_model_pricing("test/model") == (0.001, 0.002)  # Stale pricing
+        with pytest.raises(requests.exceptions.RequestException):
+            openrouter.get_model_pricing("other/model")
+    assert len(calls) == 2
+
+
+def test_warm_up_survives_failures(test_client, monkeypatch):
+    """
+    GIVEN Qdrant and OpenRouter being unreachable
+    WHEN the app is warmed up
+    THEN check that the failing steps are reported without raising
+    """
+    def unreachable(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("unreachable")
+
+    monkeypatch.setenv("WARMUP_EMBEDDINGS", "false")
+    monkeypatch.setattr(warmup, "_warm_qdrant", unreachable)
+    monkeypatch.setattr(openrouter.requests, "get", unreachable)
+    monkeypatch.setattr(openrouter, "_failed_at", None)
+
+    results = warmup.warm_up(test_client.application)
+    assert results == {"database": True, "qdrant": False, "pricing": False}
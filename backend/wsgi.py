@@ -0,0 +1,8 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+import os
+from app import create_app
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+
+app = create_app()
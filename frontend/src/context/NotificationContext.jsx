@@ -1,8 +1,10 @@
-import React, { createContext, useContext, useState, useEffect } from 'react';
+import React, { createContext, useContext, useState, useEffect, useCallback } from 'react';
 import { useAuth } from './AuthContext';
 
 const NotificationContext = createContext();
 
+const DEFAULT_POLL_MS = 15000;
+
 export const useNotifications = () => {
   const context = useContext(NotificationContext);
   if (!context) {
@@ -14,64 +16,96 @@ export const useNotifications = () => {
 export const NotificationProvider = ({ children }) => {
   const [notifications, setNotifications] = useState([]);
   const [showNotification, setShowNotification] = useState(false);
+  const [balances, setBalances] = useState({}); // moduleID -> credit balance pushed by the server
   const { auth } = useAuth();
+  const userID = auth.user?.userID;
+
+  // Adds approvals that aren't already displayed
+  const addNotifications = useCallback((approvals) => {
+    if (approvals.length === 0) return;
+    setNotifications((prev) => {
+      const known = new Set(prev.map((n) => n.requestID));
+      return [...prev, ...approvals.filter((a) => !known.has(a.requestID))];
+    });
+    setShowNotification(true);
+  }, []);
 
-  const checkForNewNotifications = async () => {
-    if (!auth.user?.userID) return;
+  const checkForNewNotifications = useCallback(async () => {
+    if (!userID) return;
 
     try {
-      const response = await fetch(`http://localhost:5000/api/credit-requests/user/${auth.user.userID}/approved`);
+      const response = await fetch(`http://localhost:5000/api/credit-requests/user/${userID}/approved`);
       if (response.ok) {
-        const approvedRequests = await response.json();
-        
-        // Get previously shown notifications from localStorage
-        const shownNotifications = JSON.parse(localStorage.getItem('shownNotifications') || '[]');
-        
-        // Filter out notifications that have already been shown
-        const newNotifications = approvedRequests.filter(
-          request => !shownNotifications.includes(request.requestID)
-        );
-
-        if (newNotifications.length > 0) {
-          setNotifications(newNotifications);
-          setShowNotification(true);
-          
-          // Mark these notifications as shown
-          const updatedShownNotifications = [
-            ...shownNotifications, 
-            ...newNotifications.map(n => n.requestID)
-          ];
-          localStorage.setItem('shownNotifications', JSON.stringify(updatedShownNotifications));
-        }
+        addNotifications(await response.json());
       }
     } catch (error) {
       console.error('Error fetching notifications:', error);
     }
-  };
+  }, [userID, addNotifications]);
 
-  // Check for notifications when user logs in or component mounts
+  // Long-polls for unseen approvals and balances: the server holds each request until they
+  // differ from the version we last got (or about 25 seconds pass), and says how long to wait
+  // before the next poll. Hidden tabs skip polls.
   useEffect(() => {
-    if (auth.user?.userID) {
-      checkForNewNotifications();
-    }
-  }, [auth.user?.userID]);
+    if (!userID) return;
 
-  const dismissNotification = () => {
+    let timer;
+    let cancelled = false;
+    let version = null;
+    const controller = new AbortController();
+    const poll = async () => {
+      let delay = DEFAULT_POLL_MS;
+      if (!document.hidden) {
+        try {
+          const since = version ? `?since=${version}` : '';
+          const response = await fetch(`http://localhost:5000/api/credit-requests/notifications/${userID}/poll${since}`,
+                                       { signal: controller.signal });
+          if (response.ok) {
+            const data = await response.json();
+            addNotifications(data.approvals);
+            setBalances(Object.fromEntries(data.balances.map((b) => [b.moduleID, b.studentCredits])));
+            version = data.version;
+            delay = data.pollSeconds * 1000;
+          }
+        } catch (error) {
+          if (error.name === 'AbortError') return;
+          console.error('Error polling notifications:', error);
+        }
+      }
+      if (!cancelled) timer = setTimeout(poll, delay);
+    };
+    poll();
+    return () => {
+      cancelled = true;
+      controller.abort();
+      clearTimeout(timer);
+    };
+  }, [userID, addNotifications]);
+
+  const dismissNotification = async () => {
+    const requestIDs = notifications.map((n) => n.requestID);
     setShowNotification(false);
     setNotifications([]);
-  };
+    if (!userID || requestIDs.length === 0) return;
 
-  const clearAllShownNotifications = () => {
-    localStorage.removeItem('shownNotifications');
+    try {
+      await fetch(`http://localhost:5000/api/credit-requests/notifications/${userID}/seen`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ requestIDs }),
+      });
+    } catch (error) {
+      console.error('Error marking notifications as seen:', error);
+    }
   };
 
   return (
     <NotificationContext.Provider value={{
       notifications,
       showNotification,
+      balances,
       dismissNotification,
-      checkForNewNotifications,
-      clearAllShownNotifications
+      checkForNewNotifications
     }}>
       {children}
     </NotificationContext.Provider>
@@ -3,6 +3,7 @@ import { useParams } from "react-router-dom";
 import Tooltip from "../components/global/Tooltip";
 import styles from "../styles/chatpage.module.css";
 import { useAuth } from "../context/AuthContext";
+import { useNotifications } from "../context/NotificationContext";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
 import remarkBreaks from "remark-breaks";
@@ -11,6 +12,7 @@ function ChatPage() {
   const { id } = useParams();
   const [moduleId] = useState(id);
   const { auth } = useAuth();
+  const { balances } = useNotifications();
   const user = auth.user;
   const [chats, setChats] = useState([]);
   const [selectedChatId, setSelectedChatId] = useState(null);
@@ -65,12 +67,21 @@ function ChatPage() {
 
   useEffect(() => {
     if (selectedChatId) {
-      fetch(`http://localhost:5000/api/get-chat-message/${selectedChatId}`)
+      const selected = chats.find((chat) => chat.id === selectedChatId);
+      const loaded = selected ? selected.messages : [];
+      const lastCursor = loaded.length ? loaded[loaded.length - 1].cursor : null;
+      // Messages sent from this page are already in state, so don't reload them
+      if (loaded.length && !lastCursor) return;
+      // Otherwise only fetch what we don't have yet
+      const query = lastCursor ? `?since=${lastCursor}` : "";
+      fetch(`http://localhost:5000/api/get-chat-message/${selectedChatId}${query}`)
         .then((res) => res.json())
         .then((data) => {
           setChats((prevChats) =>
             prevChats.map((chat) =>
-              chat.id === selectedChatId ? { ...chat, messages: data } : chat
+              chat.id === selectedChatId
+                ? { ...chat, messages: lastCursor ? [...chat.messages, ...data] : data }
+                : chat
             )
           );
         })
@@ -193,6 +204,9 @@ function ChatPage() {
         if (response.status === 403 && data.error === "Insufficient credits") {
           // Show alert for insufficient credits
           alert(`❌ ${data.message || "You have negative credits and cannot submit new prompts."}\n\nCurrent Credits: ${data.current_credits ? data.current_credits.toFixed(5) : 'N/A'} USD\n\nPlease request additional credits from your instructor.`);
+        } else if (response.status === 429) {
+          // Busy or a message already being answered: input is kept so it can be resent
+          alert(`⏳ ${data.error}\n\nPlease try again in ${data.retryAfter || 1} seconds.`);
         } else {
           // Show generic error alert
           alert(`❌ Error: ${data.error || "Failed to send message"}`);
@@ -242,9 +256,9 @@ function ChatPage() {
   useEffect(() => {
     async function fetchCredits() {
       try {
-        const res = await fetch(`http://localhost:5000/api/students-in-module/${moduleId}`);
+        // Only fetch this user's row rather than the whole roster
+        const res = await fetch(`http://localhost:5000/api/students-in-module/${moduleId}?userID=${userId}`);
         const data = await res.json();
-        // Find the assignment for this user by comparing the correct IDs
         const assignment = data.find((a) => a.userID === userId);
         setAssignmentCredits(assignment ? assignment.studentCredits : null);
       } catch (err) {
@@ -254,6 +268,12 @@ function ChatPage() {
     fetchCredits();
   }, [moduleId, userId]);
 
+  // Keep the balance up to date with approvals and other tabs' chats
+  const polledCredits = balances[moduleId];
+  useEffect(() => {
+    if (polledCredits !== undefined) setAssignmentCredits(polledCredits);
+  }, [polledCredits]);
+
   return (
     <div className={styles.chatPageRoot}>
       {/* Sidebar */}
@@ -1,20 +1,37 @@
 import React, { useState, useEffect } from "react";
 
+const PAST_PAGE_SIZE = 100;
+
 export default function ManageCreditRequests({ setModal }) {
   const [requests, setRequests] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
   const [activeTab, setActiveTab] = useState("Outstanding"); // New state for active tab
 
+  const [pastCursor, setPastCursor] = useState(null); // Cursor of the oldest past request loaded
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // Past requests grow without bound, so they're loaded a page at a time
+  const fetchPastRequests = async (cursor) => {
+    const params = new URLSearchParams({ status: "Approved,Rejected", limit: PAST_PAGE_SIZE });
+    if (cursor) params.set("cursor", cursor);
+    const res = await fetch(`http://localhost:5000/api/credit-requests?${params}`);
+    if (!res.ok) throw new Error("Failed to fetch credit requests");
+    const data = await res.json();
+    setPastCursor(data.length === PAST_PAGE_SIZE ? data[data.length - 1].cursor : null);
+    return data;
+  };
+
   useEffect(() => {
     async function fetchRequests() {
       setLoading(true);
       setError("");
       try {
-        const res = await fetch("http://localhost:5000/api/credit-requests");
+        const res = await fetch("http://localhost:5000/api/credit-requests?status=Pending");
         if (!res.ok) throw new Error("Failed to fetch credit requests");
-        const data = await res.json();
-        setRequests(data);
+        const pending = await res.json();
+        const past = await fetchPastRequests(null);
+        setRequests([...pending, ...past]);
       } catch (err) {
         setError(err.message || "Unknown error");
       } finally {
@@ -24,6 +41,18 @@ export default function ManageCreditRequests({ setModal }) {
     fetchRequests();
   }, []);
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const past = await fetchPastRequests(pastCursor);
+      setRequests((prev) => [...prev, ...past]);
+    } catch (err) {
+      setError(err.message || "Unknown error");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleAccept = async (requestID) => {
     try {
       const res = await fetch(
@@ -84,6 +113,44 @@ export default function ManageCreditRequests({ setModal }) {
     }
   };
 
+  const [selected, setSelected] = useState([]); // requestIDs ticked in the Outstanding tab
+
+  const toggleSelected = (requestID) => {
+    setSelected((prev) =>
+      prev.includes(requestID) ? prev.filter((id) => id !== requestID) : [...prev, requestID]
+    );
+  };
+
+  const handleBulkUpdate = async (status) => {
+    try {
+      const res = await fetch("http://localhost:5000/api/credit-requests/status", {
+        method: "PATCH",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ status, requestIDs: selected }),
+      });
+      const summary = await res.json();
+      if (!res.ok) throw new Error(summary.error || "Failed to update status");
+      setRequests((prev) =>
+        prev.map((req) =>
+          summary.requestIDs.includes(req.requestID) ? { ...req, status } : req
+        )
+      );
+      setSelected([]);
+      setModal?.({
+        active: true,
+        type: "success",
+        message: `${summary.updated} credit request(s) ${status.toLowerCase()}` +
+          (summary.skipped.length ? `, ${summary.skipped.length} were no longer pending.` : "."),
+      });
+    } catch (err) {
+      setModal?.({
+        active: true,
+        type: "fail",
+        message: err.message || "Error updating requests",
+      });
+    }
+  };
+
   // New function to filter requests based on active tab
   const getFilteredRequests = () => {
     if (activeTab === "Outstanding") {
@@ -139,7 +206,24 @@ export default function ManageCreditRequests({ setModal }) {
           </div>
         </div>
 
-        <div className="p-6">          {loading ? (
+        <div className="p-6">          {activeTab === "Outstanding" && selected.length > 0 && (
+            <div className="flex items-center space-x-2 mb-4">
+              <span className="text-sm text-gray-600">{selected.length} selected</span>
+              <button
+                onClick={() => handleBulkUpdate("Approved")}
+                className="bg-green-600 text-white px-3 py-1 rounded text-xs font-semibold hover:bg-green-700 transition-colors"
+              >
+                Approve selected
+              </button>
+              <button
+                onClick={() => handleBulkUpdate("Rejected")}
+                className="bg-red-600 text-white px-3 py-1 rounded text-xs font-semibold hover:bg-red-700 transition-colors"
+              >
+                Reject selected
+              </button>
+            </div>
+          )}
+          {loading ? (
             <div className="text-center py-8">
               <div className="inline-block animate-spin rounded-full h-8 w-8 border-b-2 border-blue-600"></div>
               <p className="mt-2 text-gray-600">Loading requests...</p>
@@ -160,6 +244,17 @@ export default function ManageCreditRequests({ setModal }) {
             <div className="overflow-x-auto">              <table className="min-w-full divide-y divide-gray-200">
                 <thead className="bg-gray-50">
                   <tr>
+                    {activeTab === "Outstanding" && (
+                      <th className="px-6 py-3">
+                        <input
+                          type="checkbox"
+                          checked={selected.length > 0 && selected.length === getFilteredRequests().length}
+                          onChange={(e) =>
+                            setSelected(e.target.checked ? getFilteredRequests().map((r) => r.requestID) : [])
+                          }
+                        />
+                      </th>
+                    )}
                     <th className="px-6 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">
                       Student ID
                     </th>
@@ -187,6 +282,15 @@ export default function ManageCreditRequests({ setModal }) {
                 </thead>
                 <tbody className="bg-white divide-y divide-gray-200">                  {getFilteredRequests().map((request) => (
                     <tr key={request.requestID} className="hover:bg-gray-50">
+                      {activeTab === "Outstanding" && (
+                        <td className="px-6 py-4">
+                          <input
+                            type="checkbox"
+                            checked={selected.includes(request.requestID)}
+                            onChange={() => toggleSelected(request.requestID)}
+                          />
+                        </td>
+                      )}
                       <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
                         {request.studentID || "N/A"}
                       </td>
@@ -238,6 +342,17 @@ export default function ManageCreditRequests({ setModal }) {
                   ))}
                 </tbody>
               </table>
+              {activeTab === "Past Requests" && pastCursor && (
+                <div className="text-center pt-4">
+                  <button
+                    onClick={handleLoadMore}
+                    disabled={loadingMore}
+                    className="text-blue-600 hover:text-blue-800 text-sm font-medium disabled:opacity-50"
+                  >
+                    {loadingMore ? "Loading..." : "Load more"}
+                  </button>
+                </div>
+              )}
             </div>          )}
         </div>
         </div>
@@ -68,6 +68,18 @@ export default function ManageModules({ setModal }) {
       const data = await response.json();
       if (!response.ok) throw new Error(data.error || "Failed to delete module");
 
+      // Deletion runs in the background; wait for the job to finish
+      if (data.jobID) {
+        let job;
+        do {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          const jobResponse = await fetch(`http://localhost:5000/api/jobs/${data.jobID}`);
+          job = await jobResponse.json();
+          if (!jobResponse.ok) throw new Error(job.error || "Failed to check deletion progress");
+        } while (job.status === "running");
+        if (job.status === "failed") throw new Error(job.error || "Failed to delete module");
+      }
+
       setModal({ active: true, type: "success", message: `Module ${moduleId} deleted successfully!` });
       setSelectedModule(null);
       setModuleSettings({ moduleID: "", moduleName: "", moduleDesc: "", initialCredit: 0 });
@@ -45,7 +45,7 @@ export default function RequestCreditsPage({ setModal }) {
     async function fetchUserRequests() {
       setFetchingRequests(true);
       try {
-        const response = await fetch("http://localhost:5000/api/credit-requests");
+        const response = await fetch(`http://localhost:5000/api/credit-requests?userID=${user.userID}`);
         if (response.ok) {
           const allRequests = await response.json();
           // Filter requests for current user by matching userID through assignmentID
@@ -127,7 +127,7 @@ export default function RequestCreditsPage({ setModal }) {
       // Refresh user requests
       const userModuleAssignments = modules.map(m => m.assignmentID);
       try {
-        const response = await fetch("http://localhost:5000/api/credit-requests");
+        const response = await fetch(`http://localhost:5000/api/credit-requests?userID=${user.userID}`);
         if (response.ok) {
           const allRequests = await response.json();
           const filteredRequests = allRequests.filter(req => 
@@ -176,7 +176,7 @@ export default function RequestCreditsPage({ setModal }) {
       // Refresh user requests
       const userModuleAssignments = modules.map(m => m.assignmentID);
       try {
-        const refreshResponse = await fetch("http://localhost:5000/api/credit-requests");
+        const refreshResponse = await fetch(`http://localhost:5000/api/credit-requests?userID=${user.userID}`);
         if (refreshResponse.ok) {
           const allRequests = await refreshResponse.json();
           const filteredRequests = allRequests.filter(req => 